@@ -9,6 +9,10 @@ class BaseAgent(ABC):
         """Process a document and extract structured information."""
         pass
     
+    async def process_with_example(self, document_text: str, example: Dict[str, Any]) -> Dict[str, Any]:
+        """Process a document given the result of a similar document; agents that cannot use it ignore it."""
+        return await self.process(document_text)
+
     @abstractmethod
     def validate(self, extracted_data: Dict[str, Any]) -> List[str]:
         """Validate the extracted data for completeness and accuracy."""
@@ -0,0 +1,30 @@
+from typing import Dict, List, Optional
+from .base_agent import BaseAgent
+from .bill_agent import BillAgent
+from .discharge_agent import DischargeAgent
+from .id_card_agent import IdCardAgent
+
+# Shared agent instances keyed by document type
+_agents: Dict[str, BaseAgent] = {}
+
+def register_agent(doc_type: str, agent: BaseAgent) -> None:
+    """
+    Register the agent responsible for a document type.
+
+    Agents are shared across requests, so they must not keep per-document state.
+    Registering a new document type also makes it available to classification.
+    """
+    _agents[doc_type] = agent
+
+def get_agent(doc_type: str) -> Optional[BaseAgent]:
+    """Return the registered agent for a document type, if any."""
+    return _agents.get(doc_type)
+
+def get_document_types() -> List[str]:
+    """Return all document types with a registered agent."""
+    return list(_agents)
+
+# Built-in agents
+register_agent("bill", BillAgent())
+register_agent("discharge_summary", DischargeAgent())
+register_agent("id_card", IdCardAgent())
@@ -0,0 +1,43 @@
+"""
+Bulk claim ingestion for backfills.
+
+Usage:
+    python -m app.bulk MANIFEST OUTPUT [--concurrency N] [--max-claims-per-minute N] [--no-resume]
+
+MANIFEST is a JSONL file with one {"claim_id": ..., "files": [...]} object per
+line, or a directory with one folder of PDF files per claim. Results are
+streamed to OUTPUT as JSONL, or as Parquet if OUTPUT ends with .parquet.
+"""
+import argparse
+import asyncio
+import json
+
+from app import config
+from app.services.bulk_service import run_bulk_ingestion
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("manifest", help="JSONL manifest or directory of claim folders")
+    parser.add_argument("output", help="Output file (.jsonl or .parquet)")
+    parser.add_argument("--concurrency", type=int, default=config.BULK_CONCURRENCY,
+                        help="Claims processed concurrently")
+    parser.add_argument("--max-claims-per-minute", type=float, default=config.BULK_MAX_CLAIMS_PER_MINUTE,
+                        help="Maximum claims started per minute (0 means unlimited)")
+    parser.add_argument("--no-resume", action="store_true",
+                        help="Ignore the checkpoint and reprocess every claim")
+    parser.add_argument("--report-interval", type=float, default=10.0,
+                        help="Seconds between throughput reports")
+    args = parser.parse_args()
+
+    summary = asyncio.run(run_bulk_ingestion(
+        args.manifest,
+        args.output,
+        concurrency=args.concurrency,
+        max_claims_per_minute=args.max_claims_per_minute,
+        resume=not args.no_resume,
+        report_interval=args.report_interval
+    ))
+    print(json.dumps(summary, indent=2))
+
+if __name__ == "__main__":
+    main()
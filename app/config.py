@@ -0,0 +1,213 @@
+import os
+from dotenv import load_dotenv
+
+# Load environment variables
+load_dotenv()
+
+# Maximum number of documents of a single claim processed concurrently
+MAX_CONCURRENT_DOCUMENTS = int(os.getenv("MAX_CONCURRENT_DOCUMENTS", "4"))
+
+# PDF text extraction executor: "process" or "thread"
+PDF_EXECUTOR = os.getenv("PDF_EXECUTOR", "process")
+# Number of PDF extraction workers
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(min(4, os.cpu_count() or 1))))
+# PDF files allowed to wait for a free worker, on top of the ones being extracted
+PDF_MAX_QUEUE = int(os.getenv("PDF_MAX_QUEUE", "16"))
+# Maximum time spent extracting text from a single PDF
+PDF_TIMEOUT_SECONDS = float(os.getenv("PDF_TIMEOUT_SECONDS", "30"))
+
+# Longest a SQLite store waits for another worker process's write lock
+SQLITE_BUSY_TIMEOUT_SECONDS = float(os.getenv("SQLITE_BUSY_TIMEOUT_SECONDS", "2"))
+
+# LLM result cache backend: "memory", "sqlite" or "none"
+CACHE_BACKEND = os.getenv("CACHE_BACKEND", "memory")
+# SQLite database file used by the "sqlite" cache backend
+CACHE_PATH = os.getenv("CACHE_PATH", "healthpay_cache.sqlite3")
+# Time to live of cached LLM results
+CACHE_TTL_SECONDS = float(os.getenv("CACHE_TTL_SECONDS", str(7 * 24 * 3600)))
+# Maximum number of cached results
+CACHE_MAX_ENTRIES = int(os.getenv("CACHE_MAX_ENTRIES", "10000"))
+# Maximum total size of cached results in bytes
+CACHE_MAX_BYTES = int(os.getenv("CACHE_MAX_BYTES", str(64 * 1024 * 1024)))
+
+# Classify and extract all documents of a claim in a single LLM request
+BATCH_EXTRACTION = os.getenv("BATCH_EXTRACTION", "false").lower() in ("1", "true", "yes")
+# Claims with more documents than this are always processed per document
+BATCH_EXTRACTION_MAX_DOCUMENTS = int(os.getenv("BATCH_EXTRACTION_MAX_DOCUMENTS", "6"))
+# Claims whose batched prompt is estimated at more tokens than this are processed per document
+BATCH_EXTRACTION_MAX_TOKENS = int(os.getenv("BATCH_EXTRACTION_MAX_TOKENS", "12000"))
+
+# Minimum confidence of the local keyword classifier to skip the Gemini call (above 1 disables it)
+LOCAL_CLASSIFIER_THRESHOLD = float(os.getenv("LOCAL_CLASSIFIER_THRESHOLD", "0.8"))
+# Start extraction with the local classifier's guess while the LLM classifies documents it is at least this
+# confident about; the result is kept if the LLM agrees and discarded otherwise. Opt-in, since every
+# misprediction pays for an extraction that is thrown away
+SPECULATIVE_EXTRACTION = os.getenv("SPECULATIVE_EXTRACTION", "false").lower() in ("1", "true", "yes")
+SPECULATIVE_EXTRACTION_MIN_CONFIDENCE = float(os.getenv("SPECULATIVE_EXTRACTION_MIN_CONFIDENCE", "0.6"))
+# Index MinHash fingerprints of processed documents; a near-duplicate of an indexed document reuses its
+# classification and the field names and value shapes of its extraction as a few-shot example
+NEAR_DUPLICATE_INDEX = os.getenv("NEAR_DUPLICATE_INDEX", "false").lower() in ("1", "true", "yes")
+# Estimated text similarity at which an indexed document counts as a near-duplicate
+NEAR_DUPLICATE_MIN_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_MIN_SIMILARITY", "0.7"))
+# Similarity at which the nearest document's type replaces an LLM classification
+NEAR_DUPLICATE_CLASSIFICATION_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_CLASSIFICATION_SIMILARITY", "0.9"))
+# Read the fields of near-duplicates from the lines they were found at in the indexed document, without the LLM,
+# once their similarity reaches NEAR_DUPLICATE_TEMPLATE_SIMILARITY; documents that similar are not indexed again.
+# Off by default: digits are masked in fingerprints, so documents differing only in numbers score about 1.0
+NEAR_DUPLICATE_TEMPLATE_PARSING = os.getenv("NEAR_DUPLICATE_TEMPLATE_PARSING", "false").lower() in ("1", "true", "yes")
+NEAR_DUPLICATE_TEMPLATE_SIMILARITY = float(os.getenv("NEAR_DUPLICATE_TEMPLATE_SIMILARITY", "0.8"))
+# Maximum number of indexed documents; the least recently matched are evicted
+NEAR_DUPLICATE_MAX_ENTRIES = int(os.getenv("NEAR_DUPLICATE_MAX_ENTRIES", "10000"))
+
+# Maximum size of a single uploaded PDF
+MAX_UPLOAD_BYTES = int(os.getenv("MAX_UPLOAD_BYTES", str(25 * 1024 * 1024)))
+# Maximum combined size of all PDFs of one claim
+MAX_CLAIM_UPLOAD_BYTES = int(os.getenv("MAX_CLAIM_UPLOAD_BYTES", str(100 * 1024 * 1024)))
+# Maximum size of a request body, checked before the body is read (covers the claim uploads plus multipart overhead)
+MAX_REQUEST_BYTES = int(os.getenv("MAX_REQUEST_BYTES", str(MAX_CLAIM_UPLOAD_BYTES + 1024 * 1024)))
+# Chunk size used when spooling uploads to disk
+UPLOAD_CHUNK_BYTES = int(os.getenv("UPLOAD_CHUNK_BYTES", str(1024 * 1024)))
+# Maximum number of pages read from a PDF
+PDF_MAX_PAGES = int(os.getenv("PDF_MAX_PAGES", "50"))
+# Number of leading pages used to classify a document
+CLASSIFICATION_MAX_PAGES = int(os.getenv("CLASSIFICATION_MAX_PAGES", "2"))
+# Token budget of the document text sent to extraction
+EXTRACTION_MAX_TOKENS = int(os.getenv("EXTRACTION_MAX_TOKENS", "8000"))
+# Split documents longer than EXTRACTION_CHUNK_TOKENS into overlapping chunks and extract only from the most relevant ones
+EXTRACTION_CHUNKING = os.getenv("EXTRACTION_CHUNKING", "true").lower() in ("1", "true", "yes")
+# Size of a chunk and of the overlap between neighbouring chunks, in tokens
+EXTRACTION_CHUNK_TOKENS = int(os.getenv("EXTRACTION_CHUNK_TOKENS", "1500"))
+EXTRACTION_CHUNK_OVERLAP_TOKENS = int(os.getenv("EXTRACTION_CHUNK_OVERLAP_TOKENS", "150"))
+# Maximum number of chunks of one document sent to extraction
+EXTRACTION_MAX_CHUNKS = int(os.getenv("EXTRACTION_MAX_CHUNKS", "3"))
+
+# OCR of scanned pages with Tesseract (needs pytesseract, Pillow and the tesseract binary)
+OCR_ENABLED = os.getenv("OCR_ENABLED", "true").lower() in ("1", "true", "yes")
+# Pages with fewer extracted characters than this are sent to OCR if they contain images
+OCR_MIN_PAGE_CHARS = int(os.getenv("OCR_MIN_PAGE_CHARS", "20"))
+# Maximum number of pages of a single PDF sent to OCR
+OCR_MAX_PAGES = int(os.getenv("OCR_MAX_PAGES", "10"))
+# Number of OCR workers; OCR runs in its own pool so it never starves text extraction
+OCR_WORKERS = int(os.getenv("OCR_WORKERS", str(min(2, os.cpu_count() or 1))))
+# Maximum time spent on OCR of a single page image
+OCR_TIMEOUT_SECONDS = float(os.getenv("OCR_TIMEOUT_SECONDS", "60"))
+# Tesseract language(s), e.g. "eng" or "eng+spa"
+OCR_LANGUAGE = os.getenv("OCR_LANGUAGE", "eng")
+
+# Claim processing requests handled at once (0 means unlimited); further requests get 503 with Retry-After
+MAX_INFLIGHT_CLAIMS = int(os.getenv("MAX_INFLIGHT_CLAIMS", "32"))
+# In-flight claim counter: "memory" (per worker process) or "sqlite" (one limit for all workers on a host)
+INFLIGHT_STORE = os.getenv("INFLIGHT_STORE", "memory")
+# SQLite database file used by the "sqlite" in-flight counter
+INFLIGHT_STORE_PATH = os.getenv("INFLIGHT_STORE_PATH", "healthpay_inflight.sqlite3")
+# Time a claim request may wait for a free slot before it is refused
+ADMISSION_WAIT_SECONDS = float(os.getenv("ADMISSION_WAIT_SECONDS", "0.5"))
+# Retry-After sent with requests refused because the server is at its in-flight limit
+ADMISSION_RETRY_AFTER_SECONDS = float(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "5"))
+
+# Production server (python -m app.serve): address, worker processes and pending connection backlog
+SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
+SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
+SERVER_WORKERS = int(os.getenv("SERVER_WORKERS", str(os.cpu_count() or 1)))
+SERVER_BACKLOG = int(os.getenv("SERVER_BACKLOG", "256"))
+# Seconds an idle keep-alive connection is held open
+SERVER_KEEP_ALIVE_SECONDS = int(os.getenv("SERVER_KEEP_ALIVE_SECONDS", "5"))
+
+# Claim job store: "memory" or "sqlite" (shared by all uvicorn workers on a host)
+JOB_STORE = os.getenv("JOB_STORE", "memory")
+# SQLite database file used by the "sqlite" job store
+JOB_STORE_PATH = os.getenv("JOB_STORE_PATH", "healthpay_jobs.sqlite3")
+# Background workers processing claim jobs
+JOB_WORKERS = int(os.getenv("JOB_WORKERS", "4"))
+# Claim jobs allowed to wait for a worker before new jobs are refused
+JOB_QUEUE_SIZE = int(os.getenv("JOB_QUEUE_SIZE", "100"))
+# Time finished jobs are kept in the job store
+JOB_TTL_SECONDS = float(os.getenv("JOB_TTL_SECONDS", str(24 * 3600)))
+# Timeout of completion webhook calls
+JOB_WEBHOOK_TIMEOUT_SECONDS = float(os.getenv("JOB_WEBHOOK_TIMEOUT_SECONDS", "10"))
+# Comma-separated hosts completion webhooks may be sent to (empty refuses every webhook_url)
+JOB_WEBHOOK_ALLOWED_HOSTS = os.getenv("JOB_WEBHOOK_ALLOWED_HOSTS", "")
+
+# Claims processed concurrently by bulk ingestion
+BULK_CONCURRENCY = int(os.getenv("BULK_CONCURRENCY", "8"))
+# Maximum claims started per minute by bulk ingestion (0 means unlimited)
+BULK_MAX_CLAIMS_PER_MINUTE = float(os.getenv("BULK_MAX_CLAIMS_PER_MINUTE", "0"))
+# Directory holding the manifests and outputs of POST /claims/bulk (empty disables the endpoint)
+BULK_INGESTION_DIR = os.getenv("BULK_INGESTION_DIR", "")
+
+# Retries of a failed LLM call on 429/5xx, timeouts and connection errors
+LLM_MAX_RETRIES = int(os.getenv("LLM_MAX_RETRIES", "3"))
+# Base and maximum delay of the jittered exponential backoff between retries
+LLM_BACKOFF_BASE_SECONDS = float(os.getenv("LLM_BACKOFF_BASE_SECONDS", "0.5"))
+LLM_BACKOFF_MAX_SECONDS = float(os.getenv("LLM_BACKOFF_MAX_SECONDS", "20"))
+# Consecutive failures that open a provider's circuit breaker
+LLM_CIRCUIT_FAILURE_THRESHOLD = int(os.getenv("LLM_CIRCUIT_FAILURE_THRESHOLD", "5"))
+# Time an open circuit waits before letting a probe request through
+LLM_CIRCUIT_RESET_SECONDS = float(os.getenv("LLM_CIRCUIT_RESET_SECONDS", "30"))
+# Delay after which a second, hedged request is sent (0 disables hedging)
+LLM_HEDGE_DELAY_SECONDS = float(os.getenv("LLM_HEDGE_DELAY_SECONDS", "0"))
+# Per-provider rate limits in requests and tokens per minute (0 means unlimited)
+GEMINI_REQUESTS_PER_MINUTE = float(os.getenv("GEMINI_REQUESTS_PER_MINUTE", "60"))
+GEMINI_TOKENS_PER_MINUTE = float(os.getenv("GEMINI_TOKENS_PER_MINUTE", "0"))
+OPENAI_REQUESTS_PER_MINUTE = float(os.getenv("OPENAI_REQUESTS_PER_MINUTE", "500"))
+OPENAI_TOKENS_PER_MINUTE = float(os.getenv("OPENAI_TOKENS_PER_MINUTE", "0"))
+# LLM rate limit state: "memory" (per worker process) or "sqlite" (one budget for all workers on a host)
+RATE_LIMIT_STORE = os.getenv("RATE_LIMIT_STORE", "memory")
+# SQLite database file used by the "sqlite" rate limit store
+RATE_LIMIT_STORE_PATH = os.getenv("RATE_LIMIT_STORE_PATH", "healthpay_rate_limits.sqlite3")
+# Alternative OpenAI-compatible endpoint, e.g. a local fake LLM server
+OPENAI_BASE_URL = os.getenv("OPENAI_BASE_URL") or None
+# Gemini REST API endpoint
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL", "https://generativelanguage.googleapis.com/v1beta")
+# Connection pool of each LLM provider: HTTP/2 (needs h2), connection limits and idle keep-alive time
+LLM_HTTP2 = os.getenv("LLM_HTTP2", "true").lower() in ("1", "true", "yes")
+LLM_HTTP_MAX_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_CONNECTIONS", "100"))
+LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+LLM_HTTP_KEEPALIVE_SECONDS = float(os.getenv("LLM_HTTP_KEEPALIVE_SECONDS", "60"))
+# Timeout of an LLM HTTP request, and of opening a connection
+LLM_HTTP_TIMEOUT_SECONDS = float(os.getenv("LLM_HTTP_TIMEOUT_SECONDS", "120"))
+LLM_HTTP_CONNECT_TIMEOUT_SECONDS = float(os.getenv("LLM_HTTP_CONNECT_TIMEOUT_SECONDS", "10"))
+
+# LLM provider used for classification and extraction: "live" (Gemini and OpenAI) or "mock"
+LLM_PROVIDER = os.getenv("LLM_PROVIDER", "live")
+# Providers per role when LLM_PROVIDER is "live"
+CLASSIFICATION_PROVIDER = os.getenv("CLASSIFICATION_PROVIDER", "gemini")
+EXTRACTION_PROVIDER = os.getenv("EXTRACTION_PROVIDER", "openai")
+# Models of the live providers
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-1.5-pro")
+OPENAI_MODEL = os.getenv("OPENAI_MODEL", "gpt-4o mini")
+# Mock provider: latency distribution ("fixed", "uniform", "lognormal" or "exponential"),
+# median latency, lognormal spread, error rate, random seed and canned responses file
+MOCK_LLM_LATENCY_DISTRIBUTION = os.getenv("MOCK_LLM_LATENCY_DISTRIBUTION", "lognormal")
+MOCK_LLM_LATENCY_MS = float(os.getenv("MOCK_LLM_LATENCY_MS", "200"))
+MOCK_LLM_LATENCY_SIGMA = float(os.getenv("MOCK_LLM_LATENCY_SIGMA", "0.5"))
+MOCK_LLM_ERROR_RATE = float(os.getenv("MOCK_LLM_ERROR_RATE", "0"))
+MOCK_LLM_SEED = int(os.getenv("MOCK_LLM_SEED", "0"))
+MOCK_LLM_RESPONSES_PATH = os.getenv("MOCK_LLM_RESPONSES_PATH") or None
+
+# Metrics (GET /metrics) and OpenTelemetry spans around workflow nodes and LLM calls
+TELEMETRY_ENABLED = os.getenv("TELEMETRY_ENABLED", "true").lower() in ("1", "true", "yes")
+
+# Claim session storage: "memory" or "sqlite" (shared by all worker processes)
+CLAIM_SESSION_STORE = os.getenv("CLAIM_SESSION_STORE", "memory")
+# SQLite database file used by the "sqlite" claim session store
+CLAIM_SESSION_STORE_PATH = os.getenv("CLAIM_SESSION_STORE_PATH", "healthpay_sessions.sqlite3")
+# Time after its last update before a claim session expires
+CLAIM_SESSION_TTL_SECONDS = float(os.getenv("CLAIM_SESSION_TTL_SECONDS", str(30 * 24 * 3600)))
+
+# Cross-claim index of bills and insurance IDs: "memory", "sqlite" (persistent, shared by all worker processes) or "none"
+CLAIM_INDEX = os.getenv("CLAIM_INDEX", "memory")
+# SQLite database file used by the "sqlite" claim index
+CLAIM_INDEX_PATH = os.getenv("CLAIM_INDEX_PATH", "healthpay_claim_index.sqlite3")
+# Window and maximum number of claims per insurance ID before a claim is flagged
+CLAIM_VELOCITY_WINDOW_DAYS = float(os.getenv("CLAIM_VELOCITY_WINDOW_DAYS", "30"))
+CLAIM_VELOCITY_MAX_CLAIMS = int(os.getenv("CLAIM_VELOCITY_MAX_CLAIMS", "3"))
+
+# JSON file declaring the required documents, per-document rules and cross-document rules of claim validation
+VALIDATION_RULES_PATH = os.getenv(
+    "VALIDATION_RULES_PATH", os.path.join(os.path.dirname(__file__), "rules", "claim_rules.json")
+)
+
+# Load the workflow graph, classifiers, LLM provider SDKs and connections and PDF workers at startup
+# (GET /ready reports 503 until done) instead of on the first claim
+WARM_UP_ON_STARTUP = os.getenv("WARM_UP_ON_STARTUP", "true").lower() in ("1", "true", "yes")
@@ -1,20 +1,66 @@
-from fastapi import FastAPI, File, UploadFile, HTTPException
+from fastapi import FastAPI, File, Form, UploadFile, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
-from typing import List
+from fastapi.responses import JSONResponse, PlainTextResponse, Response, StreamingResponse
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Literal, Optional
+import asyncio
+import json
 import uvicorn
-import io
 import traceback
 
 # Change from relative to absolute import
-from app.services.orchestrator_service import process_claim
-from app.models.schemas import ClaimProcessingResult
+from app.services.orchestrator_service import claim_result_to_dict, process_claim
+from app.models.normalization import build_document
+from app.models.schemas import (
+    BulkIngestionRequest, ClaimErrorEvent, ClaimProcessingResult, ClaimResultEvent, ClaimSessionResult, DocumentResultEvent
+)
+from app.services.bulk_service import resolve_bulk_path, run_bulk_ingestion
+from app.services.rules_engine import get_rules_engine
+from app.services.session_service import (
+    ClaimSessionConflictError, ClaimSessionNotFoundError, get_session_manager, public_session
+)
+from app.services.job_service import (
+    FINISHED_STATUSES, InvalidWebhookError, JobQueueFullError, get_job_manager, public_job, validate_webhook_url
+)
+from app.services.warmup_service import mark_stopping, readiness, start_up
+from app import config
+from app.providers.registry import close_providers
+from app.utils.admission import AdmissionMiddleware, BodySizeLimitMiddleware
+from app.utils.pdf_utils import shutdown_pdf_executor
+from app.utils.cache import get_cache
+from app.utils.heuristic_classifier import classification_stats
+from app.utils.http_pool import get_pool_stats
+from app.utils.near_duplicates import get_near_duplicate_index
+from app.utils.resilience import get_llm_stats
+from app.utils.speculation import speculation_stats
+from app.utils.telemetry import render_metrics
+from app.utils.upload_utils import UploadTooLargeError, close_spooled_files, spool_uploads
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Application startup and shutdown hooks."""
+    # Compile the validation rules once, so a broken rules file fails at startup rather than on the first claim
+    get_rules_engine()
+    # Load the workflow graph, classifiers, LLM SDKs and PDF workers before the first claim arrives
+    await start_up()
+    yield
+    mark_stopping()
+    await get_job_manager().shutdown()
+    await close_providers()
+    shutdown_pdf_executor()
 
 app = FastAPI(
     title="HealthPay Claim Processor",
     description="AI-driven system for processing medical insurance claims",
-    version="1.0.0"
+    version="1.0.0",
+    lifespan=lifespan
 )
 
+# Shed claim processing requests beyond the in-flight limit before their uploads are read
+app.add_middleware(AdmissionMiddleware, path_prefixes=("/process-claim", "/claim-sessions"))
+# Refuse oversized request bodies before reading them
+app.add_middleware(BodySizeLimitMiddleware, max_bytes=config.MAX_REQUEST_BYTES)
+
 # Add CORS middleware
 app.add_middleware(
     CORSMiddleware,
@@ -24,8 +70,24 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+async def receive_claim_files(files: List[UploadFile]) -> list:
+    """Check the uploaded claim files and spool them to temporary files."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files uploaded")
+    
+    # Check file types
+    for file in files:
+        if not file.filename.lower().endswith('.pdf'):
+            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDF")
+    
+    try:
+        # Spool uploads to temporary files in chunks instead of reading them into memory
+        return await spool_uploads(files)
+    except UploadTooLargeError as e:
+        raise HTTPException(status_code=413, detail=str(e))
+
 @app.post("/process-claim", response_model=ClaimProcessingResult)
-async def process_claim_endpoint(files: List[UploadFile] = File(...)):
+async def process_claim_endpoint(files: List[UploadFile] = File(...), claim_id: Optional[str] = Form(None)):
     """
     Process multiple PDF documents for an insurance claim.
     
@@ -35,40 +97,281 @@ async def process_claim_endpoint(files: List[UploadFile] = File(...)):
     3. Extracts and processes information from each document
     4. Validates the extracted data
     5. Returns a structured result with claim decision
+
+    `claim_id` identifies the claim in the cross-claim index; without it the
+    claim is keyed by its documents' text, so a resubmission is not flagged as
+    a duplicate of itself.
     """
-    if not files:
-        raise HTTPException(status_code=400, detail="No files uploaded")
-    
-    # Check file types
-    for file in files:
-        if not file.filename.lower().endswith('.pdf'):
-            raise HTTPException(status_code=400, detail=f"File {file.filename} is not a PDF")
-    
+    file_objects = await receive_claim_files(files)
+
     try:
-        # Store file contents in memory with proper BytesIO objects
-        file_objects = []
-        for file in files:
-            contents = await file.read()
-            # Create a BytesIO object which has seek() method
-            file_obj = io.BytesIO(contents)
-            # Add filename attribute to the BytesIO object
-            file_obj.filename = file.filename
-            file_objects.append(file_obj)
-        
         # Process the claim
-        result = await process_claim(file_objects)
-        return result
+        result = await process_claim(file_objects, claim_id)
+        # The result is built from validated models; serialize it once instead of re-validating it
+        return Response(content=result.model_dump_json(), media_type="application/json")
     
     except Exception as e:
         # Print detailed error information to the console
         error_details = traceback.format_exc()
         print(f"Error processing claim:\n{error_details}")
         raise HTTPException(status_code=500, detail=f"Error processing claim: {str(e)}")
+    finally:
+        close_spooled_files(file_objects)
+
+@app.post("/process-claim/stream")
+async def process_claim_stream(
+    files: List[UploadFile] = File(...),
+    claim_id: Optional[str] = Form(None),
+    format: Literal["ndjson", "sse"] = "ndjson"
+):
+    """
+    Process a claim like `POST /process-claim`, streaming results as they are ready.
+
+    A `document` event with the typed extraction and validation issues of each
+    document is sent as soon as that document is done, in completion order.
+    The last event is `claim`, with the cross-document validation and the claim
+    decision, or `error` if processing failed. Events are NDJSON lines, or
+    server-sent events with `format=sse`.
+    """
+    file_objects = await receive_claim_files(files)
+    events: asyncio.Queue = asyncio.Queue()
+
+    async def on_document(index: int, doc: Dict[str, Any], structured_data: Dict[str, Any]) -> None:
+        events.put_nowait(DocumentResultEvent(
+            index=index,
+            filename=doc.get("filename", ""),
+            type=structured_data.get("type", "unknown"),
+            document=build_document(structured_data),
+            validation_issues=structured_data.get("validation_issues", [])
+        ))
+
+    async def run_claim() -> None:
+        try:
+            result = await process_claim(file_objects, claim_id, on_document=on_document)
+            events.put_nowait(ClaimResultEvent(validation=result.validation, claim_decision=result.claim_decision))
+        except Exception as e:
+            error_details = traceback.format_exc()
+            print(f"Error processing claim:\n{error_details}")
+            events.put_nowait(ClaimErrorEvent(detail=f"Error processing claim: {str(e)}"))
+        finally:
+            events.put_nowait(None)
+
+    task = asyncio.create_task(run_claim())
+
+    async def stream():
+        try:
+            while True:
+                event = await events.get()
+                if event is None:
+                    return
+                if format == "sse":
+                    yield f"event: {event.event}\ndata: {event.model_dump_json()}\n\n"
+                else:
+                    yield event.model_dump_json() + "\n"
+        finally:
+            # The client went away: stop processing rather than finish a claim nobody reads
+            if not task.done():
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+            close_spooled_files(file_objects)
+
+    return StreamingResponse(
+        stream(),
+        media_type="text/event-stream" if format == "sse" else "application/x-ndjson",
+        # Keep proxies from buffering events until the claim is finished
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.post("/claims", status_code=202)
+async def submit_claim(
+    files: List[UploadFile] = File(...),
+    webhook_url: Optional[str] = Form(None),
+    claim_id: Optional[str] = Form(None)
+):
+    """
+    Submit a claim for background processing.
+
+    Returns a job ID at once. Poll `GET /claims/{job_id}` or stream
+    `GET /claims/{job_id}/events` for the result; if `webhook_url` is given the
+    finished job is POSTed to it. Its host must be in JOB_WEBHOOK_ALLOWED_HOSTS.
+    """
+    if webhook_url:
+        try:
+            validate_webhook_url(webhook_url)
+        except InvalidWebhookError as e:
+            raise HTTPException(status_code=400, detail=str(e))
+    file_objects = await receive_claim_files(files)
+
+    async def run_claim():
+        return claim_result_to_dict(await process_claim(file_objects, claim_id))
+
+    try:
+        job_id = await get_job_manager().submit(
+            run_claim,
+            kind="claim",
+            webhook_url=webhook_url,
+            cleanup=lambda: close_spooled_files(file_objects)
+        )
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    return {"job_id": job_id, "status": "queued", "status_url": f"/claims/{job_id}"}
+
+def claim_session_error(error: Exception) -> HTTPException:
+    """Map an error of a claim session update to its HTTP response."""
+    if isinstance(error, ClaimSessionNotFoundError):
+        return HTTPException(status_code=404, detail=str(error))
+    if isinstance(error, ClaimSessionConflictError):
+        return HTTPException(status_code=409, detail=str(error))
+    error_details = traceback.format_exc()
+    print(f"Error processing claim session:\n{error_details}")
+    return HTTPException(status_code=500, detail=f"Error processing claim: {str(error)}")
+
+@app.post("/claim-sessions", response_model=ClaimSessionResult, status_code=201)
+async def create_claim_session(files: List[UploadFile] = File(...)):
+    """
+    Process a claim and keep it as a session.
+
+    Documents can later be added to or replaced in the session without
+    reprocessing the documents it already holds.
+    """
+    file_objects = await receive_claim_files(files)
+    try:
+        return public_session(await get_session_manager().create(file_objects))
+    except Exception as e:
+        raise claim_session_error(e)
+    finally:
+        close_spooled_files(file_objects)
+
+@app.get("/claim-sessions/{session_id}", response_model=ClaimSessionResult)
+async def get_claim_session(session_id: str):
+    """Return the current evaluation of a claim session."""
+    try:
+        return public_session(await get_session_manager().get(session_id))
+    except ClaimSessionNotFoundError as e:
+        raise HTTPException(status_code=404, detail=str(e))
+
+@app.post("/claim-sessions/{session_id}/documents", response_model=ClaimSessionResult)
+async def add_claim_session_documents(session_id: str, files: List[UploadFile] = File(...)):
+    """
+    Add or replace documents of a claim session and re-evaluate the claim.
+
+    Only the uploaded documents are processed. A document replaces the stored
+    one with the same filename or document type.
+    """
+    file_objects = await receive_claim_files(files)
+    try:
+        return public_session(await get_session_manager().add_documents(session_id, file_objects))
+    except Exception as e:
+        raise claim_session_error(e)
+    finally:
+        close_spooled_files(file_objects)
+
+@app.delete("/claim-sessions/{session_id}/documents/{filename}", response_model=ClaimSessionResult)
+async def remove_claim_session_document(session_id: str, filename: str):
+    """Remove a document from a claim session and re-evaluate the claim."""
+    try:
+        return public_session(await get_session_manager().remove_document(session_id, filename))
+    except Exception as e:
+        raise claim_session_error(e)
+
+@app.post("/claims/bulk", status_code=202)
+async def submit_bulk_ingestion(request: BulkIngestionRequest):
+    """
+    Start a bulk ingestion run over a server-side manifest as a background job.
+
+    `manifest` and `output` are paths inside BULK_INGESTION_DIR. Results are
+    streamed to `output`; the job result holds the run summary.
+    """
+    base_dir = config.BULK_INGESTION_DIR
+    if not base_dir:
+        raise HTTPException(status_code=403, detail="Bulk ingestion over HTTP is disabled; set BULK_INGESTION_DIR to enable it")
+    try:
+        manifest = resolve_bulk_path(request.manifest, base_dir)
+        output = resolve_bulk_path(request.output, base_dir)
+        resolve_bulk_path(request.output + ".checkpoint", base_dir)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    async def run_bulk():
+        return await run_bulk_ingestion(
+            manifest,
+            output,
+            concurrency=request.concurrency,
+            max_claims_per_minute=request.max_claims_per_minute,
+            resume=request.resume,
+            base_dir=base_dir
+        )
+
+    try:
+        job_id = await get_job_manager().submit(run_bulk, kind="bulk")
+    except JobQueueFullError as e:
+        raise HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "5"})
+
+    return {"job_id": job_id, "status": "queued", "status_url": f"/claims/{job_id}"}
+
+@app.get("/claims/{job_id}")
+async def get_claim_job(job_id: str):
+    """Return the status of a claim job, and its result once completed."""
+    job = await get_job_manager().get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+    return public_job(job)
+
+@app.get("/claims/{job_id}/events")
+async def stream_claim_job(job_id: str):
+    """Stream status changes of a claim job as server-sent events until it finishes."""
+    manager = get_job_manager()
+    if await manager.get(job_id) is None:
+        raise HTTPException(status_code=404, detail=f"Job {job_id} not found")
+
+    async def events():
+        last_status = None
+        while True:
+            job = await manager.get(job_id)
+            if job is None:
+                return
+            if job["status"] != last_status:
+                last_status = job["status"]
+                yield f"event: {last_status}\ndata: {json.dumps(public_job(job))}\n\n"
+            if last_status in FINISHED_STATUSES:
+                return
+            await asyncio.sleep(0.5)
+
+    return StreamingResponse(events(), media_type="text/event-stream")
 
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
     return {"status": "healthy"}
 
+@app.get("/ready")
+async def readiness_check():
+    """
+    Readiness probe, separate from the `/health` liveness probe.
+
+    Returns 200 once startup warm-up finished, and 503 while starting, after a
+    failed warm-up step and during shutdown. The body holds the time spent in
+    each warm-up step.
+    """
+    return JSONResponse(readiness.get_state(), status_code=200 if readiness.is_ready() else 503)
+
+@app.get("/stats")
+async def stats():
+    """Runtime statistics such as LLM result cache hits, local classification, speculation and near-duplicate reuse rates, LLM retries and connection pools."""
+    return {
+        "cache": get_cache().get_stats(),
+        "classification": classification_stats.get_stats(),
+        "speculation": speculation_stats.get_stats(),
+        "near_duplicates": get_near_duplicate_index().get_stats(),
+        "llm": get_llm_stats(),
+        "http_pools": get_pool_stats()
+    }
+
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """Prometheus metrics: workflow node and LLM call durations, token usage, cache hits, retries and document sizes."""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 if __name__ == "__main__":
     uvicorn.run("app.main:app", host="127.0.0.1", port=8000, reload=True)
\ No newline at end of file
@@ -0,0 +1,148 @@
+import re
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+from pydantic import BaseModel, ValidationError
+from .schemas import DOCUMENT_MODELS
+
+# Key names LLMs commonly use instead of the schema field names, after canonicalization
+FIELD_ALIASES: Dict[str, Dict[str, str]] = {
+    "bill": {
+        "hospital": "hospital_name",
+        "hospital_name": "hospital_name",
+        "facility": "hospital_name",
+        "facility_name": "hospital_name",
+        "provider": "hospital_name",
+        "provider_name": "hospital_name",
+        "amount": "total_amount",
+        "total": "total_amount",
+        "total_amount": "total_amount",
+        "total_amount_due": "total_amount",
+        "amount_due": "total_amount",
+        "total_due": "total_amount",
+        "total_charges": "total_amount",
+        "date": "date_of_service",
+        "service_date": "date_of_service",
+        "date_of_service": "date_of_service",
+        "dos": "date_of_service",
+    },
+    "discharge_summary": {
+        "name": "patient_name",
+        "patient": "patient_name",
+        "patient_name": "patient_name",
+        "diagnosis": "diagnosis",
+        "primary_diagnosis": "diagnosis",
+        "discharge_diagnosis": "diagnosis",
+        "admission_date": "admission_date",
+        "date_of_admission": "admission_date",
+        "admitted": "admission_date",
+        "admit_date": "admission_date",
+        "discharge_date": "discharge_date",
+        "date_of_discharge": "discharge_date",
+        "discharged": "discharge_date",
+    },
+    "id_card": {
+        "name": "patient_name",
+        "patient": "patient_name",
+        "patient_name": "patient_name",
+        "member": "patient_name",
+        "member_name": "patient_name",
+        "insured_name": "patient_name",
+        "insurance_id": "insurance_id",
+        "insurance_number": "insurance_id",
+        "member_id": "insurance_id",
+        "policy_number": "insurance_id",
+        "policy_id": "insurance_id",
+        "id": "insurance_id",
+        "id_number": "insurance_id",
+        "plan": "plan_name",
+        "plan_name": "plan_name",
+        "insurance_plan": "plan_name",
+        "expiration_date": "expiration_date",
+        "expiry_date": "expiration_date",
+        "expiration": "expiration_date",
+        "expires": "expiration_date",
+        "valid_until": "expiration_date",
+    },
+}
+
+AMOUNT_FIELDS = {"total_amount"}
+DATE_FIELDS = {"date_of_service", "admission_date", "discharge_date", "expiration_date"}
+
+# Date formats accepted besides ISO; numeric dates are read month first
+DATE_FORMATS = ("%Y-%m-%d", "%Y/%m/%d", "%m/%d/%Y", "%m-%d-%Y", "%B %d, %Y", "%b %d, %Y", "%d %B %Y", "%d %b %Y")
+
+_PARENTHESIZED = re.compile(r"\([^)]*\)")
+_NON_ALPHANUMERIC = re.compile(r"[^a-z0-9]+")
+_NOT_AMOUNT = re.compile(r"[^0-9.\-]")
+
+def canonical_key(key: str) -> str:
+    """Lowercase a key and turn it into snake_case, e.g. "Date of Service (YYYY-MM-DD)" -> "date_of_service"."""
+    key = _PARENTHESIZED.sub("", str(key)).lower()
+    return _NON_ALPHANUMERIC.sub("_", key).strip("_")
+
+def normalize_amount(value: Any) -> Any:
+    """Turn amounts like "$1,250.00" into floats; other values are returned unchanged."""
+    if isinstance(value, str):
+        cleaned = _NOT_AMOUNT.sub("", value)
+        try:
+            return float(cleaned)
+        except ValueError:
+            return value
+    return value
+
+def normalize_date(value: Any) -> Any:
+    """Turn dates in common formats into YYYY-MM-DD; other values are returned unchanged."""
+    if not isinstance(value, str):
+        return value
+    text = value.strip()
+    for date_format in DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date().isoformat()
+        except ValueError:
+            continue
+    return value
+
+def normalize_document(document_type: str, data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Map an extraction response onto the field names of its document schema.
+
+    Keys are canonicalized and looked up in FIELD_ALIASES, a response wrapped
+    in a single object (e.g. {"bill": {...}}) is unwrapped, amounts become
+    numbers and dates become YYYY-MM-DD. Unknown keys are kept as they are.
+    """
+    if len(data) == 1:
+        (value,) = data.values()
+        if isinstance(value, dict):
+            data = value
+
+    aliases = FIELD_ALIASES.get(document_type, {})
+    normalized = {}
+    for key, value in data.items():
+        canonical = canonical_key(key)
+        field = aliases.get(canonical, canonical if aliases else key)
+        # Keep the first value if the response has several aliases of one field
+        if field in normalized and field != key:
+            continue
+        if field in AMOUNT_FIELDS:
+            value = normalize_amount(value)
+        elif field in DATE_FIELDS:
+            value = normalize_date(value)
+        normalized[field] = value
+    normalized["type"] = document_type
+    return normalized
+
+def build_document(data: Dict[str, Any]) -> Optional[BaseModel]:
+    """Build the typed model of a structured document; None if its type has no schema or it does not match it."""
+    model = DOCUMENT_MODELS.get(data.get("type"))
+    if model is None:
+        return None
+    try:
+        return model.model_validate(data)
+    except ValidationError as e:
+        print(f"Extracted {data.get('type')} data does not match its schema: {str(e)}")
+        return None
+
+def build_documents(structured_documents: List[Dict[str, Any]]) -> List[BaseModel]:
+    """Build the typed models of a claim's documents, leaving out documents without a valid schema."""
+    documents = [build_document(doc) for doc in structured_documents]
+    return [doc for doc in documents if doc is not None]
@@ -25,6 +25,13 @@ class IdCardDocument(BaseModel):
 # Union type for all document types
 Document = BillDocument | DischargeDocument | IdCardDocument
 
+# Schema of each document type
+DOCUMENT_MODELS = {
+    "bill": BillDocument,
+    "discharge_summary": DischargeDocument,
+    "id_card": IdCardDocument
+}
+
 class ValidationResult(BaseModel):
     missing_documents: List[str] = Field(default_factory=list)
     discrepancies: List[str] = Field(default_factory=list)
@@ -36,4 +43,40 @@ class ClaimDecision(BaseModel):
 class ClaimProcessingResult(BaseModel):
     documents: List[Document]
     validation: ValidationResult
-    claim_decision: ClaimDecision
\ No newline at end of file
+    claim_decision: ClaimDecision
+
+class DocumentResultEvent(BaseModel):
+    """Streamed as soon as one document of a claim is classified, extracted and validated."""
+    event: Literal["document"] = "document"
+    index: int
+    filename: str
+    type: str
+    # None if the extracted data does not match the schema of its type
+    document: Optional[Document] = None
+    validation_issues: List[str] = Field(default_factory=list)
+
+class ClaimResultEvent(BaseModel):
+    """Streamed last, with the cross-document validation and the claim decision."""
+    event: Literal["claim"] = "claim"
+    validation: ValidationResult
+    claim_decision: ClaimDecision
+
+class ClaimErrorEvent(BaseModel):
+    """Streamed last instead of the claim result when processing fails."""
+    event: Literal["error"] = "error"
+    detail: str
+
+class ClaimSessionResult(ClaimProcessingResult):
+    session_id: str
+    filenames: List[str]
+    # Documents of the last upload that were not recognised as a claim document
+    rejected_documents: List[str] = []
+    created_at: float
+    updated_at: float
+
+class BulkIngestionRequest(BaseModel):
+    manifest: str
+    output: str
+    concurrency: Optional[int] = None
+    max_claims_per_minute: Optional[float] = None
+    resume: bool = True
@@ -0,0 +1,33 @@
+from abc import ABC, abstractmethod
+from pydantic import BaseModel
+
+class LLMResponse(BaseModel):
+    text: str
+    input_tokens: int = 0
+    output_tokens: int = 0
+
+class LLMProvider(ABC):
+    """Base class for LLM backends used for classification and extraction."""
+
+    # Provider name, used for rate limiting and statistics
+    name: str = "llm"
+    # Model name, part of the result cache key
+    model: str = ""
+
+    @abstractmethod
+    async def generate_text(self, prompt: str) -> LLMResponse:
+        """Return a free-form text completion of a prompt."""
+        pass
+
+    @abstractmethod
+    async def generate_json(self, system_prompt: str, prompt: str) -> LLMResponse:
+        """Return a completion that is a JSON object."""
+        pass
+
+    async def warm_up(self) -> None:
+        """Open connections ahead of the first request, e.g. at application startup."""
+        pass
+
+    async def close(self) -> None:
+        """Release any connections held by the provider."""
+        pass
@@ -0,0 +1,56 @@
+import os
+from typing import Any, Dict, Optional
+import httpx
+from .base_provider import LLMProvider, LLMResponse
+from ..utils.http_pool import get_http_client
+
+class GeminiAPIError(Exception):
+    """Error response of the Gemini API; carries the status code and response for the retry logic."""
+
+    def __init__(self, status_code: int, message: str, response: Optional[httpx.Response] = None):
+        super().__init__(f"Gemini API error {status_code}: {message}")
+        self.status_code = status_code
+        self.response = response
+
+class GeminiProvider(LLMProvider):
+    """Google Gemini through its REST API, over the provider's shared connection pool."""
+
+    name = "gemini"
+
+    def __init__(self, model: str, base_url: str, api_key: Optional[str] = None, http_client: Optional[httpx.AsyncClient] = None):
+        self.model = model
+        self._model_url = f"{base_url.rstrip('/')}/models/{model.removeprefix('models/')}"
+        self._headers = {"x-goog-api-key": api_key or os.getenv("GOOGLE_API_KEY") or ""}
+        self._http = http_client or get_http_client(self.name)
+
+    async def _generate(self, text: str, generation_config: Optional[Dict[str, Any]] = None) -> LLMResponse:
+        body: Dict[str, Any] = {"contents": [{"role": "user", "parts": [{"text": text}]}]}
+        if generation_config:
+            body["generationConfig"] = generation_config
+        response = await self._http.post(f"{self._model_url}:generateContent", json=body, headers=self._headers)
+        if response.status_code >= 400:
+            raise GeminiAPIError(response.status_code, response.text[:500], response)
+
+        data = response.json()
+        candidates = data.get("candidates") or []
+        if not candidates:
+            raise ValueError(f"Gemini returned no candidates: {data.get('promptFeedback')}")
+        parts = candidates[0].get("content", {}).get("parts", [])
+        usage = data.get("usageMetadata", {})
+        return LLMResponse(
+            text="".join(part.get("text", "") for part in parts),
+            input_tokens=usage.get("promptTokenCount", 0) or 0,
+            output_tokens=usage.get("candidatesTokenCount", 0) or 0
+        )
+
+    async def generate_text(self, prompt: str) -> LLMResponse:
+        return await self._generate(prompt)
+
+    async def generate_json(self, system_prompt: str, prompt: str) -> LLMResponse:
+        return await self._generate(f"{system_prompt}\n\n{prompt}", {"responseMimeType": "application/json"})
+
+    async def warm_up(self) -> None:
+        # Reading the model's metadata costs no tokens and leaves a connection open in the pool
+        response = await self._http.get(self._model_url, headers=self._headers)
+        if response.status_code >= 400:
+            raise GeminiAPIError(response.status_code, response.text[:500], response)
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import math
+import random
+import re
+from typing import Any, Dict, Optional
+from .base_provider import LLMProvider, LLMResponse
+from ..utils.heuristic_classifier import KeywordClassifier
+
+# Canned extraction results; together they make an approvable claim
+DEFAULT_RESPONSES: Dict[str, Dict[str, Any]] = {
+    "bill": {
+        "hospital_name": "Mock General Hospital",
+        "total_amount": 1250.0,
+        "date_of_service": "2024-03-10"
+    },
+    "discharge_summary": {
+        "patient_name": "Jane Doe",
+        "diagnosis": "Community-acquired pneumonia",
+        "admission_date": "2024-03-05",
+        "discharge_date": "2024-03-10"
+    },
+    "id_card": {
+        "patient_name": "Jane Doe",
+        "insurance_id": "MOCK-123456",
+        "plan_name": "Gold PPO",
+        "expiration_date": "2099-12-31"
+    }
+}
+
+# Phrases of the extraction prompts identifying the requested document type
+EXTRACTION_PROMPT_TYPES = {
+    "medical bill": "bill",
+    "discharge summary": "discharge_summary",
+    "insurance ID card": "id_card"
+}
+
+BATCH_SECTION_PATTERN = re.compile(r"^--- Document \d+: filename: (.+?) ---$", re.MULTILINE)
+
+class MockProviderError(Exception):
+    """Simulated provider failure carrying an HTTP status code."""
+
+    def __init__(self, status_code: int):
+        super().__init__(f"Mock LLM error {status_code}")
+        self.status_code = status_code
+
+class MockProvider(LLMProvider):
+    """
+    Deterministic local stand-in for the live LLMs, for load tests and CI.
+
+    Latency follows a configurable distribution, a configurable share of calls
+    fail with a retryable 429 or 503, and answers are canned: classification
+    uses the local keyword classifier and extraction returns fixed documents.
+    """
+
+    name = "mock"
+
+    def __init__(
+        self,
+        latency_ms: float = 200.0,
+        distribution: str = "lognormal",
+        sigma: float = 0.5,
+        error_rate: float = 0.0,
+        seed: int = 0,
+        responses: Optional[Dict[str, Dict[str, Any]]] = None
+    ):
+        self.model = "mock"
+        self.latency_ms = latency_ms
+        self.distribution = distribution
+        self.sigma = sigma
+        self.error_rate = error_rate
+        self.responses = dict(DEFAULT_RESPONSES, **(responses or {}))
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._classifier = KeywordClassifier()
+
+    @classmethod
+    def from_responses_file(cls, path: Optional[str], **kwargs: Any) -> "MockProvider":
+        """Create a mock provider, loading canned responses from a JSON file if given."""
+        responses = None
+        if path:
+            with open(path, "r", encoding="utf-8") as responses_file:
+                responses = json.load(responses_file)
+        return cls(responses=responses, **kwargs)
+
+    def sample_latency(self) -> float:
+        """Return a simulated latency in seconds."""
+        median = self.latency_ms / 1000
+        if self.distribution == "fixed":
+            return median
+        elif self.distribution == "uniform":
+            return self._random.uniform(0, 2 * median)
+        elif self.distribution == "exponential":
+            return self._random.expovariate(math.log(2) / median) if median > 0 else 0.0
+        else:
+            return median * math.exp(self._random.gauss(0, self.sigma))
+
+    async def _simulate_call(self) -> None:
+        self.calls += 1
+        latency = self.sample_latency()
+        failed = self._random.random() < self.error_rate
+        status_code = self._random.choice([429, 503])
+        await asyncio.sleep(latency)
+        if failed:
+            raise MockProviderError(status_code)
+
+    def classify(self, text: str, filename: str = "") -> str:
+        doc_type, confidence = self._classifier.classify(text, filename)
+        return doc_type
+
+    async def generate_text(self, prompt: str) -> LLMResponse:
+        await self._simulate_call()
+        filename = re.search(r"Filename: (.*)", prompt)
+        snippet = re.search(r"Document content snippet:(.*)Return only", prompt, re.DOTALL)
+        answer = self.classify(
+            snippet.group(1) if snippet else prompt,
+            filename.group(1).strip() if filename else ""
+        )
+        return self._to_response(prompt, answer)
+
+    async def generate_json(self, system_prompt: str, prompt: str) -> LLMResponse:
+        await self._simulate_call()
+
+        sections = BATCH_SECTION_PATTERN.split(prompt)
+        if len(sections) > 1:
+            # Batched prompt: pairs of filename and document text follow the header
+            documents = []
+            for filename, text in zip(sections[1::2], sections[2::2]):
+                doc_type = self.classify(text, filename)
+                documents.append(dict(self.responses.get(doc_type, {}), filename=filename, type=doc_type))
+            return self._to_response(prompt, json.dumps({"documents": documents}))
+
+        doc_type = next((doc_type for phrase, doc_type in EXTRACTION_PROMPT_TYPES.items() if phrase in prompt), None)
+        return self._to_response(prompt, json.dumps(self.responses.get(doc_type, {})))
+
+    @staticmethod
+    def _to_response(prompt: str, text: str) -> LLMResponse:
+        return LLMResponse(text=text, input_tokens=len(prompt) // 4, output_tokens=len(text) // 4)
@@ -0,0 +1,60 @@
+import os
+from typing import Any, Optional
+from .base_provider import LLMProvider, LLMResponse
+from ..utils.http_pool import get_http_client
+
+class OpenAIProvider(LLMProvider):
+    """OpenAI (or an OpenAI-compatible server) through the openai SDK."""
+
+    name = "openai"
+
+    def __init__(self, model: str, base_url: Optional[str] = None, client: Optional[Any] = None):
+        self.model = model
+        if client is None:
+            # Imported here so the SDK is only loaded when OpenAI is actually used
+            from openai import AsyncOpenAI
+
+            http_client = get_http_client(self.name)
+            # Retries are handled by the shared call layer in resilience.py
+            client = AsyncOpenAI(
+                api_key=os.getenv("OPENAI_API_KEY"),
+                base_url=base_url,
+                max_retries=0,
+                timeout=http_client.timeout,
+                http_client=http_client
+            )
+        self._client = client
+
+    async def generate_text(self, prompt: str) -> LLMResponse:
+        response = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[{"role": "user", "content": prompt}]
+        )
+        return self._to_response(response)
+
+    async def generate_json(self, system_prompt: str, prompt: str) -> LLMResponse:
+        response = await self._client.chat.completions.create(
+            model=self.model,
+            messages=[
+                {"role": "system", "content": system_prompt},
+                {"role": "user", "content": prompt}
+            ],
+            response_format={"type": "json_object"}
+        )
+        return self._to_response(response)
+
+    async def warm_up(self) -> None:
+        # Listing models costs no tokens and leaves a connection to the API open in the client's pool
+        await self._client.models.list()
+
+    async def close(self) -> None:
+        await self._client.close()
+
+    @staticmethod
+    def _to_response(response: Any) -> LLMResponse:
+        usage = getattr(response, "usage", None)
+        return LLMResponse(
+            text=response.choices[0].message.content,
+            input_tokens=getattr(usage, "prompt_tokens", 0) or 0,
+            output_tokens=getattr(usage, "completion_tokens", 0) or 0
+        )
@@ -0,0 +1,74 @@
+from typing import Callable, Dict, Optional
+from .base_provider import LLMProvider
+from .. import config
+from ..utils.http_pool import close_http_clients
+
+def _create_gemini() -> LLMProvider:
+    from .gemini_provider import GeminiProvider
+    return GeminiProvider(config.GEMINI_MODEL, config.GEMINI_BASE_URL)
+
+def _create_openai() -> LLMProvider:
+    from .openai_provider import OpenAIProvider
+    return OpenAIProvider(config.OPENAI_MODEL, base_url=config.OPENAI_BASE_URL)
+
+def _create_mock() -> LLMProvider:
+    from .mock_provider import MockProvider
+    return MockProvider.from_responses_file(
+        config.MOCK_LLM_RESPONSES_PATH,
+        latency_ms=config.MOCK_LLM_LATENCY_MS,
+        distribution=config.MOCK_LLM_LATENCY_DISTRIBUTION,
+        sigma=config.MOCK_LLM_LATENCY_SIGMA,
+        error_rate=config.MOCK_LLM_ERROR_RATE,
+        seed=config.MOCK_LLM_SEED
+    )
+
+# Provider factories keyed by name
+_factories: Dict[str, Callable[[], LLMProvider]] = {
+    "gemini": _create_gemini,
+    "openai": _create_openai,
+    "mock": _create_mock,
+}
+
+# Shared provider instances keyed by role ("classification" or "extraction")
+_providers: Dict[str, LLMProvider] = {}
+
+def register_provider(name: str, factory: Callable[[], LLMProvider]) -> None:
+    """Register a factory for an LLM provider selectable through config."""
+    _factories[name] = factory
+
+def _provider_name(role: str) -> str:
+    if config.LLM_PROVIDER != "live":
+        return config.LLM_PROVIDER
+    return config.CLASSIFICATION_PROVIDER if role == "classification" else config.EXTRACTION_PROVIDER
+
+def get_provider(role: str) -> LLMProvider:
+    """Return the shared provider for a role, creating it on first use."""
+    if role not in _providers:
+        name = _provider_name(role)
+        if name not in _factories:
+            raise ValueError(f"Unknown LLM provider: {name}")
+        # Roles served by the same provider share one instance
+        existing = next((provider for provider in _providers.values() if provider.name == name), None)
+        _providers[role] = existing or _factories[name]()
+    return _providers[role]
+
+def get_classification_provider() -> LLMProvider:
+    return get_provider("classification")
+
+def get_extraction_provider() -> LLMProvider:
+    return get_provider("extraction")
+
+def set_provider(role: str, provider: Optional[LLMProvider]) -> None:
+    """Override the provider of a role, e.g. in tests; None restores the configured one."""
+    if provider is None:
+        _providers.pop(role, None)
+    else:
+        _providers[role] = provider
+
+async def close_providers() -> None:
+    """Close and drop all provider instances and their connection pools."""
+    providers = {id(provider): provider for provider in _providers.values()}
+    _providers.clear()
+    for provider in providers.values():
+        await provider.close()
+    await close_http_clients()
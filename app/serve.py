@@ -0,0 +1,53 @@
+"""
+Production server with several uvicorn worker processes.
+
+Usage:
+    python -m app.serve [--host HOST] [--port PORT] [--workers N]
+
+With more than one worker, the stores that hold shared state default to
+SQLite so all workers on the host share them: the LLM result cache, the LLM
+rate limits, the in-flight claim limit, claim jobs, claim sessions and the
+claim index. Settings given in the environment or .env take precedence.
+Unlike `python -m app.main`, the server does not reload on code changes.
+"""
+import argparse
+import os
+
+import uvicorn
+
+from app import config
+
+# Settings applied to every worker unless set explicitly
+SHARED_STORE_SETTINGS = {
+    "CACHE_BACKEND": "sqlite",
+    "RATE_LIMIT_STORE": "sqlite",
+    "INFLIGHT_STORE": "sqlite",
+    "JOB_STORE": "sqlite",
+    "CLAIM_SESSION_STORE": "sqlite",
+    "CLAIM_INDEX": "sqlite",
+}
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default=config.SERVER_HOST)
+    parser.add_argument("--port", type=int, default=config.SERVER_PORT)
+    parser.add_argument("--workers", type=int, default=config.SERVER_WORKERS, help="Worker processes")
+    args = parser.parse_args()
+
+    if args.workers > 1:
+        # Workers are started as new processes and read their settings from the environment
+        for name, value in SHARED_STORE_SETTINGS.items():
+            os.environ.setdefault(name, value)
+
+    uvicorn.run(
+        "app.main:app",
+        host=args.host,
+        port=args.port,
+        workers=args.workers,
+        backlog=config.SERVER_BACKLOG,
+        timeout_keep_alive=config.SERVER_KEEP_ALIVE_SECONDS,
+        proxy_headers=True
+    )
+
+if __name__ == "__main__":
+    main()
@@ -1,36 +1,220 @@
-from typing import Dict, Any, List
-from ..agents.bill_agent import BillAgent
-from ..agents.discharge_agent import DischargeAgent
-from ..agents.id_card_agent import IdCardAgent
+import asyncio
+from typing import Dict, Any, Awaitable, Callable, List, Optional, Tuple
+from .. import config
 from ..agents.base_agent import BaseAgent
+from ..agents.registry import get_agent
+from ..utils.async_utils import gather_with_limit
+from ..utils.llm_utils import BatchExtractionError, extract_claim_batch_with_gpt
+from ..utils.near_duplicates import NearDuplicate, get_near_duplicate_index, learn_template, parse_with_template, value_shapes
+from ..utils.speculation import speculation_stats
+from ..utils.telemetry import track_llm_tokens
+from .document_service import classify_document, classify_locally
 
-# Agent factory
-def get_agent_for_document_type(doc_type: str) -> BaseAgent:
+# Called with the index, processed document and structured data of each document once it is done
+DocumentCallback = Callable[[int, Dict[str, Any], Dict[str, Any]], Awaitable[None]]
+
+def get_agent_for_document_type(doc_type: str) -> Optional[BaseAgent]:
     """Return the appropriate agent for a document type."""
-    agents = {
-        "bill": BillAgent(),
-        "discharge_summary": DischargeAgent(),
-        "id_card": IdCardAgent()
-    }
-    return agents.get(doc_type, None)
+    return get_agent(doc_type)
+
+async def extract_document(
+    doc: Dict[str, Any],
+    near_duplicate: Optional[Tuple[NearDuplicate, float]] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Process a classified document with the appropriate agent.
+
+    Given an indexed near-duplicate of the same type and its similarity, its
+    fields are read from the same labelled lines when NEAR_DUPLICATE_TEMPLATE_PARSING
+    is enabled and the similarity reaches NEAR_DUPLICATE_TEMPLATE_SIMILARITY;
+    otherwise its field names and value shapes are passed to the agent as an
+    example. Returns None for document types without an agent.
+    """
+    agent = get_agent_for_document_type(doc["type"])
+
+    if not agent:
+        return None
+
+    if near_duplicate is None:
+        # Process document with the appropriate agent
+        structured_data = await agent.process(doc["content"])
+    else:
+        match, score = near_duplicate
+        structured_data = None
+        if config.NEAR_DUPLICATE_TEMPLATE_PARSING and match.labels and score >= config.NEAR_DUPLICATE_TEMPLATE_SIMILARITY:
+            structured_data = parse_with_template(doc["type"], doc["content"], match.labels, list(match.result))
+        get_near_duplicate_index().record_extraction(from_template=structured_data is not None)
+        if structured_data is None:
+            structured_data = await agent.process_with_example(doc["content"], match.result)
+
+    # Add validation issues
+    validation_issues = agent.validate(structured_data)
+    structured_data["validation_issues"] = validation_issues
+
+    return structured_data
 
 async def extract_structured_data(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
     """
     Process each document with the appropriate agent to extract structured data.
+    Documents are processed concurrently; results keep the input order.
+    """
+    results = await gather_with_limit(
+        [extract_document(doc) for doc in documents],
+        config.MAX_CONCURRENT_DOCUMENTS
+    )
+    return [result for result in results if result is not None]
+
+async def _extract_tracking_tokens(doc: Dict[str, Any], tally: Dict[str, int]) -> Optional[Dict[str, Any]]:
+    with track_llm_tokens(tally):
+        return await extract_document(doc)
+
+def _discard(task: asyncio.Task) -> None:
+    """Cancel a speculative extraction and drop its outcome."""
+    task.cancel()
+    task.add_done_callback(lambda done: done.cancelled() or done.exception())
+
+async def classify_and_extract(doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    """
+    Classify a document and move straight on to extracting its data.
+
+    With NEAR_DUPLICATE_INDEX enabled, the document is fingerprinted and looked
+    up among the documents processed before. When the LLM would have to
+    classify it and the nearest indexed document reaches
+    NEAR_DUPLICATE_CLASSIFICATION_SIMILARITY, that document's type is used
+    instead, and a near-duplicate of its type guides its extraction. Documents
+    without a near-duplicate are processed as usual and then indexed, keeping
+    only the shapes of their values so no patient data crosses claims.
+    """
+    local_guess = classify_locally(doc)
+    index = get_near_duplicate_index() if config.NEAR_DUPLICATE_INDEX else None
+    signature = index.fingerprint(doc["content"]) if index is not None else None
+    if signature is None:
+        return await _classify_and_extract(doc, local_guess)
+
+    index.record_lookup()
+    nearest = index.find(signature)
+    if nearest is None:
+        structured_data = await _classify_and_extract(doc, local_guess)
+    else:
+        if (
+            local_guess[1] >= config.LOCAL_CLASSIFIER_THRESHOLD
+            or nearest[1] < config.NEAR_DUPLICATE_CLASSIFICATION_SIMILARITY
+        ):
+            await classify_document(doc, local_guess)
+            if nearest[0].document_type != doc["type"]:
+                nearest = index.find(signature, doc["type"])
+        else:
+            # The nearest document's classification stands in for the LLM call
+            doc["type"] = nearest[0].document_type
+            index.record_classification_reused()
+        structured_data = await extract_document(doc, nearest)
+
+    # A document as similar as a template match adds nothing the index does not already hold
+    if structured_data is not None and (nearest is None or nearest[1] < config.NEAR_DUPLICATE_TEMPLATE_SIMILARITY):
+        index.add(signature, doc["type"], value_shapes(structured_data), learn_template(doc["content"], structured_data))
+    return structured_data
+
+async def _classify_and_extract(doc: Dict[str, Any], local_guess: Tuple[str, float]) -> Optional[Dict[str, Any]]:
+    """
+    Classify a document, with the LLM unless the local classifier is confident, then extract its data.
+
+    When the LLM has to classify the document but the local classifier's guess
+    reaches SPECULATIVE_EXTRACTION_MIN_CONFIDENCE, extraction with the guessed
+    type's agent starts alongside the LLM classification. Its result is used if
+    the classification agrees; otherwise it is cancelled and the document is
+    extracted again with the classified type.
+    """
+    guessed_type, confidence = local_guess
+    if (
+        not config.SPECULATIVE_EXTRACTION
+        or not config.SPECULATIVE_EXTRACTION_MIN_CONFIDENCE <= confidence < config.LOCAL_CLASSIFIER_THRESHOLD
+        or get_agent_for_document_type(guessed_type) is None
+    ):
+        await classify_document(doc, local_guess)
+        return await extract_document(doc)
+
+    tally = {"input": 0, "output": 0, "pending": 0}
+    speculative = asyncio.create_task(_extract_tracking_tokens(dict(doc, type=guessed_type), tally))
+    speculation_stats.record_started()
+    try:
+        await classify_document(doc, local_guess)
+    except BaseException:
+        _discard(speculative)
+        raise
+
+    if doc["type"] == guessed_type:
+        speculation_stats.record_committed()
+        return await speculative
+
+    in_flight = not speculative.done()
+    # Providers report no usage for cancelled calls, so those count with their estimated prompt tokens
+    wasted_tokens = tally["input"] + tally["output"] + tally["pending"]
+    _discard(speculative)
+    speculation_stats.record_mispredicted(wasted_tokens, in_flight)
+    return await extract_document(doc)
+
+async def batch_classify_and_extract(documents: List[Dict[str, Any]]) -> Optional[List[Optional[Dict[str, Any]]]]:
+    """
+    Classify and extract all documents of a claim with a single LLM request.
+
+    Returns one entry per document, None for a document whose type has no
+    agent. Returns None instead of a list when the claim is too large for one
+    request, the provider fails or the batched response fails schema
+    validation, in which case the documents should be processed one by one.
     """
+    try:
+        batch = await extract_claim_batch_with_gpt(documents)
+    except BatchExtractionError as e:
+        print(f"Batched extraction failed, falling back to per-document calls: {str(e)}")
+        return None
+    except Exception as e:
+        print(f"Error in batched extraction, falling back to per-document calls: {str(e)}")
+        return None
+
     results = []
-    
-    for doc in documents:
+    for doc, structured_data in zip(documents, batch):
+        doc["type"] = structured_data["type"]
         agent = get_agent_for_document_type(doc["type"])
-        
-        if agent:
-            # Process document with the appropriate agent
-            structured_data = await agent.process(doc["content"])
-            
-            # Add validation issues
-            validation_issues = agent.validate(structured_data)
-            structured_data["validation_issues"] = validation_issues
-            
-            results.append(structured_data)
-    
-    return results
\ No newline at end of file
+        if agent is None:
+            # Same as extract_document for types without an agent
+            results.append(None)
+            continue
+        structured_data["validation_issues"] = agent.validate(structured_data)
+        results.append(structured_data)
+    return results
+
+async def classify_and_extract_documents(
+    documents: List[Dict[str, Any]],
+    on_document: Optional[DocumentCallback] = None
+) -> List[Dict[str, Any]]:
+    """
+    Run classification and extraction for every document of a claim.
+
+    Each document goes from classification straight into extraction without
+    waiting for its siblings, with at most MAX_CONCURRENT_DOCUMENTS in flight.
+    Results keep the input order. With BATCH_EXTRACTION enabled, multi-document
+    claims are first tried as a single batched LLM request.
+
+    `on_document` is awaited with the index, the processed document and the
+    structured data of each document as soon as that document is done.
+    """
+    if config.BATCH_EXTRACTION and 1 < len(documents) <= config.BATCH_EXTRACTION_MAX_DOCUMENTS:
+        results = await batch_classify_and_extract(documents)
+        if results is not None:
+            if on_document is not None:
+                for index, (doc, structured_data) in enumerate(zip(documents, results)):
+                    if structured_data is not None:
+                        await on_document(index, doc, structured_data)
+            return [result for result in results if result is not None]
+
+    async def process(index: int, doc: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        structured_data = await classify_and_extract(doc)
+        if structured_data is not None and on_document is not None:
+            await on_document(index, doc, structured_data)
+        return structured_data
+
+    results = await gather_with_limit(
+        [process(index, doc) for index, doc in enumerate(documents)],
+        config.MAX_CONCURRENT_DOCUMENTS
+    )
+    return [result for result in results if result is not None]
@@ -0,0 +1,275 @@
+import asyncio
+import json
+import os
+import time
+from typing import Any, Callable, Dict, Iterator, List, Optional, Set
+from .. import config
+from .orchestrator_service import claim_result_to_dict, process_claim
+
+def resolve_bulk_path(path: str, base_dir: str) -> str:
+    """
+    Resolve a path against `base_dir` and return it, or raise ValueError if it
+    lies outside `base_dir` once `..` components and symlinks are followed.
+    """
+    base = os.path.realpath(base_dir)
+    resolved = os.path.realpath(os.path.join(base, path))
+    if os.path.commonpath([base, resolved]) != base:
+        raise ValueError(f"{path} is outside the bulk ingestion directory")
+    return resolved
+
+def load_manifest(manifest_path: str, base_dir: Optional[str] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield the claims of a bulk manifest as {"claim_id": ..., "files": [...]}.
+
+    The manifest is either a JSONL file with one claim per line, whose file
+    paths are relative to the manifest, or a directory holding one folder of
+    PDF files per claim. With `base_dir`, a claim file outside it raises
+    ValueError.
+    """
+    def claim_file(path: str) -> str:
+        return resolve_bulk_path(path, base_dir) if base_dir else path
+
+    if os.path.isdir(manifest_path):
+        for entry in sorted(os.scandir(manifest_path), key=lambda entry: entry.name):
+            if not entry.is_dir():
+                continue
+            files = sorted(
+                claim_file(os.path.join(entry.path, name))
+                for name in os.listdir(entry.path)
+                if name.lower().endswith(".pdf")
+            )
+            if files:
+                yield {"claim_id": entry.name, "files": files}
+        return
+
+    manifest_dir = os.path.dirname(os.path.abspath(manifest_path))
+    with open(manifest_path, "r", encoding="utf-8") as manifest:
+        for line_number, line in enumerate(manifest, start=1):
+            if not line.strip():
+                continue
+            claim = json.loads(line)
+            if "claim_id" not in claim or not claim.get("files"):
+                raise ValueError(f"Manifest line {line_number} needs a claim_id and a list of files")
+            yield {
+                "claim_id": str(claim["claim_id"]),
+                "files": [claim_file(os.path.join(manifest_dir, path)) for path in claim["files"]]
+            }
+
+class JsonlResultWriter:
+    """Appends one JSON line per claim, flushed immediately."""
+
+    def __init__(self, path: str, append: bool = True):
+        self._file = open(path, "a" if append else "w", encoding="utf-8")
+
+    def write(self, row: Dict[str, Any]) -> List[str]:
+        """Write a result row and return the claim IDs now durably stored."""
+        self._file.write(json.dumps(row) + "\n")
+        self._file.flush()
+        return [row["claim_id"]]
+
+    def close(self) -> List[str]:
+        self._file.close()
+        return []
+
+class ParquetResultWriter:
+    """Writes result rows to Parquet in row groups. Requires pyarrow."""
+
+    def __init__(self, path: str, append: bool = True, batch_size: int = 100):
+        try:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+        except ImportError:
+            raise RuntimeError("Parquet output requires pyarrow (pip install pyarrow)")
+        self._pa = pa
+        self._schema = pa.schema([
+            ("claim_id", pa.string()),
+            ("status", pa.string()),
+            ("result", pa.string()),
+            ("error", pa.string())
+        ])
+        # Parquet files cannot be appended to, so a resumed run writes a new part file
+        part = 0
+        root, extension = os.path.splitext(path)
+        while append and os.path.exists(path):
+            part += 1
+            path = f"{root}.part-{part}{extension}"
+        self._writer = pq.ParquetWriter(path, self._schema)
+        self._batch_size = batch_size
+        self._rows: List[Dict[str, Any]] = []
+
+    def write(self, row: Dict[str, Any]) -> List[str]:
+        self._rows.append({
+            "claim_id": row["claim_id"],
+            "status": row["status"],
+            "result": json.dumps(row["result"]) if row.get("result") is not None else None,
+            "error": row.get("error")
+        })
+        if len(self._rows) >= self._batch_size:
+            return self._flush()
+        return []
+
+    def close(self) -> List[str]:
+        claim_ids = self._flush()
+        self._writer.close()
+        return claim_ids
+
+    def _flush(self) -> List[str]:
+        if not self._rows:
+            return []
+        self._writer.write_table(self._pa.Table.from_pylist(self._rows, schema=self._schema))
+        claim_ids = [row["claim_id"] for row in self._rows]
+        self._rows = []
+        return claim_ids
+
+class Checkpoint:
+    """Records claims whose results are stored so an interrupted run can resume."""
+
+    def __init__(self, path: str, resume: bool):
+        self.path = path
+        self.completed: Set[str] = set()
+        if resume and os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as checkpoint:
+                self.completed = {line.strip() for line in checkpoint if line.strip()}
+        self._file = open(path, "a" if resume else "w", encoding="utf-8")
+
+    def record(self, claim_ids: List[str]) -> None:
+        for claim_id in claim_ids:
+            self._file.write(claim_id + "\n")
+        self._file.flush()
+        self.completed.update(claim_ids)
+
+    def close(self) -> None:
+        self._file.close()
+
+class ClaimStartLimiter:
+    """Spaces out claim starts to stay under a claims-per-minute limit."""
+
+    def __init__(self, max_per_minute: float):
+        self._interval = 60.0 / max_per_minute if max_per_minute > 0 else 0.0
+        self._next_start = 0.0
+        self._lock = asyncio.Lock()
+
+    async def wait(self) -> None:
+        if not self._interval:
+            return
+        async with self._lock:
+            delay = self._next_start - time.monotonic()
+            if delay > 0:
+                await asyncio.sleep(delay)
+            self._next_start = max(self._next_start, time.monotonic()) + self._interval
+
+def create_result_writer(output_path: str, append: bool = True):
+    """Create a JSONL or Parquet writer depending on the output file extension."""
+    if output_path.endswith(".parquet"):
+        return ParquetResultWriter(output_path, append)
+    return JsonlResultWriter(output_path, append)
+
+async def process_claim_files(paths: List[str], claim_id: Optional[str] = None) -> Dict[str, Any]:
+    """Process one claim from PDF files on disk."""
+    files = []
+    try:
+        for path in paths:
+            file_obj = open(path, "rb")
+            file_obj.filename = os.path.basename(path)
+            files.append(file_obj)
+        return claim_result_to_dict(await process_claim(files, claim_id))
+    finally:
+        for file_obj in files:
+            file_obj.close()
+
+async def run_bulk_ingestion(
+    manifest_path: str,
+    output_path: str,
+    concurrency: Optional[int] = None,
+    max_claims_per_minute: Optional[float] = None,
+    resume: bool = True,
+    report_interval: float = 10.0,
+    report: Callable[[str], None] = print,
+    base_dir: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Process every claim of a manifest and stream the results to `output_path`.
+
+    Claims run with bounded concurrency and an optional claims-per-minute cap.
+    Stored results are checkpointed to `<output_path>.checkpoint`; with `resume`
+    those claims are skipped, so an interrupted run picks up where it stopped.
+    Failed claims are written to the output but not checkpointed, so they are
+    retried on resume. Throughput is reported every `report_interval` seconds.
+    With `base_dir`, the manifest, output, checkpoint and claim files must all
+    lie inside it, or ValueError is raised.
+    """
+    concurrency = concurrency or config.BULK_CONCURRENCY
+    if max_claims_per_minute is None:
+        max_claims_per_minute = config.BULK_MAX_CLAIMS_PER_MINUTE
+
+    checkpoint_path = output_path + ".checkpoint"
+    if base_dir:
+        manifest_path = resolve_bulk_path(manifest_path, base_dir)
+        output_path = resolve_bulk_path(output_path, base_dir)
+        checkpoint_path = resolve_bulk_path(checkpoint_path, base_dir)
+
+    checkpoint = Checkpoint(checkpoint_path, resume)
+    writer = create_result_writer(output_path, append=resume)
+    limiter = ClaimStartLimiter(max_claims_per_minute)
+    claims = load_manifest(manifest_path, base_dir)
+    counts = {"processed": 0, "failed": 0, "skipped": 0}
+    failed_claims: Set[str] = set()
+    started = time.monotonic()
+    last_report = started
+
+    def maybe_report(force: bool = False) -> None:
+        nonlocal last_report
+        now = time.monotonic()
+        if not force and now - last_report < report_interval:
+            return
+        last_report = now
+        done = counts["processed"] + counts["failed"]
+        rate = done / (now - started) * 60 if now > started else 0.0
+        report(
+            f"Bulk ingestion: {counts['processed']} processed, {counts['failed']} failed, "
+            f"{counts['skipped']} skipped, {rate:.1f} claims/min"
+        )
+
+    def record_stored(claim_ids: List[str]) -> None:
+        checkpoint.record([claim_id for claim_id in claim_ids if claim_id not in failed_claims])
+
+    async def worker() -> None:
+        for claim in claims:
+            if claim["claim_id"] in checkpoint.completed:
+                counts["skipped"] += 1
+                continue
+            await limiter.wait()
+            try:
+                row = {
+                    "claim_id": claim["claim_id"],
+                    "status": "completed",
+                    "result": await process_claim_files(claim["files"], claim["claim_id"])
+                }
+                counts["processed"] += 1
+            except Exception as e:
+                print(f"Error processing claim {claim['claim_id']}: {str(e)}")
+                row = {"claim_id": claim["claim_id"], "status": "failed", "result": None, "error": str(e)}
+                counts["failed"] += 1
+                failed_claims.add(claim["claim_id"])
+            record_stored(writer.write(row))
+            maybe_report()
+
+    workers = [asyncio.ensure_future(worker()) for _ in range(concurrency)]
+    try:
+        await asyncio.gather(*workers)
+    finally:
+        # A failed worker must not leave the others writing to a closed output
+        for task in workers:
+            task.cancel()
+        await asyncio.gather(*workers, return_exceptions=True)
+        record_stored(writer.close())
+        checkpoint.close()
+
+    maybe_report(force=True)
+    elapsed = time.monotonic() - started
+    done = counts["processed"] + counts["failed"]
+    return dict(
+        counts,
+        elapsed_seconds=round(elapsed, 3),
+        claims_per_minute=round(done / elapsed * 60, 2) if elapsed > 0 else 0.0
+    )
@@ -0,0 +1,248 @@
+import bisect
+import hashlib
+import threading
+import time
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .. import config
+from ..utils.sqlite_utils import connect_sqlite
+
+def bill_key(bill: Dict[str, Any]) -> Optional[str]:
+    """Return the normalized hospital, amount and service date of a bill, hashed; None if incomplete."""
+    hospital = " ".join(str(bill.get("hospital_name") or "").lower().split())
+    amount = bill.get("total_amount")
+    service_date = bill.get("date_of_service")
+    if not hospital or amount is None or not service_date:
+        return None
+    try:
+        amount = f"{float(amount):.2f}"
+    except (TypeError, ValueError):
+        return None
+    return hashlib.sha256(f"{hospital}\x1f{amount}\x1f{service_date}".encode("utf-8")).hexdigest()
+
+def member_key(id_card: Dict[str, Any]) -> Optional[str]:
+    """Return the normalized insurance ID of an ID card, or None if it has none."""
+    insurance_id = "".join(str(id_card.get("insurance_id") or "").upper().split())
+    return insurance_id or None
+
+def claim_keys(documents: List[Dict[str, Any]]) -> Tuple[Set[str], Set[str]]:
+    """Return the bill keys and insurance IDs of a claim's structured documents."""
+    bills = {bill_key(doc) for doc in documents if doc.get("type") == "bill"}
+    members = {member_key(doc) for doc in documents if doc.get("type") == "id_card"}
+    return bills - {None}, members - {None}
+
+class ClaimIndex(ABC):
+    """
+    Index of extracted fields across all processed claims.
+
+    Lookups are by key, so checking a claim never scans the claim history.
+    """
+
+    # Whether calls do blocking I/O and are run in a worker thread from async code
+    blocking = False
+
+    @abstractmethod
+    def _transaction(self):
+        """Context manager holding the index exclusively; nested uses join the outer one."""
+        pass
+
+    def check_and_record(self, claim_id: str, documents: List[Dict[str, Any]], now: Optional[float] = None) -> List[str]:
+        """
+        Check a claim against earlier ones and record it in one step, so two
+        concurrent claims with the same bill cannot both pass unflagged.
+        """
+        with self._transaction():
+            discrepancies = check_claim_history(self, documents, claim_id, now)
+            self.record(claim_id, documents, now)
+        return discrepancies
+
+    @abstractmethod
+    def record(self, claim_id: str, documents: List[Dict[str, Any]], recorded_at: Optional[float] = None) -> None:
+        """Store the keys of a completed claim, replacing any previously stored for it."""
+        pass
+
+    @abstractmethod
+    def count_bill_claims(self, key: str, exclude_claim_id: Optional[str] = None) -> int:
+        """Return the number of other claims containing the same bill."""
+        pass
+
+    @abstractmethod
+    def count_member_claims(self, insurance_id: str, since: float, exclude_claim_id: Optional[str] = None) -> int:
+        """Return the number of other claims using an insurance ID since a point in time."""
+        pass
+
+class MemoryClaimIndex(ClaimIndex):
+    """Hash index kept in process memory, with per-member claim times kept sorted."""
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._bills: Dict[str, Set[str]] = {}
+        # Per insurance ID: sorted (recorded_at, claim_id) pairs
+        self._members: Dict[str, List[Tuple[float, str]]] = {}
+        self._claims: Dict[str, Tuple[Set[str], Set[str], float]] = {}
+
+    def record(self, claim_id: str, documents: List[Dict[str, Any]], recorded_at: Optional[float] = None) -> None:
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        bills, members = claim_keys(documents)
+        with self._lock:
+            self._remove(claim_id)
+            for key in bills:
+                self._bills.setdefault(key, set()).add(claim_id)
+            for key in members:
+                bisect.insort(self._members.setdefault(key, []), (recorded_at, claim_id))
+            self._claims[claim_id] = (bills, members, recorded_at)
+
+    @contextmanager
+    def _transaction(self):
+        with self._lock:
+            yield
+
+    def _remove(self, claim_id: str) -> None:
+        previous = self._claims.pop(claim_id, None)
+        if previous is None:
+            return
+        bills, members, recorded_at = previous
+        for key in bills:
+            self._bills[key].discard(claim_id)
+            if not self._bills[key]:
+                del self._bills[key]
+        for key in members:
+            entries = self._members[key]
+            del entries[bisect.bisect_left(entries, (recorded_at, claim_id))]
+            if not entries:
+                del self._members[key]
+
+    def count_bill_claims(self, key: str, exclude_claim_id: Optional[str] = None) -> int:
+        with self._lock:
+            claim_ids = self._bills.get(key, set())
+            return len(claim_ids) - (1 if exclude_claim_id in claim_ids else 0)
+
+    def count_member_claims(self, insurance_id: str, since: float, exclude_claim_id: Optional[str] = None) -> int:
+        with self._lock:
+            entries = self._members.get(insurance_id, [])
+            count = len(entries) - bisect.bisect_left(entries, (since, ""))
+            if exclude_claim_id in self._claims:
+                _, members, recorded_at = self._claims[exclude_claim_id]
+                if insurance_id in members and recorded_at >= since:
+                    count -= 1
+            return count
+
+class SQLiteClaimIndex(ClaimIndex):
+    """Claim index in SQLite with B-tree indexes, persistent and shared by every worker process on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self._lock = threading.RLock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claim_bills (bill_key TEXT NOT NULL, claim_id TEXT NOT NULL, "
+            "PRIMARY KEY (bill_key, claim_id))"
+        )
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS claim_members (insurance_id TEXT NOT NULL, recorded_at REAL NOT NULL, "
+            "claim_id TEXT NOT NULL, PRIMARY KEY (insurance_id, recorded_at, claim_id))"
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_claim_bills_claim_id ON claim_bills (claim_id)")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_claim_members_claim_id ON claim_members (claim_id)")
+
+    def record(self, claim_id: str, documents: List[Dict[str, Any]], recorded_at: Optional[float] = None) -> None:
+        recorded_at = time.time() if recorded_at is None else recorded_at
+        bills, members = claim_keys(documents)
+        with self._transaction():
+            self._conn.execute("DELETE FROM claim_bills WHERE claim_id = ?", (claim_id,))
+            self._conn.execute("DELETE FROM claim_members WHERE claim_id = ?", (claim_id,))
+            self._conn.executemany(
+                "INSERT INTO claim_bills (bill_key, claim_id) VALUES (?, ?)",
+                [(key, claim_id) for key in bills]
+            )
+            self._conn.executemany(
+                "INSERT INTO claim_members (insurance_id, recorded_at, claim_id) VALUES (?, ?, ?)",
+                [(key, recorded_at, claim_id) for key in members]
+            )
+
+    @contextmanager
+    def _transaction(self):
+        # BEGIN IMMEDIATE takes the write lock up front, so other worker processes wait for the whole check and insert
+        with self._lock:
+            if self._conn.in_transaction:
+                yield
+                return
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def count_bill_claims(self, key: str, exclude_claim_id: Optional[str] = None) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM claim_bills WHERE bill_key = ? AND claim_id != ?",
+                (key, exclude_claim_id or "")
+            ).fetchone()[0]
+
+    def count_member_claims(self, insurance_id: str, since: float, exclude_claim_id: Optional[str] = None) -> int:
+        with self._lock:
+            return self._conn.execute(
+                "SELECT COUNT(*) FROM claim_members WHERE insurance_id = ? AND recorded_at >= ? AND claim_id != ?",
+                (insurance_id, since, exclude_claim_id or "")
+            ).fetchone()[0]
+
+def check_claim_history(
+    index: ClaimIndex,
+    documents: List[Dict[str, Any]],
+    claim_id: Optional[str] = None,
+    now: Optional[float] = None
+) -> List[str]:
+    """Return duplicate-bill and insurance ID velocity discrepancies of a claim against earlier claims."""
+    now = time.time() if now is None else now
+    discrepancies = []
+    for doc in documents:
+        if doc.get("type") == "bill":
+            key = bill_key(doc)
+            count = index.count_bill_claims(key, claim_id) if key else 0
+            if count:
+                discrepancies.append(
+                    f"Duplicate bill: {doc.get('hospital_name')} bill of {doc.get('total_amount')} on "
+                    f"{doc.get('date_of_service')} was already submitted in {count} other claim(s)"
+                )
+        elif doc.get("type") == "id_card":
+            key = member_key(doc)
+            if not key:
+                continue
+            window = config.CLAIM_VELOCITY_WINDOW_DAYS * 24 * 3600
+            count = index.count_member_claims(key, now - window, claim_id) + 1
+            if count > config.CLAIM_VELOCITY_MAX_CLAIMS:
+                discrepancies.append(
+                    f"Insurance ID {doc.get('insurance_id')} was used in {count} claims in the last "
+                    f"{config.CLAIM_VELOCITY_WINDOW_DAYS:g} days"
+                )
+    return discrepancies
+
+def index_claim(claim_id: str, documents: List[Dict[str, Any]]) -> None:
+    """Add a completed claim to the shared claim index, if it is enabled."""
+    claim_index = get_claim_index()
+    if claim_index is not None:
+        claim_index.record(claim_id, documents)
+
+_claim_index: Optional[ClaimIndex] = None
+
+def get_claim_index() -> Optional[ClaimIndex]:
+    """Return the shared claim index selected by CLAIM_INDEX, or None if it is disabled."""
+    global _claim_index
+    if config.CLAIM_INDEX == "none":
+        return None
+    if _claim_index is None:
+        if config.CLAIM_INDEX == "sqlite":
+            _claim_index = SQLiteClaimIndex(config.CLAIM_INDEX_PATH)
+        else:
+            _claim_index = MemoryClaimIndex()
+    return _claim_index
+
+def reset_claim_index() -> None:
+    """Drop the shared claim index so it is rebuilt from config."""
+    global _claim_index
+    _claim_index = None
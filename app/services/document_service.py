@@ -1,19 +1,48 @@
-from typing import List, Dict, Any, BinaryIO
+from typing import List, Dict, Any, BinaryIO, Optional, Tuple
+from .. import config
+from ..agents.registry import get_document_types
+from ..utils.async_utils import gather_with_limit
 from ..utils.pdf_utils import process_pdf_files
 from ..utils.llm_utils import classify_document_with_gemini
+from ..utils.heuristic_classifier import local_classifier, classification_stats
+
+def classify_locally(doc: Dict[str, Any]) -> Tuple[str, float]:
+    """Return the local keyword classifier's guess of a document's type and its confidence."""
+    return local_classifier.classify(doc.get("preview") or doc["content"], doc["filename"])
+
+async def classify_document(doc: Dict[str, Any], local_guess: Optional[Tuple[str, float]] = None) -> Dict[str, Any]:
+    """
+    Classify a single document by type and record it on the document.
+
+    The local keyword classifier runs first, unless its guess is passed in as
+    `local_guess`; Gemini is only called when its confidence is below
+    LOCAL_CLASSIFIER_THRESHOLD. Both only look at the first
+    CLASSIFICATION_MAX_PAGES pages of the document.
+    """
+    text = doc.get("preview") or doc["content"]
+    local_type, confidence = local_guess or classify_locally(doc)
+    if confidence >= config.LOCAL_CLASSIFIER_THRESHOLD:
+        classification_stats.record_local()
+        doc["type"] = local_type
+        return doc
+
+    doc["type"] = await classify_document_with_gemini(text, doc["filename"], get_document_types())
+    classification_stats.record_llm(local_type, confidence, doc["type"])
+    return doc
 
 async def process_documents(files: List[BinaryIO]) -> List[Dict[str, Any]]:
     """
     Process uploaded documents:
     1. Extract text from PDFs
-    2. Classify documents by type
+    2. Classify documents by type (concurrently)
     """
     # Extract text from PDFs
     documents = await process_pdf_files(files)
-    
-    # Classify each document
-    for doc in documents:
-        doc_type = await classify_document_with_gemini(doc["content"], doc["filename"])
-        doc["type"] = doc_type
-    
-    return documents
\ No newline at end of file
+
+    # Classify all documents concurrently
+    await gather_with_limit(
+        [classify_document(doc) for doc in documents],
+        config.MAX_CONCURRENT_DOCUMENTS
+    )
+
+    return documents
@@ -0,0 +1,292 @@
+import asyncio
+import json
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional
+from urllib.parse import urlsplit
+import httpx
+from .. import config
+from ..utils.sqlite_utils import call_store, connect_sqlite
+
+JOB_FIELDS = ("job_id", "kind", "status", "created_at", "updated_at", "result", "error", "webhook_url")
+FINISHED_STATUSES = ("completed", "failed")
+
+class JobQueueFullError(Exception):
+    """Raised when the job queue cannot accept more jobs."""
+    pass
+
+class InvalidWebhookError(Exception):
+    """Raised when a completion webhook URL is malformed or its host is not allowed."""
+    pass
+
+def validate_webhook_url(webhook_url: str) -> None:
+    """
+    Check that a webhook URL is http(s) and points at a host of
+    JOB_WEBHOOK_ALLOWED_HOSTS, since finished jobs hold claim results.
+    """
+    try:
+        parts = urlsplit(webhook_url)
+        host = (parts.hostname or "").lower()
+        # Reading the port rejects a malformed one
+        parts.port
+    except ValueError:
+        raise InvalidWebhookError(f"Invalid webhook URL {webhook_url}")
+    if parts.scheme not in ("http", "https") or not host:
+        raise InvalidWebhookError(f"Webhook URL {webhook_url} must be an http or https URL")
+    allowed = {allowed_host.strip().lower() for allowed_host in config.JOB_WEBHOOK_ALLOWED_HOSTS.split(",") if allowed_host.strip()}
+    if host not in allowed:
+        raise InvalidWebhookError(f"Webhook host {host} is not in JOB_WEBHOOK_ALLOWED_HOSTS")
+
+class JobStore(ABC):
+    """Base class for job state storage backends."""
+
+    # Whether calls do blocking I/O and are run in a worker thread from async code
+    blocking = False
+
+    @abstractmethod
+    def create(self, job: Dict[str, Any]) -> None:
+        """Store a new job."""
+        pass
+
+    @abstractmethod
+    def update(self, job_id: str, **fields: Any) -> None:
+        """Update fields of an existing job."""
+        pass
+
+    @abstractmethod
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return a job, or None if it does not exist."""
+        pass
+
+    @abstractmethod
+    def purge(self, older_than: float) -> None:
+        """Delete finished jobs last updated before `older_than`."""
+        pass
+
+class MemoryJobStore(JobStore):
+    """Job store kept in process memory."""
+
+    def __init__(self):
+        self._jobs: Dict[str, Dict[str, Any]] = {}
+
+    def create(self, job: Dict[str, Any]) -> None:
+        self._jobs[job["job_id"]] = dict(job)
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if job_id in self._jobs:
+            self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        job = self._jobs.get(job_id)
+        return dict(job) if job else None
+
+    def purge(self, older_than: float) -> None:
+        for job_id in [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in FINISHED_STATUSES and job["updated_at"] < older_than]:
+            del self._jobs[job_id]
+
+class SQLiteJobStore(JobStore):
+    """Job store in SQLite, shared by every worker process on the host."""
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS jobs (
+                job_id TEXT PRIMARY KEY,
+                kind TEXT NOT NULL,
+                status TEXT NOT NULL,
+                created_at REAL NOT NULL,
+                updated_at REAL NOT NULL,
+                result TEXT,
+                error TEXT,
+                webhook_url TEXT
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_updated_at ON jobs (updated_at)")
+
+    def create(self, job: Dict[str, Any]) -> None:
+        row = dict(job, result=json.dumps(job.get("result")))
+        with self._lock:
+            self._conn.execute(
+                f"INSERT INTO jobs ({', '.join(JOB_FIELDS)}) VALUES ({', '.join('?' for _ in JOB_FIELDS)})",
+                tuple(row.get(field) for field in JOB_FIELDS)
+            )
+
+    def update(self, job_id: str, **fields: Any) -> None:
+        if "result" in fields:
+            fields["result"] = json.dumps(fields["result"])
+        assignments = ", ".join(f"{field} = ?" for field in fields)
+        with self._lock:
+            self._conn.execute(f"UPDATE jobs SET {assignments} WHERE job_id = ?", (*fields.values(), job_id))
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(JOB_FIELDS)} FROM jobs WHERE job_id = ?", (job_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        job = dict(zip(JOB_FIELDS, row))
+        job["result"] = json.loads(job["result"]) if job["result"] else None
+        return job
+
+    def purge(self, older_than: float) -> None:
+        with self._lock:
+            self._conn.execute(
+                "DELETE FROM jobs WHERE status IN ('completed', 'failed') AND updated_at < ?", (older_than,)
+            )
+
+def create_job_store() -> JobStore:
+    """Create the job store selected by JOB_STORE."""
+    if config.JOB_STORE == "sqlite":
+        return SQLiteJobStore(config.JOB_STORE_PATH)
+    return MemoryJobStore()
+
+JobFunc = Callable[[], Awaitable[Any]]
+
+class JobManager:
+    """
+    Runs jobs on a bounded pool of background workers.
+
+    Job state is written to a JobStore so any worker process can report it.
+    Jobs are refused with JobQueueFullError once JOB_QUEUE_SIZE jobs are waiting.
+    """
+
+    def __init__(self, store: JobStore):
+        self.store = store
+        self._queue: Optional[asyncio.Queue] = None
+        self._workers = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def _ensure_started(self) -> None:
+        """Start the workers on the running event loop if not already running there."""
+        loop = asyncio.get_running_loop()
+        if self._loop is loop and self._queue is not None:
+            return
+        self._loop = loop
+        self._queue = asyncio.Queue(maxsize=config.JOB_QUEUE_SIZE)
+        self._workers = [asyncio.create_task(self._worker()) for _ in range(config.JOB_WORKERS)]
+
+    async def shutdown(self) -> None:
+        """Stop the background workers and fail the jobs still waiting in the queue."""
+        for worker in self._workers:
+            worker.cancel()
+        await asyncio.gather(*self._workers, return_exceptions=True)
+        while self._queue is not None and not self._queue.empty():
+            job_id, _, _, cleanup = self._queue.get_nowait()
+            await call_store(
+                self.store, self.store.update, job_id,
+                status="failed", error="Server shut down before the job ran", updated_at=time.time()
+            )
+            if cleanup:
+                cleanup()
+        self._workers = []
+        self._queue = None
+
+    async def submit(
+        self,
+        func: JobFunc,
+        kind: str = "claim",
+        webhook_url: Optional[str] = None,
+        cleanup: Optional[Callable[[], None]] = None
+    ) -> str:
+        """Queue a job and return its ID. Raises InvalidWebhookError for a webhook URL that is not allowed."""
+        if webhook_url:
+            try:
+                validate_webhook_url(webhook_url)
+            except InvalidWebhookError:
+                if cleanup:
+                    cleanup()
+                raise
+        self._ensure_started()
+        queue_full = JobQueueFullError("Too many claims are queued, try again later")
+        if self._queue.full():
+            if cleanup:
+                cleanup()
+            raise queue_full
+        now = time.time()
+        await call_store(self.store, self.store.purge, now - config.JOB_TTL_SECONDS)
+
+        # The job is stored before it is queued, so a worker never updates a job that does not exist yet
+        job_id = uuid.uuid4().hex
+        await call_store(self.store, self.store.create, {
+            "job_id": job_id,
+            "kind": kind,
+            "status": "queued",
+            "created_at": now,
+            "updated_at": now,
+            "result": None,
+            "error": None,
+            "webhook_url": webhook_url
+        })
+        try:
+            self._queue.put_nowait((job_id, func, webhook_url, cleanup))
+        except asyncio.QueueFull:
+            # Other jobs filled the queue while this one was being stored
+            await call_store(self.store, self.store.update, job_id, status="failed", error=str(queue_full), updated_at=time.time())
+            if cleanup:
+                cleanup()
+            raise queue_full
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Return the current state of a job."""
+        return await call_store(self.store, self.store.get, job_id)
+
+    async def _worker(self) -> None:
+        while True:
+            job = await self._queue.get()
+            try:
+                await self._run(*job)
+            except Exception as e:
+                # One job must never stop the worker pool
+                print(f"Error running job {job[0]}: {str(e)}")
+            finally:
+                self._queue.task_done()
+
+    async def _run(self, job_id: str, func: JobFunc, webhook_url: Optional[str], cleanup: Optional[Callable[[], None]]) -> None:
+        await call_store(self.store, self.store.update, job_id, status="running", updated_at=time.time())
+        try:
+            result = await func()
+            await call_store(self.store, self.store.update, job_id, status="completed", result=result, updated_at=time.time())
+        except asyncio.CancelledError:
+            # The store is written directly: awaiting a worker thread here could be cancelled again
+            self.store.update(job_id, status="failed", error="Job was cancelled", updated_at=time.time())
+            raise
+        except Exception as e:
+            print(f"Error processing job {job_id}: {str(e)}")
+            await call_store(self.store, self.store.update, job_id, status="failed", error=str(e), updated_at=time.time())
+        finally:
+            if cleanup:
+                cleanup()
+
+        if webhook_url:
+            await self._notify(webhook_url, await self.get(job_id))
+
+    async def _notify(self, webhook_url: str, job: Dict[str, Any]) -> None:
+        """POST the finished job to its completion webhook."""
+        try:
+            async with httpx.AsyncClient(timeout=config.JOB_WEBHOOK_TIMEOUT_SECONDS) as client:
+                await client.post(webhook_url, json=job)
+        except Exception as e:
+            print(f"Error calling webhook {webhook_url}: {str(e)}")
+
+_job_manager: Optional[JobManager] = None
+
+def get_job_manager() -> JobManager:
+    """Return the shared job manager, creating it on first use."""
+    global _job_manager
+    if _job_manager is None:
+        _job_manager = JobManager(create_job_store())
+    return _job_manager
+
+def public_job(job: Dict[str, Any]) -> Dict[str, Any]:
+    """Return the fields of a job that are exposed through the API."""
+    return {field: job[field] for field in JOB_FIELDS if field != "webhook_url"}
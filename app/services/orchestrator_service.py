@@ -1,57 +1,108 @@
-from typing import Dict, List, Any
-from langgraph.graph import StateGraph, END
-from langgraph.prebuilt import ToolNode
+from typing import Dict, List, Any, Optional
 import asyncio
+import uuid
 
-from ..services.document_service import process_documents
-from ..services.ai_service import extract_structured_data
+from ..utils.pdf_utils import process_pdf_files
+from ..utils.sqlite_utils import call_store
+from ..services.ai_service import DocumentCallback, classify_and_extract_documents
+from ..services.claim_index_service import get_claim_index
 from ..services.validation_service import validate_claim_documents
-from ..models.schemas import ClaimProcessingResult
+from ..models.normalization import build_documents
+from ..models.schemas import ClaimDecision, ClaimProcessingResult, Document, ValidationResult
+from ..utils.telemetry import record_claim, trace_span, traced
 
 class ClaimProcessingState(Dict):
     """State object for the claim processing workflow."""
     files: List[Any]
+    claim_id: str = None
+    on_document: DocumentCallback = None
+    stored_documents: List[Dict[str, Any]] = None
     processed_documents: List[Dict[str, Any]] = None
+    document_entries: List[Dict[str, Any]] = None
+    rejected_documents: List[str] = None
     structured_data: List[Dict[str, Any]] = None
-    validation_result: Dict[str, Any] = None
-    claim_decision: Dict[str, Any] = None
-    final_result: Dict[str, Any] = None
+    documents: List[Document] = None
+    validation_result: ValidationResult = None
+    claim_decision: ClaimDecision = None
+    final_result: ClaimProcessingResult = None
 
+@traced("graph.document_processor")
 async def document_processor(state: ClaimProcessingState) -> ClaimProcessingState:
-    """Process the uploaded documents to extract text and classify them."""
-    processed_documents = await process_documents(state["files"])
+    """Process the uploaded documents to extract their text."""
+    processed_documents = await process_pdf_files(state["files"])
     return {"processed_documents": processed_documents}
 
+def merge_document_entries(stored: List[Dict[str, Any]], entries: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Add new {"filename", "data"} document entries to stored ones.
+
+    A stored entry with the same filename or, since a claim holds one document
+    of each type, the same document type as a new entry is dropped.
+    """
+    filenames = {entry["filename"] for entry in entries}
+    doc_types = {entry["data"]["type"] for entry in entries}
+    return [
+        existing for existing in stored
+        if existing["filename"] not in filenames and existing["data"]["type"] not in doc_types
+    ] + entries
+
+@traced("graph.data_extractor")
 async def data_extractor(state: ClaimProcessingState) -> ClaimProcessingState:
-    """Extract structured data from the processed documents."""
-    structured_data = await extract_structured_data(state["processed_documents"])
-    return {"structured_data": structured_data}
+    """
+    Classify the processed documents, extract their structured data and build their typed models.
 
-async def claim_validator(state: ClaimProcessingState) -> ClaimProcessingState:
-    """Validate the claim based on the structured data."""
-    validation_result, claim_decision = validate_claim_documents(state["structured_data"])
+    The claim is made of the new documents merged into `stored_documents`, the
+    documents a claim session already holds. Documents of a type without an
+    agent are listed in `rejected_documents`.
+    """
+    processed_documents = state["processed_documents"]
+    on_document = state.get("on_document")
+    extracted: Dict[int, Dict[str, Any]] = {}
+
+    async def record_document(index: int, doc: Dict[str, Any], structured_data: Dict[str, Any]) -> None:
+        extracted[index] = structured_data
+        if on_document is not None:
+            await on_document(index, doc, structured_data)
+
+    await classify_and_extract_documents(processed_documents, record_document)
+    entries = [
+        {"filename": doc.get("filename", ""), "data": extracted[index]}
+        for index, doc in enumerate(processed_documents) if index in extracted
+    ]
+    rejected = [doc.get("filename", "") for index, doc in enumerate(processed_documents) if index not in extracted]
+    structured_data = [entry["data"] for entry in merge_document_entries(state.get("stored_documents") or [], entries)]
     return {
-        "validation_result": validation_result.model_dump(),
-        "claim_decision": claim_decision.model_dump()
+        "document_entries": entries,
+        "rejected_documents": rejected,
+        "structured_data": structured_data,
+        "documents": build_documents(structured_data)
     }
 
+@traced("graph.claim_validator")
+async def claim_validator(state: ClaimProcessingState) -> ClaimProcessingState:
+    """Validate the claim based on the structured data and add it to the claim index."""
+    # A claim without an ID is new, so nothing already in the index is excluded from its checks
+    claim_id = state.get("claim_id") or uuid.uuid4().hex
+    validation_result, claim_decision = await call_store(
+        get_claim_index(), validate_claim_documents, state["structured_data"], claim_id, record=True
+    )
+    return {"validation_result": validation_result, "claim_decision": claim_decision}
+
+@traced("graph.result_formatter")
 async def result_formatter(state: ClaimProcessingState) -> ClaimProcessingState:
-    """Format the final result."""
-    documents = state["structured_data"]
-    # Remove internal fields like validation_issues
-    for doc in documents:
-        if "validation_issues" in doc:
-            del doc["validation_issues"]
-    
-    final_result = {
-        "documents": documents,
-        "validation": state["validation_result"],
-        "claim_decision": state["claim_decision"]
-    }
+    """Assemble the final result from the models built by the earlier nodes, without validating them again."""
+    final_result = ClaimProcessingResult.model_construct(
+        documents=state["documents"],
+        validation=state["validation_result"],
+        claim_decision=state["claim_decision"]
+    )
     return {"final_result": final_result}
 
 def create_workflow_graph():
     """Create and configure the workflow graph for claim processing."""
+    # langgraph takes most of the application's import time, so it is loaded when the graph is first built
+    from langgraph.graph import StateGraph, END
+
     # Create a new graph
     graph = StateGraph(ClaimProcessingState)
     
@@ -72,12 +123,65 @@ def create_workflow_graph():
     
     return graph.compile()
 
-async def process_claim(files: List[Any]) -> ClaimProcessingResult:
-    """Process a claim using the workflow graph."""
-    graph = create_workflow_graph()
-    initial_state = {"files": files}
+# Compiled workflow graph shared by all claims
+_workflow_graph = None
+
+def get_workflow_graph():
+    """Return the shared compiled workflow graph, compiling it on first use."""
+    global _workflow_graph
+    if _workflow_graph is None:
+        _workflow_graph = create_workflow_graph()
+    return _workflow_graph
+
+async def process_claim(
+    files: List[Any],
+    claim_id: Optional[str] = None,
+    on_document: Optional[DocumentCallback] = None
+) -> ClaimProcessingResult:
+    """
+    Process a claim using the workflow graph.
+
+    `claim_id` identifies the claim in the cross-claim index; processing the
+    same claim_id again replaces its entry. Without one, the claim gets a new
+    ID, so resubmitted documents are checked against their earlier submission.
+    `on_document` is awaited for each document as soon as it is extracted and
+    validated, before the claim as a whole is validated.
+    """
+    result = await run_claim_workflow(files, claim_id, on_document)
+    return result["final_result"]
+
+async def run_claim_workflow(
+    files: List[Any],
+    claim_id: Optional[str] = None,
+    on_document: Optional[DocumentCallback] = None,
+    stored_documents: Optional[List[Dict[str, Any]]] = None
+) -> Dict[str, Any]:
+    """
+    Run the workflow graph on a claim and return its final state.
+
+    Like process_claim, with the {"filename", "data"} entries of documents a
+    claim session already holds passed as `stored_documents`. The state also
+    holds the entries of the new documents in `document_entries` and the
+    filenames of those that were not recognised in `rejected_documents`.
+    """
+    graph = get_workflow_graph()
+    initial_state = {"files": files, "claim_id": claim_id}
+    if on_document is not None:
+        initial_state["on_document"] = on_document
+    if stored_documents is not None:
+        initial_state["stored_documents"] = stored_documents
     
     # Run the workflow
-    result = await graph.ainvoke(initial_state)
+    with trace_span("claim.process", {"claim.documents": len(files)}) as span:
+        result = await graph.ainvoke(initial_state)
+        status = result["final_result"].claim_decision.status
+        span.set_attribute("claim.status", status)
+    record_claim(status)
     
-    return result["final_result"]
\ No newline at end of file
+    return result
+
+def claim_result_to_dict(result: Any) -> Dict[str, Any]:
+    """Return a claim result as JSON-ready data; plain dicts are validated against ClaimProcessingResult first."""
+    if not isinstance(result, ClaimProcessingResult):
+        result = ClaimProcessingResult.model_validate(result)
+    return result.model_dump(mode="json")
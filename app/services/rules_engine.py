@@ -0,0 +1,227 @@
+import json
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+from .. import config
+
+class RuleConfigError(Exception):
+    """Raised when the validation rules file contains an unknown or incomplete rule."""
+    pass
+
+# Marks a value that could not be parsed
+_INVALID = object()
+
+class ParsedDocument:
+    """A structured document whose values are parsed at most once, however many rules read them."""
+
+    __slots__ = ("data", "_dates", "_numbers")
+
+    def __init__(self, data: Dict[str, Any]):
+        self.data = data
+        self._dates: Dict[str, Any] = {}
+        self._numbers: Dict[str, Any] = {}
+
+    def date(self, field: str) -> Any:
+        """Return the field as a datetime, or _INVALID if it is not an ISO date."""
+        if field not in self._dates:
+            try:
+                self._dates[field] = datetime.fromisoformat(str(self.data[field]))
+            except (ValueError, TypeError):
+                self._dates[field] = _INVALID
+        return self._dates[field]
+
+    def number(self, field: str) -> Any:
+        """Return the field as a float, or _INVALID if it is not a number."""
+        if field not in self._numbers:
+            try:
+                self._numbers[field] = float(self.data[field])
+            except (ValueError, TypeError):
+                self._numbers[field] = _INVALID
+        return self._numbers[field]
+
+# A compiled document rule returns the issues of one document
+DocumentRule = Callable[[ParsedDocument, datetime], List[str]]
+# A compiled claim rule returns a discrepancy, or None, for a claim's documents indexed by type
+ClaimRule = Callable[[Dict[str, ParsedDocument]], Optional[str]]
+
+def _require(rule: Dict[str, Any], *keys: str) -> None:
+    missing = [key for key in keys if key not in rule]
+    if missing:
+        raise RuleConfigError(f"Rule {rule.get('check')!r} needs {', '.join(missing)}")
+
+def _compile_required(rule: Dict[str, Any]) -> DocumentRule:
+    _require(rule, "fields", "message")
+    fields, message = list(rule["fields"]), rule["message"]
+
+    def check(doc: ParsedDocument, now: datetime) -> List[str]:
+        return [message.format(field=field) for field in fields if not doc.data.get(field)]
+    return check
+
+def _compile_positive_number(rule: Dict[str, Any]) -> DocumentRule:
+    _require(rule, "field", "message", "invalid_message")
+    field, message, invalid_message = rule["field"], rule["message"], rule["invalid_message"]
+
+    def check(doc: ParsedDocument, now: datetime) -> List[str]:
+        if field not in doc.data:
+            return []
+        value = doc.number(field)
+        if value is _INVALID:
+            return [invalid_message]
+        return [message] if value <= 0 else []
+    return check
+
+def _compile_date_order(rule: Dict[str, Any]) -> DocumentRule:
+    _require(rule, "before", "after", "message", "invalid_message")
+    before, after, message, invalid_message = rule["before"], rule["after"], rule["message"], rule["invalid_message"]
+
+    def check(doc: ParsedDocument, now: datetime) -> List[str]:
+        if before not in doc.data or after not in doc.data:
+            return []
+        first, second = doc.date(before), doc.date(after)
+        if first is _INVALID or second is _INVALID:
+            return [invalid_message]
+        try:
+            return [message] if first > second else []
+        except TypeError:
+            # Dates with and without a time zone
+            return [invalid_message]
+    return check
+
+def _compile_not_expired(rule: Dict[str, Any]) -> DocumentRule:
+    _require(rule, "field", "message", "invalid_message")
+    field, message, invalid_message = rule["field"], rule["message"], rule["invalid_message"]
+
+    def check(doc: ParsedDocument, now: datetime) -> List[str]:
+        if not doc.data.get(field):
+            return []
+        expiration = doc.date(field)
+        if expiration is _INVALID:
+            return [invalid_message]
+        try:
+            return [message] if expiration < now else []
+        except TypeError:
+            return [invalid_message]
+    return check
+
+def _compile_fields_equal(rule: Dict[str, Any]) -> ClaimRule:
+    _require(rule, "left", "right", "message")
+    left_type, left_field = rule["left"].split(".", 1)
+    right_type, right_field = rule["right"].split(".", 1)
+    message = rule["message"]
+
+    def check(documents: Dict[str, ParsedDocument]) -> Optional[str]:
+        left, right = documents.get(left_type), documents.get(right_type)
+        if left is None or right is None:
+            return None
+        return message if left.data.get(left_field) != right.data.get(right_field) else None
+    return check
+
+DOCUMENT_CHECKS: Dict[str, Callable[[Dict[str, Any]], DocumentRule]] = {
+    "required": _compile_required,
+    "positive_number": _compile_positive_number,
+    "date_order": _compile_date_order,
+    "not_expired": _compile_not_expired,
+}
+
+CLAIM_CHECKS: Dict[str, Callable[[Dict[str, Any]], ClaimRule]] = {
+    "fields_equal": _compile_fields_equal,
+}
+
+def _compile(rule: Dict[str, Any], checks: Dict[str, Callable]) -> Callable:
+    compiler = checks.get(rule.get("check"))
+    if compiler is None:
+        raise RuleConfigError(f"Unknown validation check {rule.get('check')!r}")
+    return compiler(rule)
+
+class RulesEngine:
+    """
+    Validation rules compiled once into plain functions.
+
+    Per-document rules run against each document of their type and cross-document
+    rules against a claim's documents indexed by type. Every value is parsed at
+    most once per document, and a batch of claims is validated rule by rule in
+    a single pass.
+    """
+
+    def __init__(self, rules: Dict[str, Any]):
+        self.required_documents: List[str] = list(rules.get("required_documents", []))
+        self.document_rules: Dict[str, List[DocumentRule]] = {
+            doc_type: [_compile(rule, DOCUMENT_CHECKS) for rule in doc_rules]
+            for doc_type, doc_rules in rules.get("documents", {}).items()
+        }
+        self.claim_rules: List[ClaimRule] = [_compile(rule, CLAIM_CHECKS) for rule in rules.get("claim", [])]
+
+    @classmethod
+    def from_file(cls, path: str) -> "RulesEngine":
+        with open(path, "r", encoding="utf-8") as rules_file:
+            return cls(json.load(rules_file))
+
+    def validate_document(self, doc_type: str, data: Dict[str, Any], now: Optional[datetime] = None) -> List[str]:
+        """Return the issues of one structured document."""
+        parsed = ParsedDocument(data)
+        now = now or datetime.now()
+        return [issue for rule in self.document_rules.get(doc_type, []) for issue in rule(parsed, now)]
+
+    def validate_claims(
+        self,
+        claims: List[List[Dict[str, Any]]],
+        check_documents: bool = True
+    ) -> List[Tuple[List[str], List[str]]]:
+        """
+        Validate a batch of claims and return (missing_documents, discrepancies) per claim.
+
+        Documents carrying `validation_issues` from their agent keep them. With
+        `check_documents` the document rules are applied to the others, one rule
+        at a time across all documents of its type; otherwise only the recorded
+        issues are reported.
+        """
+        now = datetime.now()
+        parsed_claims = [[ParsedDocument(doc) for doc in documents] for documents in claims]
+
+        # Documents of all claims that still need their document rules, grouped by type
+        issues: Dict[int, List[str]] = {}
+        by_type: Dict[str, List[ParsedDocument]] = {}
+        for documents in parsed_claims if check_documents else []:
+            for doc in documents:
+                if "validation_issues" not in doc.data and doc.data.get("type") in self.document_rules:
+                    issues[id(doc)] = []
+                    by_type.setdefault(doc.data["type"], []).append(doc)
+        for doc_type, docs in by_type.items():
+            for rule in self.document_rules[doc_type]:
+                for doc in docs:
+                    issues[id(doc)].extend(rule(doc, now))
+
+        results = []
+        indexed_claims = []
+        for documents in parsed_claims:
+            # First document of each type, as the cross-document rules compare single documents
+            indexed: Dict[str, ParsedDocument] = {}
+            discrepancies = []
+            for doc in documents:
+                indexed.setdefault(doc.data["type"], doc)
+                doc_issues = issues.get(id(doc), doc.data.get("validation_issues"))
+                for issue in doc_issues or []:
+                    discrepancies.append(f"{doc.data['type']}: {issue}")
+            missing = [doc_type for doc_type in self.required_documents if doc_type not in indexed]
+            indexed_claims.append(indexed)
+            results.append((missing, discrepancies))
+
+        for rule in self.claim_rules:
+            for indexed, (_, discrepancies) in zip(indexed_claims, results):
+                discrepancy = rule(indexed)
+                if discrepancy is not None:
+                    discrepancies.append(discrepancy)
+        return results
+
+_engine: Optional[RulesEngine] = None
+
+def get_rules_engine() -> RulesEngine:
+    """Return the rules engine compiled from VALIDATION_RULES_PATH, compiling it on first use."""
+    global _engine
+    if _engine is None:
+        _engine = RulesEngine.from_file(config.VALIDATION_RULES_PATH)
+    return _engine
+
+def reset_rules_engine() -> None:
+    """Drop the compiled rules so they are read again from VALIDATION_RULES_PATH."""
+    global _engine
+    _engine = None
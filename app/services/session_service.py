@@ -0,0 +1,255 @@
+import json
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, BinaryIO, Callable, Dict, List, Optional, Tuple
+from .. import config
+from ..utils.sqlite_utils import call_store, connect_sqlite
+from .orchestrator_service import claim_result_to_dict, merge_document_entries, run_claim_workflow
+
+# Times an update is retried when another request or worker saved the session first
+SESSION_UPDATE_ATTEMPTS = 3
+
+class ClaimSessionNotFoundError(Exception):
+    """Raised when a claim session does not exist or has expired."""
+    pass
+
+class ClaimSessionConflictError(Exception):
+    """Raised when a claim session was saved by someone else since it was read."""
+    pass
+
+class SessionStore(ABC):
+    """Base class for claim session storage backends."""
+
+    # Whether calls do blocking I/O and are run in a worker thread from async code
+    blocking = False
+
+    @abstractmethod
+    def save(self, session: Dict[str, Any]) -> None:
+        """
+        Store a new or updated session and move its `version` on.
+
+        Raises ClaimSessionConflictError unless the stored session is still at
+        the version the session was read at, or is absent for a new session.
+        """
+        pass
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """Return a session, or None if it does not exist."""
+        pass
+
+    @abstractmethod
+    def purge(self, older_than: float) -> None:
+        """Delete sessions last updated before `older_than`."""
+        pass
+
+class MemorySessionStore(SessionStore):
+    """Session store kept in process memory."""
+
+    def __init__(self):
+        # Last update time, version and serialized session, so callers never share state with the store
+        self._sessions: Dict[str, Tuple[float, int, str]] = {}
+
+    def save(self, session: Dict[str, Any]) -> None:
+        stored = self._sessions.get(session["session_id"])
+        version = session.get("version", 0)
+        if (stored[1] if stored else 0) != version:
+            raise ClaimSessionConflictError(f"Claim session {session['session_id']} was changed concurrently")
+        session["version"] = version + 1
+        self._sessions[session["session_id"]] = (session["updated_at"], version + 1, json.dumps(session))
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        session = self._sessions.get(session_id)
+        return json.loads(session[2]) if session else None
+
+    def purge(self, older_than: float) -> None:
+        for session_id in [session_id for session_id, (updated_at, _, _) in self._sessions.items()
+                           if updated_at < older_than]:
+            del self._sessions[session_id]
+
+class SQLiteSessionStore(SessionStore):
+    """
+    Session store in SQLite, shared by every worker process on the host.
+
+    Updates are compare-and-swap on a version column, so a worker never
+    overwrites a session another worker saved after it was read.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str):
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS claim_sessions (
+                session_id TEXT PRIMARY KEY,
+                updated_at REAL NOT NULL,
+                version INTEGER NOT NULL DEFAULT 1,
+                data TEXT NOT NULL
+            )
+            """
+        )
+        # Databases created before sessions were versioned
+        if "version" not in [row[1] for row in self._conn.execute("PRAGMA table_info(claim_sessions)")]:
+            self._conn.execute("ALTER TABLE claim_sessions ADD COLUMN version INTEGER NOT NULL DEFAULT 1")
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_claim_sessions_updated_at ON claim_sessions (updated_at)")
+
+    def save(self, session: Dict[str, Any]) -> None:
+        version = session.get("version", 0)
+        data = json.dumps(dict(session, version=version + 1))
+        with self._lock:
+            if version == 0:
+                try:
+                    self._conn.execute(
+                        "INSERT INTO claim_sessions (session_id, updated_at, version, data) VALUES (?, ?, ?, ?)",
+                        (session["session_id"], session["updated_at"], version + 1, data)
+                    )
+                    saved = True
+                except sqlite3.IntegrityError:
+                    saved = False
+            else:
+                saved = self._conn.execute(
+                    "UPDATE claim_sessions SET updated_at = ?, version = ?, data = ? WHERE session_id = ? AND version = ?",
+                    (session["updated_at"], version + 1, data, session["session_id"], version)
+                ).rowcount == 1
+        if not saved:
+            raise ClaimSessionConflictError(f"Claim session {session['session_id']} was changed concurrently")
+        session["version"] = version + 1
+
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM claim_sessions WHERE session_id = ?", (session_id,)
+            ).fetchone()
+        return dict(json.loads(row[0]), version=row[1]) if row else None
+
+    def purge(self, older_than: float) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM claim_sessions WHERE updated_at < ?", (older_than,))
+
+def create_session_store() -> SessionStore:
+    """Create the session store selected by CLAIM_SESSION_STORE."""
+    if config.CLAIM_SESSION_STORE == "sqlite":
+        return SQLiteSessionStore(config.CLAIM_SESSION_STORE_PATH)
+    return MemorySessionStore()
+
+class ClaimSessionManager:
+    """
+    Keeps claims as persistent sessions that documents can be added to.
+
+    Each session stores the structured data of its documents, so adding or
+    replacing a document only classifies and extracts that document; the
+    claim is then re-validated from the stored data. Sessions go through the
+    claim workflow graph like any other claim, with the session ID as claim ID.
+    """
+
+    def __init__(self, store: SessionStore):
+        self.store = store
+
+    async def create(self, files: List[BinaryIO]) -> Dict[str, Any]:
+        """Start a session from the given documents and return its evaluation."""
+        await self.purge()
+        now = time.time()
+        session = {"session_id": uuid.uuid4().hex, "created_at": now, "updated_at": now, "documents": [], "version": 0}
+        state = await run_claim_workflow(files, session["session_id"], stored_documents=[])
+        self._apply(session, [], state["document_entries"], state["rejected_documents"], state)
+        await call_store(self.store, self.store.save, session)
+        return session
+
+    async def get(self, session_id: str) -> Dict[str, Any]:
+        session = await call_store(self.store, self.store.get, session_id)
+        if session is None or session["updated_at"] < time.time() - config.CLAIM_SESSION_TTL_SECONDS:
+            raise ClaimSessionNotFoundError(f"Claim session {session_id} not found")
+        return session
+
+    async def add_documents(self, session_id: str, files: List[BinaryIO]) -> Dict[str, Any]:
+        """
+        Process new documents on their own and merge them into the session.
+
+        A document replaces a stored one with the same filename or, since a
+        claim holds one document of each type, the same document type.
+        """
+        return await self._update(session_id, lambda documents: documents, files)
+
+    async def remove_document(self, session_id: str, filename: str) -> Dict[str, Any]:
+        """Remove a document from the session and re-evaluate the claim."""
+        def remove(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+            remaining = [entry for entry in documents if entry["filename"] != filename]
+            if len(remaining) == len(documents):
+                raise ClaimSessionNotFoundError(f"Document {filename} not found in claim session {session_id}")
+            return remaining
+
+        return await self._update(session_id, remove)
+
+    async def purge(self) -> None:
+        """Delete expired sessions."""
+        await call_store(self.store, self.store.purge, time.time() - config.CLAIM_SESSION_TTL_SECONDS)
+
+    async def _update(
+        self,
+        session_id: str,
+        change: Callable[[List[Dict[str, Any]]], List[Dict[str, Any]]],
+        files: Optional[List[BinaryIO]] = None
+    ) -> Dict[str, Any]:
+        """
+        Apply `change` to the stored documents, add the documents of `files` and save the re-evaluated session.
+
+        When the session was saved by someone else in the meantime, the update
+        is applied again to the newer session, re-validating it without
+        processing the files again.
+        """
+        entries = None
+        rejected: List[str] = []
+        for _ in range(SESSION_UPDATE_ATTEMPTS):
+            session = await self.get(session_id)
+            documents = change(session["documents"])
+            if entries is None:
+                state = await run_claim_workflow(files or [], session_id, stored_documents=documents)
+                entries, rejected = state["document_entries"], state["rejected_documents"]
+            else:
+                state = await run_claim_workflow([], session_id, stored_documents=merge_document_entries(documents, entries))
+            self._apply(session, documents, entries, rejected, state)
+            try:
+                await call_store(self.store, self.store.save, session)
+                return session
+            except ClaimSessionConflictError:
+                continue
+        raise ClaimSessionConflictError(f"Claim session {session_id} keeps changing, try again")
+
+    @staticmethod
+    def _apply(
+        session: Dict[str, Any],
+        documents: List[Dict[str, Any]],
+        entries: List[Dict[str, Any]],
+        rejected: List[str],
+        state: Dict[str, Any]
+    ) -> None:
+        """Record the merged documents and the workflow's evaluation on the session."""
+        session["documents"] = merge_document_entries(documents, entries)
+        session["rejected_documents"] = rejected
+        session["result"] = claim_result_to_dict(state["final_result"])
+        session["updated_at"] = time.time()
+
+def public_session(session: Dict[str, Any]) -> Dict[str, Any]:
+    """Return a session as exposed through the API: the claim result plus session details."""
+    return dict(
+        session["result"],
+        session_id=session["session_id"],
+        filenames=[entry["filename"] for entry in session["documents"]],
+        rejected_documents=session.get("rejected_documents", []),
+        created_at=session["created_at"],
+        updated_at=session["updated_at"]
+    )
+
+_session_manager: Optional[ClaimSessionManager] = None
+
+def get_session_manager() -> ClaimSessionManager:
+    """Return the shared claim session manager, creating it on first use."""
+    global _session_manager
+    if _session_manager is None:
+        _session_manager = ClaimSessionManager(create_session_store())
+    return _session_manager
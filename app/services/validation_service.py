@@ -1,54 +1,54 @@
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
 from ..models.schemas import ValidationResult, ClaimDecision
+from .claim_index_service import check_claim_history, get_claim_index
+from .rules_engine import get_rules_engine
 
-def validate_claim_documents(structured_documents: List[Dict[str, Any]]) -> Tuple[ValidationResult, ClaimDecision]:
+def validate_claim_documents(
+    structured_documents: List[Dict[str, Any]],
+    claim_id: Optional[str] = None,
+    record: bool = False
+) -> Tuple[ValidationResult, ClaimDecision]:
     """
     Validate the claim by:
     1. Checking for required document types
     2. Checking for data consistency across documents
-    3. Making a claim decision based on validation results
+    3. Checking for duplicate bills and insurance ID velocity across earlier claims
+    4. Making a claim decision based on validation results
+
+    `claim_id` identifies the claim in the claim index so a re-evaluated claim
+    is not reported as a duplicate of itself. With `record`, the claim is added
+    to the index in the same step as it is checked against it.
     """
-    # Initialize validation result
-    validation_result = ValidationResult()
-    
-    # Check for required document types
-    required_types = ["bill", "discharge_summary", "id_card"]
-    found_types = [doc["type"] for doc in structured_documents]
-    
-    missing_types = [req_type for req_type in required_types if req_type not in found_types]
-    validation_result.missing_documents = missing_types
-    
-    # Collect all validation issues from individual documents
-    for doc in structured_documents:
-        if "validation_issues" in doc and doc["validation_issues"]:
-            for issue in doc["validation_issues"]:
-                validation_result.discrepancies.append(f"{doc['type']}: {issue}")
-    
-    # Check for cross-document consistency
-    if "bill" in found_types and "discharge_summary" in found_types:
-        bill = next(doc for doc in structured_documents if doc["type"] == "bill")
-        discharge = next(doc for doc in structured_documents if doc["type"] == "discharge_summary")
-        
-        # Check if service date matches discharge date
-        if bill.get("date_of_service") != discharge.get("discharge_date"):
-            validation_result.discrepancies.append(
-                "Bill service date does not match discharge date"
-            )
-    
-    if "id_card" in found_types and "discharge_summary" in found_types:
-        id_card = next(doc for doc in structured_documents if doc["type"] == "id_card")
-        discharge = next(doc for doc in structured_documents if doc["type"] == "discharge_summary")
-        
-        # Check if patient names match
-        if id_card.get("patient_name") != discharge.get("patient_name"):
-            validation_result.discrepancies.append(
-                "Patient name on ID card does not match discharge summary"
-            )
-    
-    # Make claim decision
-    claim_decision = make_claim_decision(validation_result)
-    
-    return validation_result, claim_decision
+    return validate_claim_batch([structured_documents], [claim_id], record)[0]
+
+def validate_claim_batch(
+    claims: List[List[Dict[str, Any]]],
+    claim_ids: Optional[List[Optional[str]]] = None,
+    record: bool = False
+) -> List[Tuple[ValidationResult, ClaimDecision]]:
+    """
+    Validate a batch of claims, each a list of structured documents, in one pass of the compiled rules.
+
+    Returns the same (ValidationResult, ClaimDecision) per claim as
+    validate_claim_documents. Document issues are those recorded by the agents
+    at extraction in `validation_issues`.
+    """
+    claim_ids = claim_ids or [None] * len(claims)
+    claim_index = get_claim_index()
+    results = []
+    for documents, claim_id, (missing, discrepancies) in zip(
+        claims, claim_ids, get_rules_engine().validate_claims(claims, check_documents=False)
+    ):
+        validation_result = ValidationResult(missing_documents=missing, discrepancies=discrepancies)
+
+        # Check against earlier claims through the claim index
+        if claim_index is not None and record:
+            validation_result.discrepancies.extend(claim_index.check_and_record(claim_id, documents))
+        elif claim_index is not None:
+            validation_result.discrepancies.extend(check_claim_history(claim_index, documents, claim_id))
+
+        results.append((validation_result, make_claim_decision(validation_result)))
+    return results
 
 def make_claim_decision(validation: ValidationResult) -> ClaimDecision:
     """Determine if a claim should be approved or rejected based on validation results."""
@@ -0,0 +1,90 @@
+import inspect
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Tuple, Union
+from .. import config
+from ..providers.registry import get_classification_provider, get_extraction_provider
+from ..utils.heuristic_classifier import local_classifier
+from ..utils.pdf_utils import warm_pdf_executor
+from .orchestrator_service import get_workflow_graph
+from .rules_engine import get_rules_engine
+
+class ReadinessState:
+    """Whether the application finished warming up and can take claims."""
+
+    def __init__(self):
+        # "starting", "ready", "failed" or "stopping"
+        self.status = "starting"
+        self.steps: Dict[str, Dict[str, Any]] = {}
+
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
+    def get_state(self) -> Dict[str, Any]:
+        return {"status": self.status, "warm_up": self.steps}
+
+readiness = ReadinessState()
+
+def _load_llm_providers() -> List[str]:
+    providers = {id(provider): provider for provider in (get_classification_provider(), get_extraction_provider())}
+    return [provider.name for provider in providers.values()]
+
+async def _open_llm_connections() -> None:
+    providers = {id(provider): provider for provider in (get_classification_provider(), get_extraction_provider())}
+    for provider in providers.values():
+        await provider.warm_up()
+
+def _load_local_classifier() -> str:
+    # Runs every compiled keyword pattern once
+    return local_classifier.classify("warm-up", "warm-up.pdf")[0]
+
+# Warm-up steps in order: name, function and whether a failure leaves the application not ready
+WARM_UP_STEPS: List[Tuple[str, Callable[[], Union[Any, Awaitable[Any]]], bool]] = [
+    ("validation_rules", get_rules_engine, True),
+    ("workflow_graph", get_workflow_graph, True),
+    ("local_classifier", _load_local_classifier, True),
+    ("llm_providers", _load_llm_providers, True),
+    ("llm_connections", _open_llm_connections, False),
+    ("pdf_executor", warm_pdf_executor, True),
+]
+
+async def warm_up() -> Dict[str, Any]:
+    """
+    Load everything the first claim would otherwise pay for: the validation
+    rules, the compiled workflow graph, the local classifier, the LLM provider
+    SDKs and their connections, and the PDF extraction workers.
+
+    Each step is timed. A failing step is reported instead of stopping startup;
+    the application is ready only if no required step failed.
+    """
+    readiness.status = "starting"
+    readiness.steps = {}
+    failed = False
+    for name, step, required in WARM_UP_STEPS:
+        started = time.perf_counter()
+        try:
+            result = step()
+            if inspect.isawaitable(result):
+                await result
+            readiness.steps[name] = {"status": "ok", "seconds": round(time.perf_counter() - started, 4)}
+        except Exception as e:
+            print(f"Warm-up step {name} failed: {str(e)}")
+            readiness.steps[name] = {
+                "status": "failed" if required else "skipped",
+                "seconds": round(time.perf_counter() - started, 4),
+                "error": str(e)
+            }
+            failed = failed or required
+    readiness.status = "failed" if failed else "ready"
+    return readiness.get_state()
+
+async def start_up() -> None:
+    """Warm up at startup when WARM_UP_ON_STARTUP is set, otherwise report ready at once."""
+    if config.WARM_UP_ON_STARTUP:
+        await warm_up()
+    else:
+        readiness.status = "ready"
+        readiness.steps = {}
+
+def mark_stopping() -> None:
+    """Report not ready while the application shuts down, so load balancers stop sending claims."""
+    readiness.status = "stopping"
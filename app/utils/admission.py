@@ -0,0 +1,279 @@
+import asyncio
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+from fastapi import HTTPException
+from .sqlite_utils import call_store, connect_sqlite
+from .telemetry import record_rejected_request
+from .. import config
+
+ASGIApp = Callable[[Dict[str, Any], Callable[[], Awaitable[Dict[str, Any]]], Callable[[Dict[str, Any]], Awaitable[None]]], Awaitable[None]]
+
+class ServerBusyError(Exception):
+    """Raised when the in-flight claim limit is reached and no slot freed up in time."""
+    pass
+
+class InFlightLimiter(ABC):
+    """Counts claim requests being processed against a fixed limit."""
+
+    # Whether calls do blocking I/O and are run in a worker thread from async code
+    blocking = False
+
+    def __init__(self, limit: int):
+        self.limit = limit
+        self._waiting_lock: Optional[asyncio.Lock] = None
+        self._waiting_loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def waiting_lock(self) -> asyncio.Lock:
+        """Lock held by the one request of this process polling for a free slot on the running event loop."""
+        loop = asyncio.get_running_loop()
+        if self._waiting_loop is not loop:
+            self._waiting_lock = asyncio.Lock()
+            self._waiting_loop = loop
+        return self._waiting_lock
+
+    @abstractmethod
+    def try_acquire(self) -> Optional[str]:
+        """Take a slot and return its token, or None if all slots are taken."""
+        pass
+
+    @abstractmethod
+    def release(self, token: str) -> None:
+        """Give back the slot of a finished request."""
+        pass
+
+    @abstractmethod
+    def in_flight(self) -> int:
+        """Return the number of slots taken."""
+        pass
+
+class MemoryInFlightLimiter(InFlightLimiter):
+    """In-flight limit of a single worker process."""
+
+    def __init__(self, limit: int):
+        super().__init__(limit)
+        self._tokens = set()
+        self._lock = threading.Lock()
+
+    def try_acquire(self) -> Optional[str]:
+        with self._lock:
+            if len(self._tokens) >= self.limit:
+                return None
+            token = uuid.uuid4().hex
+            self._tokens.add(token)
+            return token
+
+    def release(self, token: str) -> None:
+        with self._lock:
+            self._tokens.discard(token)
+
+    def in_flight(self) -> int:
+        return len(self._tokens)
+
+def _process_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except OSError:
+        # The process exists but belongs to someone else
+        return True
+    return True
+
+class SQLiteInFlightLimiter(InFlightLimiter):
+    """
+    In-flight limit shared by every worker process on the host.
+
+    Each request holds a row in SQLite. Slots held by worker processes that
+    died are reclaimed when the limit is reached. A database kept busy by
+    other processes counts as no free slot.
+    """
+
+    blocking = True
+
+    def __init__(self, limit: int, path: str):
+        super().__init__(limit)
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS inflight_claims (token TEXT PRIMARY KEY, pid INTEGER NOT NULL, acquired_at REAL NOT NULL)"
+        )
+
+    def try_acquire(self) -> Optional[str]:
+        token = uuid.uuid4().hex
+        with self._lock:
+            try:
+                self._conn.execute("BEGIN IMMEDIATE")
+            except sqlite3.OperationalError:
+                return None
+            try:
+                count = self._conn.execute("SELECT COUNT(*) FROM inflight_claims").fetchone()[0]
+                if count >= self.limit:
+                    count -= self._reclaim_dead_slots()
+                if count >= self.limit:
+                    self._conn.execute("COMMIT")
+                    return None
+                self._conn.execute(
+                    "INSERT INTO inflight_claims (token, pid, acquired_at) VALUES (?, ?, ?)",
+                    (token, os.getpid(), time.time())
+                )
+                self._conn.execute("COMMIT")
+                return token
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+
+    def _reclaim_dead_slots(self) -> int:
+        pids = [row[0] for row in self._conn.execute("SELECT DISTINCT pid FROM inflight_claims")]
+        reclaimed = 0
+        for pid in pids:
+            if pid != os.getpid() and not _process_alive(pid):
+                reclaimed += self._conn.execute("DELETE FROM inflight_claims WHERE pid = ?", (pid,)).rowcount
+        return reclaimed
+
+    def release(self, token: str) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM inflight_claims WHERE token = ?", (token,))
+
+    def in_flight(self) -> int:
+        with self._lock:
+            return self._conn.execute("SELECT COUNT(*) FROM inflight_claims").fetchone()[0]
+
+_limiter: Optional[InFlightLimiter] = None
+
+def get_inflight_limiter() -> Optional[InFlightLimiter]:
+    """Return the shared in-flight claim limiter selected by INFLIGHT_STORE, or None without a limit."""
+    global _limiter
+    if config.MAX_INFLIGHT_CLAIMS <= 0:
+        return None
+    if _limiter is None:
+        if config.INFLIGHT_STORE == "sqlite":
+            _limiter = SQLiteInFlightLimiter(config.MAX_INFLIGHT_CLAIMS, config.INFLIGHT_STORE_PATH)
+        else:
+            _limiter = MemoryInFlightLimiter(config.MAX_INFLIGHT_CLAIMS)
+    return _limiter
+
+def reset_inflight_limiter() -> None:
+    """Drop the shared in-flight limiter so it is rebuilt from config."""
+    global _limiter
+    _limiter = None
+
+# Interval at which a waiting request checks for a free slot
+ADMISSION_POLL_SECONDS = 0.05
+
+async def acquire_slot(limiter: InFlightLimiter, wait_seconds: float) -> str:
+    """
+    Take an in-flight slot, waiting up to `wait_seconds` for one; raises ServerBusyError otherwise.
+
+    Waiting requests of a process queue on a lock, so only one of them at a
+    time polls the limiter instead of each polling the database.
+    """
+    deadline = time.monotonic() + wait_seconds
+    busy = ServerBusyError(f"Server is processing {limiter.limit} claims, try again later")
+    token = await call_store(limiter, limiter.try_acquire)
+    if token is not None:
+        return token
+    try:
+        await asyncio.wait_for(limiter.waiting_lock().acquire(), max(0.0, deadline - time.monotonic()))
+    except asyncio.TimeoutError:
+        raise busy
+    try:
+        while True:
+            token = await call_store(limiter, limiter.try_acquire)
+            if token is not None:
+                return token
+            if time.monotonic() >= deadline:
+                raise busy
+            await asyncio.sleep(min(ADMISSION_POLL_SECONDS, max(0.0, deadline - time.monotonic())))
+    finally:
+        limiter.waiting_lock().release()
+
+async def _send_json(send: Callable, status: int, detail: str, headers: Tuple[Tuple[bytes, bytes], ...] = ()) -> None:
+    body = json.dumps({"detail": detail}).encode("utf-8")
+    await send({
+        "type": "http.response.start",
+        "status": status,
+        "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())] + list(headers)
+    })
+    await send({"type": "http.response.body", "body": body})
+
+class AdmissionMiddleware:
+    """
+    Load shedding for claim processing requests.
+
+    POST requests to the given path prefixes need an in-flight slot before
+    their body is read. When no slot frees up within ADMISSION_WAIT_SECONDS the
+    request is refused with 503 and Retry-After instead of queueing, so the
+    latency of admitted claims stays bounded under overload.
+    """
+
+    def __init__(self, app: ASGIApp, path_prefixes: Tuple[str, ...]):
+        self.app = app
+        self.path_prefixes = path_prefixes
+
+    async def __call__(self, scope, receive, send):
+        limiter = get_inflight_limiter()
+        if (
+            limiter is None
+            or scope["type"] != "http"
+            or scope["method"] != "POST"
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            token = await acquire_slot(limiter, config.ADMISSION_WAIT_SECONDS)
+        except ServerBusyError as e:
+            record_rejected_request("overloaded")
+            retry_after = str(int(config.ADMISSION_RETRY_AFTER_SECONDS)).encode()
+            await _send_json(send, 503, str(e), ((b"retry-after", retry_after),))
+            return
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            await call_store(limiter, limiter.release, token)
+
+class BodySizeLimitMiddleware:
+    """
+    Refuses request bodies larger than `max_bytes` with 413.
+
+    A declared Content-Length is checked before anything is read; bodies sent
+    without one are counted while they are read and cut off at the limit.
+    """
+
+    def __init__(self, app: ASGIApp, max_bytes: int):
+        self.app = app
+        self.max_bytes = max_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        detail = f"Request body exceeds the {self.max_bytes} byte limit"
+        content_length = dict(scope["headers"]).get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_bytes:
+            record_rejected_request("too_large")
+            await _send_json(send, 413, detail)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_bytes:
+                    record_rejected_request("too_large")
+                    # FastAPI passes HTTPExceptions raised while reading the body through to its handlers
+                    raise HTTPException(status_code=413, detail=detail)
+            return message
+
+        await self.app(scope, limited_receive, send)
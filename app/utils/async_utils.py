@@ -0,0 +1,29 @@
+import asyncio
+from typing import Any, Awaitable, List, Optional
+
+async def gather_with_limit(coros: List[Awaitable[Any]], limit: Optional[int] = None) -> List[Any]:
+    """
+    Run awaitables concurrently with at most `limit` in flight.
+
+    Results are returned in input order. All awaitables are allowed to finish,
+    then the first failure in input order is re-raised so error reporting does
+    not depend on which task happened to fail first.
+    """
+    if not coros:
+        return []
+
+    semaphore = asyncio.Semaphore(limit) if limit and limit > 0 else None
+
+    async def run(coro: Awaitable[Any]) -> Any:
+        if semaphore is None:
+            return await coro
+        async with semaphore:
+            return await coro
+
+    results = await asyncio.gather(*(run(coro) for coro in coros), return_exceptions=True)
+
+    for result in results:
+        if isinstance(result, BaseException):
+            raise result
+
+    return results
@@ -0,0 +1,277 @@
+import hashlib
+import json
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+from .sqlite_utils import call_store, connect_sqlite
+from .. import config
+
+# Longest the SQLite cache goes without dropping expired entries and checking its size limits
+EVICTION_INTERVAL_SECONDS = 60.0
+# Share of its limits the SQLite cache frees when it evicts, so a full cache is not scanned on every write
+EVICTION_HEADROOM = 0.1
+
+class CacheBackend(ABC):
+    """Base class for LLM result cache storage backends."""
+
+    # Whether calls do blocking I/O and are run in a worker thread from async code
+    blocking = False
+
+    @abstractmethod
+    def get(self, key: str) -> Optional[str]:
+        """Return the serialized value stored under `key`, or None."""
+        pass
+
+    @abstractmethod
+    def set(self, key: str, value: str) -> None:
+        """Store a serialized value under `key`."""
+        pass
+
+    @abstractmethod
+    def clear(self) -> None:
+        """Remove every entry."""
+        pass
+
+class MemoryCache(CacheBackend):
+    """In-process LRU cache with TTL and entry/size based eviction."""
+
+    def __init__(self, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Optional[str]:
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            value, expires_at = entry
+            if expires_at < time.time():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: str) -> None:
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (value, time.time() + self.ttl_seconds)
+            self._size += len(value)
+            # Evict least recently used entries
+            while self._entries and (len(self._entries) > self.max_entries or self._size > self.max_bytes):
+                self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+
+    def _remove(self, key: str) -> None:
+        value, _ = self._entries.pop(key)
+        self._size -= len(value)
+
+class SQLiteCache(CacheBackend):
+    """
+    On-disk cache stored in SQLite that survives restarts and is shared by all worker processes on the host.
+
+    Eviction scans the table, so it runs only when the entries and bytes
+    written since the last eviction may have crossed a limit, or every
+    EVICTION_INTERVAL_SECONDS to drop expired entries and account for writes
+    of other processes. A busy database counts as a miss rather than an error.
+    """
+
+    blocking = True
+
+    def __init__(self, path: str, ttl_seconds: float, max_entries: int, max_bytes: int):
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            """
+            CREATE TABLE IF NOT EXISTS llm_cache (
+                key TEXT PRIMARY KEY,
+                value TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                expires_at REAL NOT NULL,
+                last_access REAL NOT NULL
+            )
+            """
+        )
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_access ON llm_cache (last_access)")
+        # Upper bounds of the entries and bytes stored, counting every write as new until the next eviction
+        self._approx_count, self._approx_size = self._conn.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache"
+        ).fetchone()
+        self._evicted_at = time.monotonic()
+
+    def get(self, key: str) -> Optional[str]:
+        now = time.time()
+        try:
+            with self._lock:
+                row = self._conn.execute(
+                    "SELECT value, expires_at FROM llm_cache WHERE key = ?", (key,)
+                ).fetchone()
+                if row is None:
+                    return None
+                if row[1] < now:
+                    self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (key,))
+                    return None
+                self._conn.execute("UPDATE llm_cache SET last_access = ? WHERE key = ?", (now, key))
+                return row[0]
+        except sqlite3.OperationalError as e:
+            print(f"Error reading the LLM result cache: {str(e)}")
+            return None
+
+    def set(self, key: str, value: str) -> None:
+        now = time.time()
+        try:
+            with self._lock:
+                self._conn.execute(
+                    "INSERT OR REPLACE INTO llm_cache (key, value, size, expires_at, last_access) VALUES (?, ?, ?, ?, ?)",
+                    (key, value, len(value), now + self.ttl_seconds, now)
+                )
+                self._approx_count += 1
+                self._approx_size += len(value)
+                if (
+                    self._approx_count > self.max_entries
+                    or self._approx_size > self.max_bytes
+                    or time.monotonic() - self._evicted_at >= EVICTION_INTERVAL_SECONDS
+                ):
+                    self._evict(now)
+        except sqlite3.OperationalError as e:
+            print(f"Error writing to the LLM result cache: {str(e)}")
+
+    def clear(self) -> None:
+        with self._lock:
+            self._conn.execute("DELETE FROM llm_cache")
+            self._approx_count, self._approx_size = 0, 0
+
+    def _evict(self, now: float) -> None:
+        """Drop expired entries, then, over a limit, least recently used ones until EVICTION_HEADROOM below the limits."""
+        self._conn.execute("DELETE FROM llm_cache WHERE expires_at < ?", (now,))
+        count, size = self._conn.execute("SELECT COUNT(*), COALESCE(SUM(size), 0) FROM llm_cache").fetchone()
+        if count > self.max_entries or size > self.max_bytes:
+            max_count = int(self.max_entries * (1 - EVICTION_HEADROOM))
+            max_size = int(self.max_bytes * (1 - EVICTION_HEADROOM))
+        else:
+            max_count, max_size = count, size
+        while count > max_count or size > max_size:
+            row = self._conn.execute(
+                "SELECT key, size FROM llm_cache ORDER BY last_access LIMIT 1"
+            ).fetchone()
+            if row is None:
+                break
+            self._conn.execute("DELETE FROM llm_cache WHERE key = ?", (row[0],))
+            count -= 1
+            size -= row[1]
+        self._approx_count, self._approx_size = count, size
+        self._evicted_at = time.monotonic()
+
+class ResultCache:
+    """
+    Content-addressed cache for LLM results with per-namespace hit/miss counters.
+
+    Keys are built from a hash of the document content plus everything else that
+    determines the LLM output (prompt template version, model name, ...).
+    """
+
+    def __init__(self, backend: Optional[CacheBackend]):
+        self.backend = backend
+        self._stats: Dict[str, Dict[str, float]] = {}
+
+    @staticmethod
+    def make_key(*parts: str) -> str:
+        """Build a cache key from the content and parameters of an LLM call."""
+        digest = hashlib.sha256()
+        for part in parts:
+            digest.update(str(part).encode("utf-8"))
+            digest.update(b"\x1f")
+        return digest.hexdigest()
+
+    def get(self, namespace: str, key: str) -> Optional[Any]:
+        """Return the cached value for `key`, counting a hit or a miss."""
+        stats = self._namespace_stats(namespace)
+        value = self.backend.get(f"{namespace}:{key}") if self.backend else None
+        if value is None:
+            stats["misses"] += 1
+            return None
+        stats["hits"] += 1
+        return json.loads(value)
+
+    def set(self, namespace: str, key: str, value: Any, cost_seconds: float = 0.0) -> None:
+        """Store a value, recording how long it took to compute."""
+        stats = self._namespace_stats(namespace)
+        stats["computed_seconds"] += cost_seconds
+        stats["stored"] += 1
+        if self.backend:
+            self.backend.set(f"{namespace}:{key}", json.dumps(value))
+
+    async def aget(self, namespace: str, key: str) -> Optional[Any]:
+        """Like get, without blocking the event loop on a SQLite backend."""
+        return await call_store(self.backend, self.get, namespace, key)
+
+    async def aset(self, namespace: str, key: str, value: Any, cost_seconds: float = 0.0) -> None:
+        """Like set, without blocking the event loop on a SQLite backend."""
+        await call_store(self.backend, self.set, namespace, key, value, cost_seconds)
+
+    def clear(self) -> None:
+        """Remove every cached value and reset the counters."""
+        if self.backend:
+            self.backend.clear()
+        self._stats.clear()
+
+    def get_stats(self) -> Dict[str, Dict[str, float]]:
+        """Return hit/miss counters and the estimated LLM time saved per namespace."""
+        result = {}
+        for namespace, stats in self._stats.items():
+            lookups = stats["hits"] + stats["misses"]
+            average_cost = stats["computed_seconds"] / stats["stored"] if stats["stored"] else 0.0
+            result[namespace] = {
+                "hits": int(stats["hits"]),
+                "misses": int(stats["misses"]),
+                "hit_rate": stats["hits"] / lookups if lookups else 0.0,
+                "estimated_seconds_saved": stats["hits"] * average_cost,
+            }
+        return result
+
+    def _namespace_stats(self, namespace: str) -> Dict[str, float]:
+        if namespace not in self._stats:
+            self._stats[namespace] = {"hits": 0, "misses": 0, "stored": 0, "computed_seconds": 0.0}
+        return self._stats[namespace]
+
+_cache: Optional[ResultCache] = None
+
+def create_cache_backend() -> Optional[CacheBackend]:
+    """Create the cache backend selected by CACHE_BACKEND."""
+    if config.CACHE_BACKEND == "sqlite":
+        return SQLiteCache(
+            config.CACHE_PATH,
+            config.CACHE_TTL_SECONDS,
+            config.CACHE_MAX_ENTRIES,
+            config.CACHE_MAX_BYTES
+        )
+    elif config.CACHE_BACKEND == "memory":
+        return MemoryCache(config.CACHE_TTL_SECONDS, config.CACHE_MAX_ENTRIES, config.CACHE_MAX_BYTES)
+    else:
+        return None
+
+def get_cache() -> ResultCache:
+    """Return the shared LLM result cache, creating it on first use."""
+    global _cache
+    if _cache is None:
+        _cache = ResultCache(create_cache_backend())
+    return _cache
+
+def reset_cache() -> None:
+    """Drop the shared cache so the next call to get_cache() rebuilds it from config."""
+    global _cache
+    _cache = None
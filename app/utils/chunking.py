@@ -0,0 +1,132 @@
+import json
+import re
+from collections import Counter
+from typing import Any, Callable, Dict, List
+
+# Local approximation of LLM tokens: words and single punctuation marks
+TOKEN_PATTERN = re.compile(r"\w+|[^\w\s]")
+
+# Phrases showing that a chunk holds a field, per document type
+FIELD_KEYWORDS: Dict[str, Dict[str, tuple]] = {
+    "bill": {
+        "hospital_name": ("hospital", "medical center", "clinic", "health system"),
+        "total_amount": ("total", "amount due", "balance due", "charges"),
+        "date_of_service": ("date of service", "service date", "dos"),
+    },
+    "discharge_summary": {
+        "patient_name": ("patient", "name"),
+        "diagnosis": ("diagnosis", "diagnoses", "impression", "assessment"),
+        "admission_date": ("admission", "admitted", "admit date"),
+        "discharge_date": ("discharge date", "date of discharge", "discharged"),
+    },
+    "id_card": {
+        "patient_name": ("member", "name", "subscriber"),
+        "insurance_id": ("member id", "insurance id", "policy", "id"),
+        "plan_name": ("plan",),
+        "expiration_date": ("expiration", "expires", "valid until"),
+    },
+}
+
+# How conflicting values of a field found in several chunks are resolved; other
+# fields take the value found most often, ties going to the more relevant chunk
+FIELD_MERGE_RULES: Dict[str, Callable[[List[Any]], Any]] = {
+    "admission_date": min,
+    "discharge_date": max,
+    "total_amount": max,
+}
+
+def count_tokens(text: str) -> int:
+    """Return the approximate number of LLM tokens of a text."""
+    return sum(1 for _ in TOKEN_PATTERN.finditer(text))
+
+def split_into_chunks(text: str, chunk_tokens: int, overlap_tokens: int) -> List[str]:
+    """Split a text into chunks of at most `chunk_tokens` tokens, each overlapping the previous one."""
+    tokens = list(TOKEN_PATTERN.finditer(text))
+    if len(tokens) <= chunk_tokens:
+        return [text]
+
+    step = max(1, chunk_tokens - overlap_tokens)
+    chunks = []
+    for start in range(0, len(tokens), step):
+        end = min(start + chunk_tokens, len(tokens))
+        chunks.append(text[tokens[start].start():tokens[end - 1].end()])
+        if end == len(tokens):
+            break
+    return chunks
+
+def _field_hits(chunk: str, keywords: Dict[str, tuple]) -> Dict[str, int]:
+    lowered = chunk.lower()
+    return {
+        field: sum(len(re.findall(r"\b" + re.escape(phrase) + r"\b", lowered)) for phrase in phrases)
+        for field, phrases in keywords.items()
+    }
+
+def select_chunks(chunks: List[str], document_type: str, max_chunks: int) -> List[int]:
+    """
+    Return the indices of the chunks to extract from, most relevant first.
+
+    Chunks are picked greedily: each pick is the chunk mentioning the most
+    fields not yet covered, then the most keyword hits. Selection stops once
+    every field is covered, so a long document only costs as many chunks as
+    its relevant content needs. Without keywords the leading chunks are used.
+    """
+    keywords = FIELD_KEYWORDS.get(document_type)
+    if not keywords:
+        return list(range(min(max_chunks, len(chunks))))
+
+    hits = [_field_hits(chunk, keywords) for chunk in chunks]
+    uncovered = set(keywords)
+    selected: List[int] = []
+    while uncovered and len(selected) < max_chunks:
+        candidates = [index for index in range(len(chunks)) if index not in selected]
+        best = max(
+            candidates,
+            key=lambda index: (
+                sum(1 for field in uncovered if hits[index][field]),
+                sum(hits[index].values()),
+                -index
+            )
+        )
+        if not any(hits[best][field] for field in uncovered):
+            break
+        selected.append(best)
+        uncovered -= {field for field, count in hits[best].items() if count}
+
+    # Chunks without any keyword still get the beginning of the document, where headers usually are
+    return selected or [0]
+
+def _is_empty(value: Any) -> bool:
+    return value is None or value == "" or value == [] or value == {}
+
+def merge_partial_results(partials: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """
+    Merge the structured data extracted from several chunks, most relevant chunk first.
+
+    Empty values are ignored. Conflicts are resolved with FIELD_MERGE_RULES,
+    e.g. the earliest admission date and the latest discharge date, and
+    otherwise by the value found in most chunks.
+    """
+    values: Dict[str, List[Any]] = {}
+    for partial in partials:
+        for field, value in partial.items():
+            if not _is_empty(value):
+                values.setdefault(field, []).append(value)
+
+    merged = {}
+    for field, candidates in values.items():
+        rule = FIELD_MERGE_RULES.get(field)
+        if rule is not None:
+            try:
+                merged[field] = rule(candidates)
+                continue
+            except TypeError:
+                # Values of mixed types, e.g. an amount that could not be parsed
+                pass
+        counts = Counter(json.dumps(value, sort_keys=True, default=str) for value in candidates)
+        merged[field] = max(candidates, key=lambda value: counts[json.dumps(value, sort_keys=True, default=str)])
+
+    # Fields no chunk found stay in the result as empty so agent validation reports them
+    for partial in partials:
+        for field in partial:
+            merged.setdefault(field, None)
+    return merged
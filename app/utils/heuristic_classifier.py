@@ -0,0 +1,117 @@
+import re
+from typing import Dict, List, Pattern, Tuple
+
+# Weighted keyword patterns per document type
+KEYWORD_RULES: Dict[str, List[Tuple[str, float]]] = {
+    "bill": [
+        (r"\bamount due\b", 3.0),
+        (r"\btotal (amount|charges|due)\b", 2.5),
+        (r"\binvoice\b", 2.0),
+        (r"\bbalance\b", 1.0),
+        (r"\bcharges?\b", 1.0),
+        (r"\bbill(ing)?\b", 1.5),
+        (r"\bpayment\b", 1.0),
+        (r"\$\s?\d", 1.0),
+    ],
+    "discharge_summary": [
+        (r"\bdischarge summary\b", 4.0),
+        (r"\b(date of discharge|discharge date|discharged on)\b", 2.0),
+        (r"\b(date of admission|admission date|admitted on)\b", 2.0),
+        (r"\bhospital course\b", 2.0),
+        (r"\b(final |primary |discharge )?diagnosis\b", 1.5),
+        (r"\b(attending|treating) physician\b", 1.0),
+        (r"\bfollow[- ]up\b", 1.0),
+    ],
+    "id_card": [
+        (r"\bmember (id|number|no\.?)\b", 3.0),
+        (r"\b(insurance|health|member) (id )?card\b", 3.0),
+        (r"\binsurance id\b", 3.0),
+        (r"\bgroup (number|no\.?|#)\b", 2.0),
+        (r"\bsubscriber\b", 1.5),
+        (r"\bcopay\b", 1.5),
+        (r"\bplan( name)?\b", 1.0),
+        (r"\b(valid thru|valid through|expir(es|ation))\b", 1.0),
+    ],
+}
+
+# Extra score when the filename hints at a document type
+FILENAME_RULES: Dict[str, Tuple[str, float]] = {
+    "bill": (r"bill|invoice", 1.5),
+    "discharge_summary": (r"discharge|summary", 1.5),
+    "id_card": (r"id[_\-. ]?card|member|insurance", 1.5),
+}
+
+# Score at which a document counts as a strong match for its best type
+STRONG_SCORE = 5.0
+
+class KeywordClassifier:
+    """Fast local document classifier scoring weighted keywords over the first part of the text."""
+
+    def __init__(self, max_chars: int = 3000):
+        self.max_chars = max_chars
+        self._rules: Dict[str, List[Tuple[Pattern, float]]] = {
+            doc_type: [(re.compile(pattern, re.IGNORECASE), weight) for pattern, weight in rules]
+            for doc_type, rules in KEYWORD_RULES.items()
+        }
+        self._filename_rules: Dict[str, Tuple[Pattern, float]] = {
+            doc_type: (re.compile(pattern, re.IGNORECASE), weight)
+            for doc_type, (pattern, weight) in FILENAME_RULES.items()
+        }
+
+    def score(self, text: str, filename: str = "") -> Dict[str, float]:
+        """Return the keyword score of each document type."""
+        snippet = text[:self.max_chars]
+        scores = {}
+        for doc_type, rules in self._rules.items():
+            score = sum(weight for pattern, weight in rules if pattern.search(snippet))
+            pattern, weight = self._filename_rules[doc_type]
+            if filename and pattern.search(filename):
+                score += weight
+            scores[doc_type] = score
+        return scores
+
+    def classify(self, text: str, filename: str = "") -> Tuple[str, float]:
+        """
+        Return the most likely document type and a confidence between 0 and 1.
+
+        Confidence is high only when the best type scores strongly and clearly
+        beats the runner-up.
+        """
+        ranked = sorted(self.score(text, filename).items(), key=lambda item: item[1], reverse=True)
+        (best_type, best_score), (_, second_score) = ranked[0], ranked[1]
+        if best_score <= 0:
+            return "unknown", 0.0
+
+        strength = min(1.0, best_score / STRONG_SCORE)
+        margin = (best_score - second_score) / best_score
+        return best_type, round(strength * margin, 4)
+
+class ClassificationStats:
+    """Counters showing how many classifications were resolved locally or by the LLM."""
+
+    def __init__(self):
+        self.resolved_locally = 0
+        self.sent_to_llm = 0
+        # Agreement of the local guess with the LLM answer, by confidence bucket
+        self._agreement: Dict[str, Dict[str, int]] = {}
+
+    def record_local(self) -> None:
+        self.resolved_locally += 1
+
+    def record_llm(self, local_type: str, confidence: float, llm_type: str) -> None:
+        self.sent_to_llm += 1
+        lower = min(int(confidence * 10), 9) / 10
+        bucket = self._agreement.setdefault(f"{lower:.1f}-{lower + 0.1:.1f}", {"agree": 0, "disagree": 0})
+        bucket["agree" if local_type == llm_type else "disagree"] += 1
+
+    def get_stats(self) -> Dict[str, object]:
+        total = self.resolved_locally + self.sent_to_llm
+        return {
+            "resolved_locally": self.resolved_locally,
+            "sent_to_llm": self.sent_to_llm,
+            "local_rate": self.resolved_locally / total if total else 0.0,
+            "llm_agreement_by_confidence": dict(sorted(self._agreement.items())),
+        }
+
+local_classifier = KeywordClassifier()
+classification_stats = ClassificationStats()
@@ -0,0 +1,126 @@
+from typing import Any, Dict
+import httpx
+from .. import config
+
+def http2_available() -> bool:
+    """Whether the h2 package needed for HTTP/2 is installed."""
+    try:
+        import h2
+        return True
+    except ImportError:
+        return False
+
+class _TrackedStream(httpx.AsyncByteStream):
+    """Response body that releases its request's in-flight slot when closed."""
+
+    def __init__(self, stream: httpx.AsyncByteStream, transport: "PooledTransport"):
+        self._stream = stream
+        self._transport = transport
+        self._released = False
+
+    async def __aiter__(self):
+        async for chunk in self._stream:
+            yield chunk
+
+    async def aclose(self) -> None:
+        if not self._released:
+            self._released = True
+            self._transport.in_flight -= 1
+        await self._stream.aclose()
+
+class PooledTransport(httpx.AsyncBaseTransport):
+    """
+    Connection pool of one LLM provider.
+
+    Counts requests in flight, from sending until their response body is
+    closed, and the TCP connections and TLS handshakes the pool opened, so
+    connection churn shows in the metrics.
+    """
+
+    def __init__(self, name: str, limits: httpx.Limits, http2: bool):
+        self.name = name
+        self.limits = limits
+        self.http2 = http2
+        self.requests = 0
+        self.in_flight = 0
+        self.connections_opened = 0
+        self.tls_handshakes = 0
+        self._transport = httpx.AsyncHTTPTransport(limits=limits, http2=http2)
+
+    async def _trace(self, event: str, info: Dict[str, Any]) -> None:
+        if event == "connection.connect_tcp.complete":
+            self.connections_opened += 1
+        elif event == "connection.start_tls.complete":
+            self.tls_handshakes += 1
+
+    async def handle_async_request(self, request: httpx.Request) -> httpx.Response:
+        request.extensions = dict(request.extensions, trace=self._trace)
+        self.requests += 1
+        self.in_flight += 1
+        try:
+            response = await self._transport.handle_async_request(request)
+        except BaseException:
+            self.in_flight -= 1
+            raise
+        response.stream = _TrackedStream(response.stream, self)
+        return response
+
+    async def aclose(self) -> None:
+        await self._transport.aclose()
+
+    def get_stats(self) -> Dict[str, Any]:
+        # httpx keeps its httpcore pool private; without it only the request counts are reported
+        pool = getattr(self._transport, "_pool", None)
+        connections = list(getattr(pool, "connections", []))
+        max_connections = self.limits.max_connections or 0
+        return {
+            "http2": self.http2,
+            "max_connections": max_connections,
+            "requests": self.requests,
+            "in_flight": self.in_flight,
+            "utilization": self.in_flight / max_connections if max_connections else 0.0,
+            "open_connections": sum(1 for connection in connections if not connection.is_closed()),
+            "idle_connections": sum(1 for connection in connections if connection.is_idle()),
+            "connections_opened": self.connections_opened,
+            "tls_handshakes": self.tls_handshakes,
+        }
+
+# Shared clients and their pools keyed by provider name
+_clients: Dict[str, httpx.AsyncClient] = {}
+_transports: Dict[str, PooledTransport] = {}
+
+def get_http_client(name: str) -> httpx.AsyncClient:
+    """
+    Return the shared HTTP client of a provider, creating its connection pool on first use.
+
+    Pools keep connections alive between calls, use HTTP/2 when LLM_HTTP2 is
+    set and h2 is installed, and are sized by LLM_HTTP_MAX_CONNECTIONS.
+    """
+    if name not in _clients:
+        http2 = config.LLM_HTTP2 and http2_available()
+        if config.LLM_HTTP2 and not http2:
+            print(f"HTTP/2 is disabled for {name}: install h2 (httpx[http2]) to enable it")
+        limits = httpx.Limits(
+            max_connections=config.LLM_HTTP_MAX_CONNECTIONS,
+            max_keepalive_connections=config.LLM_HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            keepalive_expiry=config.LLM_HTTP_KEEPALIVE_SECONDS
+        )
+        transport = PooledTransport(name, limits, http2)
+        _transports[name] = transport
+        _clients[name] = httpx.AsyncClient(
+            transport=transport,
+            timeout=httpx.Timeout(config.LLM_HTTP_TIMEOUT_SECONDS, connect=config.LLM_HTTP_CONNECT_TIMEOUT_SECONDS)
+        )
+    return _clients[name]
+
+async def close_http_clients() -> None:
+    """Close every shared HTTP client and its connections."""
+    clients = list(_clients.values())
+    _clients.clear()
+    _transports.clear()
+    for client in clients:
+        await client.aclose()
+
+def get_pool_stats() -> Dict[str, Dict[str, Any]]:
+    """Return the connection pool statistics of each provider."""
+    return {name: transport.get_stats() for name, transport in _transports.items()}
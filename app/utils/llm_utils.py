@@ -1,40 +1,114 @@
-import os
+import asyncio
 import json
-from typing import Any, Dict, List, Optional
-import google.generativeai as genai
-from openai import AsyncOpenAI
-from dotenv import load_dotenv
+import time
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+from pydantic import ValidationError
+from .. import config
+from .cache import get_cache
+from .chunking import merge_partial_results, select_chunks, split_into_chunks
+from .resilience import get_llm_caller
+from .telemetry import record_extraction_chunks, record_llm_usage, trace_span, track_llm_call
+from ..models.normalization import normalize_document
+from ..models.schemas import DOCUMENT_MODELS
+from ..providers.base_provider import LLMProvider, LLMResponse
+from ..providers.registry import get_classification_provider, get_extraction_provider
 
-# Load environment variables
-load_dotenv()
+EXTRACTION_SYSTEM_PROMPT = "You are a helpful assistant that extracts structured data from medical documents."
 
-# Configure API keys
-genai.configure(api_key=os.getenv("GOOGLE_API_KEY"))
-openai_client = AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+DEFAULT_DOCUMENT_TYPES = ["bill", "discharge_summary", "id_card"]
 
-async def classify_document_with_gemini(text: str, filename: str) -> str:
-    """Classify a document based on its content and filename using Google Gemini."""
+# Bump these whenever the prompts change so cached results are not reused
+CLASSIFICATION_PROMPT_VERSION = "1"
+EXTRACTION_PROMPT_VERSION = "2"
+BATCH_PROMPT_VERSION = "2"
+
+# Rough number of characters per token, used for token rate limiting
+APPROX_CHARS_PER_TOKEN = 4
+# Tokens reserved for the completion of an extraction request
+EXTRACTION_COMPLETION_TOKENS = 500
+
+def estimate_tokens(text: str) -> int:
+    """Roughly estimate the number of tokens of a prompt."""
+    return len(text) // APPROX_CHARS_PER_TOKEN + 1
+
+async def _call_provider(
+    provider: LLMProvider,
+    operation: str,
+    func: Callable[[], Awaitable[LLMResponse]],
+    prompt_tokens: int,
+    completion_tokens: int = 0
+) -> LLMResponse:
+    """
+    Call a provider through its shared call layer, traced as an LLM span with token usage.
+
+    `prompt_tokens` and `completion_tokens` are estimates used for rate limiting;
+    the prompt estimate also stands in for the usage of a call cancelled in flight.
+    """
+    estimated_tokens = prompt_tokens + completion_tokens
+    attributes = {"llm.provider": provider.name, "llm.model": provider.model, "llm.estimated_tokens": estimated_tokens}
+    with trace_span(f"llm.{operation}", attributes) as span, track_llm_call(prompt_tokens):
+        response = await get_llm_caller(provider.name).call(func, estimated_tokens=estimated_tokens)
+        record_llm_usage(span, provider.name, response.input_tokens, response.output_tokens)
+    return response
+
+def _match_document_type(value: str, document_types: List[str]) -> str:
+    """Map a free-form classifier answer or filename onto a known document type."""
+    value = value.lower()
+    if value in document_types:
+        return value
+
+    # Document types registered on top of the built-in ones
+    for doc_type in document_types:
+        if doc_type not in DEFAULT_DOCUMENT_TYPES and (doc_type in value or doc_type.replace("_", " ") in value):
+            return doc_type
+
+    if "bill" in value:
+        return "bill"
+    elif "discharge" in value or "summary" in value:
+        return "discharge_summary"
+    elif "id" in value or "card" in value:
+        return "id_card"
+    else:
+        return "unknown"
+
+async def classify_document_with_gemini(text: str, filename: str, document_types: Optional[List[str]] = None) -> str:
+    """Classify a document based on its content and filename using the classification provider (Gemini by default)."""
+    document_types = document_types or DEFAULT_DOCUMENT_TYPES
+    provider = get_classification_provider()
+    cache = get_cache()
+    cache_key = cache.make_key(
+        CLASSIFICATION_PROMPT_VERSION, provider.name, provider.model, ",".join(document_types), filename, text[:500]
+    )
+    cached_type = await cache.aget("classification", cache_key)
+    if cached_type is not None:
+        return cached_type
+
+    type_choices = ", ".join(f"'{doc_type}'" for doc_type in document_types)
+    type_words = ", ".join(document_types[:-1]) + ", or " + document_types[-1] if len(document_types) > 1 else document_types[0]
     prompt = f"""
     Analyze the following document content and filename to determine the document type.
-    Classify it as one of: 'bill', 'discharge_summary', 'id_card'.
+    Classify it as one of: {type_choices}.
     
     Filename: {filename}
     
     Document content snippet:
     {text[:500]}...
     
-    Return only the document type as a single word (bill, discharge_summary, or id_card).
+    Return only the document type as a single word ({type_words}).
     """
     
     # Updated model initialization to handle API version compatibility
     try:
         # Use the correct model name format for the current API version
-        model = genai.GenerativeModel(model_name="gemini-1.5-pro")
-        response = await model.generate_content_async(prompt)
+        started = time.perf_counter()
+        response = await _call_provider(
+            provider, "classification", lambda: provider.generate_text(prompt), estimate_tokens(prompt)
+        )
+        elapsed = time.perf_counter() - started
         document_type = response.text.strip().lower()
     except Exception as e:
         error_message = str(e)
-        print(f"Error with Gemini API: {error_message}")
+        print(f"Error with {provider.name} API: {error_message}")
         
         # Check for specific error types
         if "429" in error_message or "quota" in error_message.lower() or "rate limit" in error_message.lower():
@@ -43,30 +117,16 @@ async def classify_document_with_gemini(text: str, filename: str) -> str:
             print("Model not found. Check if the model name is correct.")
         
         # Fallback classification based on filename if API fails
-        if "bill" in filename.lower():
-            return "bill"
-        elif "discharge" in filename.lower() or "summary" in filename.lower():
-            return "discharge_summary"
-        elif "id" in filename.lower() or "card" in filename.lower():
-            return "id_card"
-        else:
-            return "unknown"
+        return _match_document_type(filename, document_types)
     
     # Normalize response
-    if "bill" in document_type:
-        return "bill"
-    elif "discharge" in document_type or "summary" in document_type:
-        return "discharge_summary"
-    elif "id" in document_type or "card" in document_type:
-        return "id_card"
-    else:
-        return "unknown"
+    document_type = _match_document_type(document_type, document_types)
 
-async def extract_structured_data_with_gpt(document_type: str, text: str) -> Dict[str, Any]:
-    """Extract structured data from text based on document type using GPT."""
-    
-    prompt_templates = {
-        "bill": """
+    await cache.aset("classification", cache_key, document_type, cost_seconds=elapsed)
+    return document_type
+
+EXTRACTION_PROMPT_TEMPLATES = {
+    "bill": """
         Extract the following information from this medical bill:
         - Hospital name
         - Total amount
@@ -78,7 +138,7 @@ async def extract_structured_data_with_gpt(document_type: str, text: str) -> Dic
         Return the information in JSON format.
         """,
         
-        "discharge_summary": """
+    "discharge_summary": """
         Extract the following information from this hospital discharge summary:
         - Patient name
         - Diagnosis
@@ -91,7 +151,7 @@ async def extract_structured_data_with_gpt(document_type: str, text: str) -> Dic
         Return the information in JSON format.
         """,
         
-        "id_card": """
+    "id_card": """
         Extract the following information from this insurance ID card:
         - Patient name
         - Insurance ID
@@ -103,19 +163,158 @@ async def extract_structured_data_with_gpt(document_type: str, text: str) -> Dic
         
         Return the information in JSON format.
         """
-    }
-    
-    prompt = prompt_templates.get(document_type, "").format(text=text)
-    
-    response = await openai_client.chat.completions.create(
-        model="gpt-4o mini", 
-        messages=[
-            {"role": "system", "content": "You are a helpful assistant that extracts structured data from medical documents."},
-            {"role": "user", "content": prompt}
-        ],
-        response_format={"type": "json_object"}
+}
+
+# Appended to the prompt of each chunk of a long document
+CHUNK_PROMPT_NOTE = """
+        The text is an excerpt of a longer document. Use null for any field that does not appear in it.
+        """
+
+# Appended to the prompt of a document similar to one extracted before, with the shapes of that document's values
+EXAMPLE_PROMPT_NOTE = """
+        A similar document from the same sender had these fields, with values of these kinds
+        (null where the field was missing). Take every value from the text above:
+        {example}
+        """
+
+async def _extract_with_provider(provider: LLMProvider, operation: str, document_type: str, text: str, note: str = "") -> Dict[str, Any]:
+    """Send one extraction prompt and return the normalized structured data."""
+    prompt = EXTRACTION_PROMPT_TEMPLATES.get(document_type, "").format(text=text) + note
+    response = await _call_provider(
+        provider,
+        operation,
+        lambda: provider.generate_json(EXTRACTION_SYSTEM_PROMPT, prompt),
+        estimate_tokens(prompt),
+        EXTRACTION_COMPLETION_TOKENS
     )
-    
-    result = json.loads(response.choices[0].message.content)
-    result["type"] = document_type
-    return result
\ No newline at end of file
+    return normalize_document(document_type, json.loads(response.text))
+
+async def _extract_in_chunks(provider: LLMProvider, document_type: str, chunks: List[str]) -> Dict[str, Any]:
+    """Extract from the most relevant chunks of a long document in parallel and merge the results."""
+    selected = select_chunks(chunks, document_type, config.EXTRACTION_MAX_CHUNKS)
+    record_extraction_chunks(len(chunks), len(selected))
+    with trace_span("llm.chunked_extraction", {"chunks.total": len(chunks), "chunks.selected": len(selected)}):
+        partials = await asyncio.gather(*(
+            _extract_with_provider(provider, "chunk_extraction", document_type, chunks[index], CHUNK_PROMPT_NOTE)
+            for index in selected
+        ))
+    return normalize_document(document_type, merge_partial_results(partials))
+
+async def extract_structured_data_with_gpt(document_type: str, text: str, example: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Extract structured data from text based on document type using the extraction provider (GPT by default).
+
+    With EXTRACTION_CHUNKING enabled, documents longer than EXTRACTION_CHUNK_TOKENS
+    are split into overlapping chunks and only the chunks most relevant to the
+    document's fields are sent, in parallel; their results are merged.
+    `example`, the field names and value shapes of a near-duplicate document,
+    is added to the prompt of documents sent whole. The response is normalized onto the field names of
+    the document schema.
+    """
+    provider = get_extraction_provider()
+    chunks = (
+        split_into_chunks(text, config.EXTRACTION_CHUNK_TOKENS, config.EXTRACTION_CHUNK_OVERLAP_TOKENS)
+        if config.EXTRACTION_CHUNKING else [text]
+    )
+    cache = get_cache()
+    chunking = f"{config.EXTRACTION_CHUNK_TOKENS}/{config.EXTRACTION_CHUNK_OVERLAP_TOKENS}/{config.EXTRACTION_MAX_CHUNKS}" if len(chunks) > 1 else ""
+    cache_key = cache.make_key(EXTRACTION_PROMPT_VERSION, provider.name, provider.model, document_type, chunking, text)
+    cached_result = await cache.aget("extraction", cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    started = time.perf_counter()
+    if len(chunks) > 1:
+        result = await _extract_in_chunks(provider, document_type, chunks)
+    else:
+        note = EXAMPLE_PROMPT_NOTE.format(example=json.dumps(example)) if example else ""
+        result = await _extract_with_provider(provider, "extraction", document_type, text, note)
+    await cache.aset("extraction", cache_key, result, cost_seconds=time.perf_counter() - started)
+    return result
+
+class BatchExtractionError(Exception):
+    """Raised when a batched extraction response does not match the document schemas."""
+    pass
+
+BATCH_PROMPT_TEMPLATE = """
+Below are {count} documents from one medical insurance claim.
+For every document, classify it as one of: 'bill', 'discharge_summary', 'id_card',
+then extract the fields for that type:
+- bill: hospital_name, total_amount (number), date_of_service (YYYY-MM-DD)
+- discharge_summary: patient_name, diagnosis, admission_date (YYYY-MM-DD), discharge_date (YYYY-MM-DD)
+- id_card: patient_name, insurance_id, plan_name, expiration_date (YYYY-MM-DD, or null if not available)
+
+Return a JSON object of the form
+{{"documents": [{{"filename": "...", "type": "...", <fields for that type>}}]}}
+with exactly one entry per document, using the filenames given below.
+
+{documents}
+"""
+
+async def extract_claim_batch_with_gpt(documents: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    Classify and extract every document of a claim in a single GPT request.
+
+    Returns one entry per input document, in input order, each validated against
+    the schema of its document type. Raises BatchExtractionError if the prompt
+    would exceed BATCH_EXTRACTION_MAX_TOKENS or any entry is missing or fails
+    validation so callers can fall back to per-document calls.
+    """
+    filenames = [doc["filename"] for doc in documents]
+    if len(set(filenames)) != len(filenames):
+        raise BatchExtractionError("Batched extraction needs unique filenames")
+
+    provider = get_extraction_provider()
+    cache = get_cache()
+    cache_key = cache.make_key(
+        BATCH_PROMPT_VERSION, provider.name, provider.model, *(f"{doc['filename']}\x00{doc['content']}" for doc in documents)
+    )
+    cached_result = await cache.aget("batch_extraction", cache_key)
+    if cached_result is not None:
+        return cached_result
+
+    document_sections = "\n\n".join(
+        f"--- Document {index}: filename: {doc['filename']} ---\n{doc['content']}"
+        for index, doc in enumerate(documents, start=1)
+    )
+    prompt = BATCH_PROMPT_TEMPLATE.format(count=len(documents), documents=document_sections)
+    prompt_tokens = estimate_tokens(prompt)
+    if prompt_tokens > config.BATCH_EXTRACTION_MAX_TOKENS:
+        raise BatchExtractionError(
+            f"Batched prompt of about {prompt_tokens} tokens exceeds BATCH_EXTRACTION_MAX_TOKENS"
+        )
+
+    started = time.perf_counter()
+    response = await _call_provider(
+        provider,
+        "batch_extraction",
+        lambda: provider.generate_json(EXTRACTION_SYSTEM_PROMPT, prompt),
+        prompt_tokens,
+        EXTRACTION_COMPLETION_TOKENS
+    )
+
+    try:
+        entries = json.loads(response.text)["documents"]
+        entries_by_filename = {entry["filename"]: entry for entry in entries}
+    except (ValueError, KeyError, TypeError) as e:
+        raise BatchExtractionError(f"Malformed batched extraction response: {str(e)}")
+
+    results = []
+    for filename in filenames:
+        entry = entries_by_filename.get(filename)
+        if entry is None:
+            raise BatchExtractionError(f"Batched extraction response is missing {filename}")
+
+        doc_type = str(entry.get("type", "")).lower()
+        model = DOCUMENT_MODELS.get(doc_type)
+        if model is None:
+            raise BatchExtractionError(f"Unsupported document type {entry.get('type')!r} for {filename}")
+
+        fields = normalize_document(doc_type, {key: value for key, value in entry.items() if key != "filename"})
+        try:
+            results.append(model.model_validate(fields).model_dump(mode="json"))
+        except ValidationError as e:
+            raise BatchExtractionError(f"Invalid batched extraction for {filename}: {str(e)}")
+
+    await cache.aset("batch_extraction", cache_key, results, cost_seconds=time.perf_counter() - started)
+    return results
@@ -0,0 +1,282 @@
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional, Set, Tuple
+from .. import config
+from ..models.normalization import AMOUNT_FIELDS, DATE_FIELDS, normalize_amount, normalize_date, normalize_document
+from ..models.schemas import DOCUMENT_MODELS
+
+# Signature length and LSH banding: 16 bands of 4 slots make documents about 50% similar
+# likely to share a bucket, and documents above 70% almost certain to
+SIGNATURE_SLOTS = 64
+BANDS = 16
+# Consecutive words per shingle; short shingles keep a changed field from moving the similarity much
+SHINGLE_WORDS = 2
+# Shorter documents are not fingerprinted; a few words say too little about the layout
+MIN_WORDS = 10
+# Only the start of a document is fingerprinted; the template shows in its header
+FINGERPRINT_MAX_CHARS = 4000
+
+_DIGITS = re.compile(r"\d")
+_ISO_DATE = re.compile(r"^\d{4}-\d{2}-\d{2}$")
+_LABELED_LINE = re.compile(r"^\s*([^:\n]{2,60}?)\s*:\s*(.+?)\s*$")
+# Fields of a structured result that are not extracted from the text
+_NOT_EXTRACTED = {"type", "validation_issues"}
+
+def normalize_text(text: str) -> str:
+    """Lowercase text, collapse whitespace and mask digits, so documents differing only in numbers match."""
+    return " ".join(_DIGITS.sub("0", text.lower()).split())
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+def shingle_hashes(text: str) -> Set[int]:
+    """Return the hashes of the word shingles of a document's normalized text."""
+    words = normalize_text(text[:FINGERPRINT_MAX_CHARS]).split()
+    if len(words) < MIN_WORDS:
+        return set()
+    return {_hash64(" ".join(words[i:i + SHINGLE_WORDS])) for i in range(len(words) - SHINGLE_WORDS + 1)}
+
+class MinHasher:
+    """
+    One-permutation MinHash signatures whose matching slots estimate the Jaccard similarity of two shingle sets.
+
+    Each shingle hash falls into one slot, which keeps the smallest hash it
+    receives, so a signature takes one pass over the shingles rather than one
+    per slot. An empty slot takes the value of the next filled one plus its
+    distance to it, so two signatures only match there if both are built alike.
+    """
+
+    def __init__(self, num_slots: int = SIGNATURE_SLOTS):
+        self.num_slots = num_slots
+
+    def signature(self, hashes: Set[int]) -> Tuple[int, ...]:
+        slots: List[Optional[int]] = [None] * self.num_slots
+        for value in hashes:
+            slot, rest = value % self.num_slots, value // self.num_slots
+            if slots[slot] is None or rest < slots[slot]:
+                slots[slot] = rest
+        signature = []
+        for slot in range(self.num_slots):
+            distance = 0
+            while slots[(slot + distance) % self.num_slots] is None:
+                distance += 1
+            signature.append(slots[(slot + distance) % self.num_slots] + (distance << 64))
+        return tuple(signature)
+
+def similarity(first: Tuple[int, ...], second: Tuple[int, ...]) -> float:
+    """Estimated Jaccard similarity of the documents behind two signatures."""
+    return sum(1 for a, b in zip(first, second) if a == b) / len(first)
+
+def _field_matches(field: str, raw: str, value: Any) -> bool:
+    if field in AMOUNT_FIELDS:
+        return normalize_amount(raw) == value
+    if field in DATE_FIELDS:
+        return normalize_date(raw) == value
+    return raw.strip().lower() == str(value).strip().lower()
+
+def _labeled_values(text: str) -> Dict[str, str]:
+    """Return the value of every `Label: value` line of a text by lowercased label, first occurrence first."""
+    values: Dict[str, str] = {}
+    for line in text.splitlines():
+        match = _LABELED_LINE.match(line)
+        if match:
+            values.setdefault(match.group(1).lower(), match.group(2))
+    return values
+
+def value_shapes(structured_data: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replace the extracted values of a document with placeholders of their
+    shape, so what is kept and shown to the LLM holds no patient data.
+    """
+    shapes: Dict[str, Any] = {}
+    for field, value in structured_data.items():
+        if field in _NOT_EXTRACTED:
+            continue
+        if value is None:
+            shapes[field] = None
+        elif field in DATE_FIELDS:
+            shapes[field] = "<YYYY-MM-DD>"
+        elif isinstance(value, (int, float)):
+            shapes[field] = "<number>"
+        else:
+            shapes[field] = "<text>"
+    return shapes
+
+def learn_template(text: str, structured_data: Dict[str, Any]) -> Dict[str, str]:
+    """
+    Find the `Label: value` line holding each extracted field of a document.
+
+    Returns the label of each field, or an empty dict unless every extracted
+    field is a schema field found on exactly one line of its own, since a
+    partial or ambiguous template cannot replace the LLM. A field whose value
+    also appears under another label (e.g. equal admission and discharge
+    dates) would be read from the wrong line in the next document.
+    """
+    model = DOCUMENT_MODELS.get(structured_data.get("type"))
+    if model is None:
+        return {}
+    labeled = _labeled_values(text)
+    labels = {}
+    for field, value in structured_data.items():
+        if field in _NOT_EXTRACTED or value is None:
+            continue
+        if field not in model.model_fields:
+            return {}
+        matches = [label for label, raw in labeled.items() if _field_matches(field, raw, value)]
+        if len(matches) != 1 or matches[0] in labels.values():
+            return {}
+        labels[field] = matches[0]
+    return labels
+
+def parse_with_template(document_type: str, text: str, labels: Dict[str, str], fields: List[str]) -> Optional[Dict[str, Any]]:
+    """
+    Read the fields of a document at the labels learned from a near-duplicate.
+
+    Returns None if a label is missing or a value does not read as its field's
+    type, e.g. a date line holding something other than a date, so the
+    document goes to the LLM instead.
+    """
+    labeled = _labeled_values(text)
+    data = {field: None for field in fields if field not in _NOT_EXTRACTED}
+    for field, label in labels.items():
+        if label not in labeled:
+            return None
+        data[field] = labeled[label]
+    parsed = normalize_document(document_type, data)
+    for field in labels:
+        value = parsed.get(field)
+        if field in AMOUNT_FIELDS and not isinstance(value, float):
+            return None
+        if field in DATE_FIELDS and not _ISO_DATE.match(str(value)):
+            return None
+    return dict(parsed, type=document_type)
+
+class NearDuplicate:
+    """A previously processed document: its type, the value shapes of its result and the labels its fields were found at."""
+
+    def __init__(self, document_type: str, signature: Tuple[int, ...], result: Dict[str, Any], labels: Dict[str, str]):
+        self.document_type = document_type
+        self.signature = signature
+        self.result = result
+        self.labels = labels
+
+class NearDuplicateIndex:
+    """
+    Bounded in-process index of document fingerprints with LSH buckets.
+
+    Lookups only compare a document with the entries sharing one of its band
+    buckets, so they do not scan the index. The least recently matched entries
+    are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, min_similarity: float, signature_slots: int = SIGNATURE_SLOTS, bands: int = BANDS):
+        if signature_slots % bands:
+            raise ValueError("The number of signature slots must be a multiple of the number of bands")
+        self.max_entries = max_entries
+        self.min_similarity = min_similarity
+        self.bands = bands
+        self._rows = signature_slots // bands
+        self._hasher = MinHasher(signature_slots)
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._entries: "OrderedDict[int, NearDuplicate]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+        # Documents looked up and how their nearest indexed document was used
+        self.lookups = 0
+        self.classifications_reused = 0
+        self.extractions_hinted = 0
+        self.extractions_from_template = 0
+        self.evictions = 0
+
+    def fingerprint(self, text: str) -> Optional[Tuple[int, ...]]:
+        """Return the MinHash signature of a document, or None if it is too short to fingerprint."""
+        hashes = shingle_hashes(text)
+        return self._hasher.signature(hashes) if hashes else None
+
+    def _band_keys(self, signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+        return [(band, signature[band * self._rows:(band + 1) * self._rows]) for band in range(self.bands)]
+
+    def find(self, signature: Tuple[int, ...], document_type: Optional[str] = None) -> Optional[Tuple[NearDuplicate, float]]:
+        """Return the most similar indexed document, of `document_type` if given, and its similarity."""
+        with self._lock:
+            candidates = set()
+            for key in self._band_keys(signature):
+                candidates |= self._buckets.get(key, set())
+            best = None
+            for entry_id in candidates:
+                entry = self._entries[entry_id]
+                if document_type is not None and entry.document_type != document_type:
+                    continue
+                score = similarity(signature, entry.signature)
+                if score >= self.min_similarity and (best is None or score > best[1]):
+                    best = (entry_id, score)
+            if best is None:
+                return None
+            self._entries.move_to_end(best[0])
+            return self._entries[best[0]], best[1]
+
+    def add(self, signature: Tuple[int, ...], document_type: str, result: Dict[str, Any], labels: Dict[str, str]) -> None:
+        """Index a processed document, evicting the least recently matched entries beyond `max_entries`."""
+        entry = NearDuplicate(document_type, signature, result, labels)
+        with self._lock:
+            entry_id = self._next_id
+            self._next_id += 1
+            self._entries[entry_id] = entry
+            for key in self._band_keys(signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id)
+        for key in self._band_keys(entry.signature):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def record_lookup(self) -> None:
+        self.lookups += 1
+
+    def record_classification_reused(self) -> None:
+        self.classifications_reused += 1
+
+    def record_extraction(self, from_template: bool) -> None:
+        if from_template:
+            self.extractions_from_template += 1
+        else:
+            self.extractions_hinted += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "evictions": self.evictions,
+            "lookups": self.lookups,
+            "classifications_reused": self.classifications_reused,
+            "extractions_hinted": self.extractions_hinted,
+            "extractions_from_template": self.extractions_from_template,
+            "classification_reuse_rate": self.classifications_reused / self.lookups if self.lookups else 0.0,
+            "extraction_reuse_rate": (
+                (self.extractions_hinted + self.extractions_from_template) / self.lookups if self.lookups else 0.0
+            ),
+            "template_rate": self.extractions_from_template / self.lookups if self.lookups else 0.0,
+        }
+
+_index: Optional[NearDuplicateIndex] = None
+
+def get_near_duplicate_index() -> NearDuplicateIndex:
+    """Return the shared near-duplicate index, creating it from the configuration on first use."""
+    global _index
+    if _index is None:
+        _index = NearDuplicateIndex(config.NEAR_DUPLICATE_MAX_ENTRIES, config.NEAR_DUPLICATE_MIN_SIMILARITY)
+    return _index
+
+def reset_near_duplicate_index() -> None:
+    """Drop the shared index so it is rebuilt from the current configuration."""
+    global _index
+    _index = None
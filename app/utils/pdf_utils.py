@@ -1,29 +1,346 @@
-import os
-from pypdf import PdfReader
-from typing import List, Dict, Any, BinaryIO
+import asyncio
+import hashlib
 import io
+import multiprocessing
+import os
+import time
+import weakref
+from concurrent.futures import Executor, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import List, Dict, Any, BinaryIO, Iterator, Optional, Union
+from .cache import get_cache
+from .telemetry import record_document, trace_span
+from .. import config
 
-async def extract_text_from_pdf(file_content: BinaryIO) -> str:
-    """Extract text content from a PDF file."""
+# Rough number of characters per LLM token, used to turn token budgets into text limits
+APPROX_CHARS_PER_TOKEN = 4
+
+_executor: Optional[Executor] = None
+_ocr_executor: Optional[Executor] = None
+# Per event loop semaphores bounding the work handed to each executor
+_executor_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+_ocr_slots: "weakref.WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Semaphore]" = weakref.WeakKeyDictionary()
+
+# Bump whenever OCR settings change in a way that invalidates cached OCR text
+OCR_CACHE_VERSION = "1"
+
+def iter_page_texts(source: Union[str, bytes], max_pages: Optional[int] = None) -> Iterator[str]:
+    """Lazily yield the text of each page of a PDF given as a file path or bytes."""
+    # Imported here so pypdf is only loaded by the processes that extract PDFs
+    from pypdf import PdfReader
+
+    pdf_reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    for index, page in enumerate(pdf_reader.pages):
+        if max_pages is not None and index >= max_pages:
+            break
+        yield page.extract_text() or ""
+
+def _extract_text_sync(
+    source: Union[str, bytes],
+    max_pages: int,
+    preview_pages: int,
+    max_chars: int,
+    ocr_min_chars: int = 0,
+    ocr_max_pages: int = 0
+) -> Dict[str, Any]:
+    """
+    Extract text from a PDF page by page. Runs inside the extraction executor.
+
+    Stops reading as soon as the classification preview is complete and the
+    extraction text budget of `max_chars` is used up, so memory stays bounded
+    no matter how many pages the document has.
+
+    With `ocr_min_chars` set, pages with less text than that are checked for
+    images; if there are any, the result also holds the text of every page
+    read as `page_texts` and the images per page index as `ocr_images`.
+    """
+    preview_parts: List[str] = []
+    content_parts: List[str] = []
+    content_chars = 0
+    pages_read = 0
+    truncated = False
+    page_texts: List[str] = []
+    low_text_pages: List[int] = []
+
+    for page_text in iter_page_texts(source, max_pages):
+        if ocr_min_chars:
+            page_texts.append(page_text)
+            if len(page_text.strip()) < ocr_min_chars and len(low_text_pages) < ocr_max_pages:
+                low_text_pages.append(pages_read)
+        if pages_read < preview_pages:
+            preview_parts.append(page_text)
+        if content_chars < max_chars:
+            content_parts.append(page_text[:max_chars - content_chars])
+            content_chars += len(content_parts[-1]) + 1
+            truncated = truncated or len(page_text) > len(content_parts[-1])
+        else:
+            truncated = True
+        pages_read += 1
+        if pages_read >= preview_pages and content_chars >= max_chars:
+            truncated = True
+            break
+
+    result = {
+        "preview": "\n".join(preview_parts).strip(),
+        "content": "\n".join(content_parts).strip(),
+        "pages_read": pages_read,
+        "truncated": truncated
+    }
+    if low_text_pages:
+        ocr_images = _extract_page_images(source, low_text_pages)
+        if ocr_images:
+            result["page_texts"] = page_texts
+            result["ocr_images"] = ocr_images
+    return result
+
+def _extract_page_images(source: Union[str, bytes], page_indexes: List[int]) -> Dict[int, List[bytes]]:
+    """Return the encoded images of the given pages, skipping pages without images."""
+    from pypdf import PdfReader
+
+    pdf_reader = PdfReader(source if isinstance(source, str) else io.BytesIO(source))
+    images: Dict[int, List[bytes]] = {}
+    for index in page_indexes:
+        try:
+            page_images = [image.data for image in pdf_reader.pages[index].images]
+        except Exception as e:
+            # Decoding images needs Pillow and some encodings are not supported
+            print(f"Error reading images of page {index + 1}: {str(e)}")
+            continue
+        if page_images:
+            images[index] = page_images
+    return images
+
+def _ocr_image_sync(image: bytes, language: str) -> str:
+    """OCR one encoded page image with Tesseract. Runs inside the OCR executor."""
+    import pytesseract
+    from PIL import Image
+
+    with Image.open(io.BytesIO(image)) as picture:
+        return pytesseract.image_to_string(picture, lang=language)
+
+def _assemble_text(page_texts: List[str], preview_pages: int, max_chars: int, truncated: bool) -> Dict[str, Any]:
+    """Build the preview and the budgeted content from the text of every page read."""
+    content = "\n".join(page_texts)
+    if len(content) > max_chars:
+        content = content[:max_chars]
+        truncated = True
+    return {
+        "preview": "\n".join(page_texts[:preview_pages]).strip(),
+        "content": content.strip(),
+        "truncated": truncated
+    }
+
+_ocr_available: Optional[bool] = None
+
+def ocr_available() -> bool:
+    """Whether pytesseract, Pillow and the tesseract binary are installed."""
+    global _ocr_available
+    if _ocr_available is None:
+        try:
+            import pytesseract
+            import PIL
+
+            pytesseract.get_tesseract_version()
+            _ocr_available = True
+        except Exception as e:
+            print(f"OCR of scanned pages is disabled: {str(e)}")
+            _ocr_available = False
+    return _ocr_available
+
+def _create_executor(workers: int, thread_name_prefix: str) -> Executor:
+    if config.PDF_EXECUTOR == "thread":
+        return ThreadPoolExecutor(max_workers=workers, thread_name_prefix=thread_name_prefix)
+    return ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"))
+
+def get_pdf_executor() -> Executor:
+    """Return the shared PDF extraction executor, creating it on first use."""
+    global _executor
+    if _executor is None:
+        _executor = _create_executor(config.PDF_WORKERS, "pdf-extract")
+    return _executor
+
+def get_ocr_executor() -> Executor:
+    """Return the shared OCR executor, creating it on first use."""
+    global _ocr_executor
+    if _ocr_executor is None:
+        _ocr_executor = _create_executor(config.OCR_WORKERS, "pdf-ocr")
+    return _ocr_executor
+
+def _warm_worker(delay: float) -> int:
+    """Load the PDF libraries in an executor worker; the delay keeps workers busy so each task starts a new one."""
+    import pypdf
+
+    time.sleep(delay)
+    return os.getpid()
+
+async def warm_pdf_executor() -> int:
+    """Start the PDF extraction workers ahead of the first claim and return how many are running."""
+    executor = get_pdf_executor()
+    if not isinstance(executor, ProcessPoolExecutor):
+        return config.PDF_WORKERS
+    loop = asyncio.get_running_loop()
+    pids = await asyncio.gather(*(loop.run_in_executor(executor, _warm_worker, 0.05) for _ in range(config.PDF_WORKERS)))
+    return len(set(pids))
+
+def shutdown_pdf_executor() -> None:
+    """Shut down the PDF extraction and OCR executors, e.g. on application shutdown."""
+    global _executor, _ocr_executor
+    for executor in (_executor, _ocr_executor):
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+    _executor = None
+    _ocr_executor = None
+    _executor_slots.clear()
+    _ocr_slots.clear()
+
+def _get_executor_slots() -> asyncio.Semaphore:
+    """Return the semaphore bounding running plus queued extractions on this loop."""
+    loop = asyncio.get_running_loop()
+    slots = _executor_slots.get(loop)
+    if slots is None:
+        slots = asyncio.Semaphore(config.PDF_WORKERS + config.PDF_MAX_QUEUE)
+        _executor_slots[loop] = slots
+    return slots
+
+def _get_ocr_slots() -> asyncio.Semaphore:
+    """Return the semaphore bounding running plus queued OCR jobs on this loop."""
+    loop = asyncio.get_running_loop()
+    slots = _ocr_slots.get(loop)
+    if slots is None:
+        slots = asyncio.Semaphore(config.OCR_WORKERS + config.PDF_MAX_QUEUE)
+        _ocr_slots[loop] = slots
+    return slots
+
+def _release_slot(loop: asyncio.AbstractEventLoop, slots: asyncio.Semaphore) -> None:
+    """Release an executor slot from whichever thread completed the work."""
     try:
-        # Make sure the file pointer is at the beginning
-        file_content.seek(0)
-        pdf_reader = PdfReader(file_content)
-        text = ""
-        for page in pdf_reader.pages:
-            text += page.extract_text() + "\n"
-        return text.strip()
+        loop.call_soon_threadsafe(slots.release)
+    except RuntimeError:
+        # The loop that queued the work has already been closed
+        pass
+
+def _read_source(file_content: BinaryIO) -> Union[str, bytes]:
+    """Return a file path the executor can open itself, or the file bytes."""
+    path = getattr(file_content, "name", None)
+    if isinstance(path, str) and os.path.isfile(path):
+        file_content.flush()
+        return path
+    # Make sure the file pointer is at the beginning
+    file_content.seek(0)
+    return file_content.read()
+
+async def _run_bounded(executor: Executor, slots: asyncio.Semaphore, timeout: float, func, *args) -> Any:
+    """Run `func` in an executor once a slot is free and wait for it at most `timeout` seconds."""
+    loop = asyncio.get_running_loop()
+    await slots.acquire()
+    try:
+        future = executor.submit(func, *args)
+    except BaseException:
+        slots.release()
+        raise
+    # Free the slot only once the worker is really done, even after a timeout
+    future.add_done_callback(lambda _: _release_slot(loop, slots))
+    return await asyncio.wait_for(asyncio.wrap_future(future), timeout=timeout)
+
+async def ocr_image(image: bytes) -> str:
+    """OCR a page image in the OCR pool, cached by the hash of the image."""
+    cache = get_cache()
+    cache_key = cache.make_key(OCR_CACHE_VERSION, config.OCR_LANGUAGE, hashlib.sha256(image).hexdigest())
+    cached_text = await cache.aget("ocr", cache_key)
+    if cached_text is not None:
+        return cached_text
+
+    started = time.perf_counter()
+    try:
+        text = await _run_bounded(
+            get_ocr_executor(), _get_ocr_slots(), config.OCR_TIMEOUT_SECONDS,
+            _ocr_image_sync, image, config.OCR_LANGUAGE
+        )
+    except asyncio.TimeoutError:
+        print(f"Timed out running OCR on a page image after {config.OCR_TIMEOUT_SECONDS}s")
+        return ""
+    except Exception as e:
+        print(f"Error running OCR on a page image: {str(e)}")
+        return ""
+
+    await cache.aset("ocr", cache_key, text, cost_seconds=time.perf_counter() - started)
+    return text
+
+async def _apply_ocr(result: Dict[str, Any]) -> Dict[str, Any]:
+    """Add the OCR text of the images of low-text pages to an extraction result."""
+    page_texts = result.pop("page_texts")
+    ocr_images = result.pop("ocr_images")
+
+    with trace_span("pdf.ocr", {"ocr.pages": len(ocr_images)}):
+        texts = await asyncio.gather(*(ocr_image(image) for images in ocr_images.values() for image in images))
+
+    position = 0
+    for index, images in ocr_images.items():
+        ocr_text = "\n".join(texts[position:position + len(images)])
+        position += len(images)
+        page_texts[index] = (page_texts[index] + "\n" + ocr_text).strip()
+
+    result.update(_assemble_text(
+        page_texts,
+        config.CLASSIFICATION_MAX_PAGES,
+        config.EXTRACTION_MAX_TOKENS * APPROX_CHARS_PER_TOKEN,
+        result["truncated"]
+    ))
+    return result
+
+async def extract_pdf(file_content: BinaryIO) -> Dict[str, Any]:
+    """
+    Extract the text of a PDF file for classification and extraction.
+
+    Parsing runs in the PDF extraction executor so large documents never block
+    the event loop. At most PDF_WORKERS + PDF_MAX_QUEUE files are handed to the
+    executor at once and each file gets PDF_TIMEOUT_SECONDS to finish.
+
+    Pages with (almost) no text, such as scans, are sent to OCR in a separate
+    bounded pool when OCR is available; text-native pages never pay for it.
+
+    Returns a dict with the first CLASSIFICATION_MAX_PAGES pages as `preview`
+    and the text sent to extraction, capped at EXTRACTION_MAX_TOKENS, as `content`.
+    """
+    try:
+        source = _read_source(file_content)
+        ocr_min_chars = config.OCR_MIN_PAGE_CHARS if config.OCR_ENABLED and ocr_available() else 0
+
+        result = await _run_bounded(
+            get_pdf_executor(),
+            _get_executor_slots(),
+            config.PDF_TIMEOUT_SECONDS,
+            _extract_text_sync,
+            source,
+            config.PDF_MAX_PAGES,
+            config.CLASSIFICATION_MAX_PAGES,
+            config.EXTRACTION_MAX_TOKENS * APPROX_CHARS_PER_TOKEN,
+            ocr_min_chars,
+            config.OCR_MAX_PAGES
+        )
+        if result.get("ocr_images"):
+            result = await _apply_ocr(result)
+        size_bytes = os.path.getsize(source) if isinstance(source, str) else len(source)
+        record_document(size_bytes, result["pages_read"], len(result["content"]))
+        return result
+    except asyncio.TimeoutError:
+        print(f"Timed out extracting text from PDF after {config.PDF_TIMEOUT_SECONDS}s")
     except Exception as e:
         print(f"Error extracting text from PDF: {str(e)}")
-        return "Error extracting text"
+    return {"preview": "Error extracting text", "content": "Error extracting text", "pages_read": 0, "truncated": False}
+
+async def extract_text_from_pdf(file_content: BinaryIO) -> str:
+    """Extract text content from a PDF file, within the extraction token budget."""
+    return (await extract_pdf(file_content))["content"]
 
 async def process_pdf_files(files: List[BinaryIO]) -> List[Dict[str, Any]]:
-    """Process multiple PDF files and extract their text content."""
-    results = []
-    for file in files:
-        text = await extract_text_from_pdf(file)
-        results.append({
+    """Process multiple PDF files in parallel and extract their text content."""
+    extracted = await asyncio.gather(*(extract_pdf(file) for file in files))
+    return [
+        {
             "filename": getattr(file, "filename", "unknown"),
-            "content": text
-        })
-    return results
\ No newline at end of file
+            "content": pdf["content"],
+            "preview": pdf["preview"],
+            "truncated": pdf["truncated"]
+        }
+        for file, pdf in zip(files, extracted)
+    ]
@@ -0,0 +1,394 @@
+import asyncio
+import random
+import sqlite3
+import threading
+import time
+from typing import Any, Awaitable, Callable, Dict, Optional, TypeVar
+from .sqlite_utils import connect_sqlite
+from .telemetry import add_span_event
+from .. import config
+
+T = TypeVar("T")
+
+class CircuitOpenError(Exception):
+    """Raised when a provider's circuit breaker is open and calls are refused."""
+    pass
+
+class TokenBucket:
+    """
+    Async token bucket refilled continuously at `rate_per_minute`.
+
+    The rate adapts to the provider: it is halved whenever the provider answers
+    429 and slowly recovers towards the configured rate on success.
+    A rate of 0 disables limiting.
+    """
+
+    def __init__(self, rate_per_minute: float):
+        self.configured_rate = rate_per_minute
+        self.rate = rate_per_minute
+        self.capacity = rate_per_minute
+        self._tokens = rate_per_minute
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+        self.waited_seconds = 0.0
+
+    async def acquire(self, amount: float = 1) -> None:
+        """Wait until `amount` tokens are available and take them."""
+        if self.configured_rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            self._refill()
+            if self._tokens < amount:
+                delay = (amount - self._tokens) / (self.rate / 60)
+                self.waited_seconds += delay
+                await asyncio.sleep(delay)
+                self._refill()
+            self._tokens -= amount
+
+    async def penalize(self) -> None:
+        """Halve the rate after the provider signalled it is overloaded."""
+        if self.configured_rate > 0:
+            self.rate = max(self.configured_rate / 10, self.rate / 2)
+            self._tokens = min(self._tokens, 0)
+
+    async def reward(self) -> None:
+        """Recover part of the configured rate after a successful call."""
+        if self.configured_rate > 0:
+            self.rate = min(self.configured_rate, self.rate + self.configured_rate * 0.05)
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.rate / 60)
+        self._updated = now
+
+class SQLiteTokenBucket(TokenBucket):
+    """
+    Token bucket kept in SQLite so every worker process on the host draws from one budget.
+
+    Tokens are reserved in a short transaction and the caller then sleeps off
+    any deficit outside of it, so waiting callers never hold the database lock.
+    Transactions run in a worker thread, off the event loop. The adaptive rate
+    is shared as well. If the database stays busy, the call goes ahead without
+    drawing from the shared budget rather than failing.
+    """
+
+    def __init__(self, name: str, rate_per_minute: float, path: str):
+        super().__init__(rate_per_minute)
+        self.name = name
+        self._lock = threading.Lock()
+        self._conn = connect_sqlite(path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS token_buckets (name TEXT PRIMARY KEY, tokens REAL NOT NULL, "
+            "rate REAL NOT NULL, updated_at REAL NOT NULL)"
+        )
+        self._conn.execute(
+            "INSERT OR IGNORE INTO token_buckets (name, tokens, rate, updated_at) VALUES (?, ?, ?, ?)",
+            (name, self.capacity, rate_per_minute, time.time())
+        )
+
+    def _update(self, amount: float = 0.0, rate_change: Optional[Callable[[float], float]] = None, cap_tokens: bool = False) -> float:
+        """Refill the shared bucket, apply a change and return the resulting token count."""
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                tokens, rate, updated_at = self._conn.execute(
+                    "SELECT tokens, rate, updated_at FROM token_buckets WHERE name = ?", (self.name,)
+                ).fetchone()
+                now = time.time()
+                rate = min(rate, self.configured_rate)
+                tokens = min(self.capacity, tokens + max(0.0, now - updated_at) * rate / 60) - amount
+                if rate_change is not None:
+                    rate = rate_change(rate)
+                if cap_tokens:
+                    tokens = min(tokens, 0)
+                self._conn.execute(
+                    "UPDATE token_buckets SET tokens = ?, rate = ?, updated_at = ? WHERE name = ?",
+                    (tokens, rate, now, self.name)
+                )
+                self._conn.execute("COMMIT")
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+        self.rate = rate
+        return tokens
+
+    async def acquire(self, amount: float = 1) -> None:
+        if self.configured_rate <= 0:
+            return
+        amount = min(amount, self.capacity)
+        tokens = await self._update_in_thread(amount)
+        if tokens is not None and tokens < 0:
+            delay = -tokens / (self.rate / 60)
+            self.waited_seconds += delay
+            await asyncio.sleep(delay)
+
+    async def penalize(self) -> None:
+        if self.configured_rate > 0:
+            await self._update_in_thread(rate_change=lambda rate: max(self.configured_rate / 10, rate / 2), cap_tokens=True)
+
+    async def reward(self) -> None:
+        if self.configured_rate > 0 and self.rate < self.configured_rate:
+            await self._update_in_thread(rate_change=lambda rate: min(self.configured_rate, rate + self.configured_rate * 0.05))
+
+    async def _update_in_thread(self, *args: Any, **kwargs: Any) -> Optional[float]:
+        """Run _update in a worker thread; None if the database stayed busy."""
+        try:
+            return await asyncio.to_thread(self._update, *args, **kwargs)
+        except sqlite3.OperationalError as e:
+            print(f"Error updating the {self.name} rate limit: {str(e)}")
+            return None
+
+def create_token_bucket(name: str, rate_per_minute: float) -> TokenBucket:
+    """Create a token bucket in the store selected by RATE_LIMIT_STORE."""
+    if config.RATE_LIMIT_STORE == "sqlite" and rate_per_minute > 0:
+        return SQLiteTokenBucket(name, rate_per_minute, config.RATE_LIMIT_STORE_PATH)
+    return TokenBucket(rate_per_minute)
+
+class CircuitBreaker:
+    """
+    Circuit breaker with half-open probing.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast. Once `reset_seconds` have passed a single probe call is allowed;
+    its success closes the circuit, its failure opens it again. A probe that
+    never completes, e.g. because it was cancelled, lets the next call probe.
+
+    Every call is tagged with the breaker's generation, which moves on each
+    time the circuit opens and when a probe is let through. Outcomes of calls
+    from an older generation, started before the circuit opened, are ignored,
+    so only the probe's own outcome closes or reopens a half-open circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_seconds: float):
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = "closed"
+        self.opened_count = 0
+        self.generation = 0
+        self._failures = 0
+        self._opened_at = 0.0
+
+    def before_call(self) -> int:
+        """Raise CircuitOpenError unless a call may go through right now; return the call's generation."""
+        if self.state == "closed":
+            return self.generation
+        if self.state == "open" and time.monotonic() - self._opened_at >= self.reset_seconds:
+            # The probe gets a generation of its own
+            self.state = "half_open"
+            self.generation += 1
+            return self.generation
+        raise CircuitOpenError("Circuit breaker is open")
+
+    def release_probe(self, generation: int) -> None:
+        """Give up a probe that ended without a result, so the next call probes again."""
+        if self.state == "half_open" and generation == self.generation:
+            self.state = "open"
+
+    def record_success(self, generation: Optional[int] = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        self._failures = 0
+        self.state = "closed"
+
+    def record_failure(self, generation: Optional[int] = None) -> None:
+        if generation is not None and generation != self.generation:
+            return
+        self._failures += 1
+        if self.state == "half_open" or self._failures >= self.failure_threshold:
+            if self.state != "open":
+                self.opened_count += 1
+            self.state = "open"
+            self.generation += 1
+            self._opened_at = time.monotonic()
+
+def get_status_code(error: BaseException) -> Optional[int]:
+    """Return the HTTP status code carried by an SDK error, if any."""
+    for attribute in ("status_code", "code"):
+        value = getattr(error, attribute, None)
+        if isinstance(value, int):
+            return value
+    return None
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether an LLM error is worth retrying: 429, 5xx, timeouts and connection errors."""
+    status = get_status_code(error)
+    if status is not None:
+        return status == 429 or status >= 500
+    if isinstance(error, (asyncio.TimeoutError, ConnectionError)):
+        return True
+    name = type(error).__name__
+    if "Timeout" in name or "Connection" in name:
+        return True
+    message = str(error).lower()
+    return "429" in message or "rate limit" in message or "quota" in message or "unavailable" in message
+
+def get_retry_after(error: BaseException) -> Optional[float]:
+    """Return the Retry-After delay sent with an error response, if any."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None)
+    if not headers:
+        return None
+    try:
+        return float(headers.get("retry-after"))
+    except (TypeError, ValueError):
+        return None
+
+class ResilientCaller:
+    """
+    Shared call layer for one LLM provider.
+
+    Applies request and token rate limits, a circuit breaker, jittered
+    exponential backoff on retryable errors and optional request hedging.
+    """
+
+    def __init__(
+        self,
+        name: str,
+        requests_per_minute: float,
+        tokens_per_minute: float,
+        max_retries: int,
+        backoff_base: float,
+        backoff_max: float,
+        failure_threshold: int,
+        reset_seconds: float,
+        hedge_delay: float
+    ):
+        self.name = name
+        self.request_bucket = create_token_bucket(f"{name}.requests", requests_per_minute)
+        self.token_bucket = create_token_bucket(f"{name}.tokens", tokens_per_minute)
+        self.breaker = CircuitBreaker(failure_threshold, reset_seconds)
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.hedge_delay = hedge_delay
+        self.stats = {"calls": 0, "failures": 0, "retries": 0, "hedges": 0, "hedge_wins": 0, "circuit_rejections": 0}
+
+    async def call(self, func: Callable[[], Awaitable[T]], estimated_tokens: int = 0) -> T:
+        """Run `func` under the rate limits, retrying retryable failures."""
+        self.stats["calls"] += 1
+        attempt = 0
+        while True:
+            try:
+                generation = self.breaker.before_call()
+            except CircuitOpenError:
+                self.stats["circuit_rejections"] += 1
+                raise CircuitOpenError(f"{self.name} circuit breaker is open")
+
+            try:
+                result = await self._attempt(func, estimated_tokens)
+            except asyncio.CancelledError:
+                # A cancelled probe says nothing about the provider's health
+                self.breaker.release_probe(generation)
+                raise
+            except Exception as e:
+                retryable = is_retryable(e)
+                if retryable:
+                    self.breaker.record_failure(generation)
+                    if get_status_code(e) == 429:
+                        await self.request_bucket.penalize()
+                        await self.token_bucket.penalize()
+                else:
+                    # The provider answered, so it is healthy even if the request was bad
+                    self.breaker.record_success(generation)
+                if not retryable or attempt >= self.max_retries:
+                    self.stats["failures"] += 1
+                    raise
+                attempt += 1
+                self.stats["retries"] += 1
+                add_span_event("llm.retry", {"attempt": attempt, "error": type(e).__name__})
+                await asyncio.sleep(self._backoff(attempt, get_retry_after(e)))
+                continue
+
+            self.breaker.record_success(generation)
+            await self.request_bucket.reward()
+            await self.token_bucket.reward()
+            return result
+
+    def _backoff(self, attempt: int, retry_after: Optional[float]) -> float:
+        """Full-jitter exponential backoff, never shorter than the server's Retry-After."""
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** (attempt - 1))))
+        if retry_after is not None:
+            delay = max(delay, min(retry_after, self.backoff_max))
+        return delay
+
+    async def _attempt(self, func: Callable[[], Awaitable[T]], estimated_tokens: int) -> T:
+        """Make one rate-limited attempt, hedged with a second request if it is slow."""
+        await self._acquire(estimated_tokens)
+        if self.hedge_delay <= 0:
+            return await func()
+
+        primary = asyncio.ensure_future(func())
+        hedge: Optional[asyncio.Future] = None
+        try:
+            done, _ = await asyncio.wait({primary}, timeout=self.hedge_delay)
+            if done:
+                return primary.result()
+
+            self.stats["hedges"] += 1
+            add_span_event("llm.hedge")
+            await self._acquire(estimated_tokens)
+            hedge = asyncio.ensure_future(func())
+            pending = {primary, hedge}
+            error: Optional[BaseException] = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is hedge:
+                            self.stats["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            # Cancelled while waiting, or done with one request: no request outlives the attempt
+            for task in (primary, hedge):
+                if task is not None and not task.done():
+                    task.cancel()
+
+    async def _acquire(self, estimated_tokens: int) -> None:
+        await self.request_bucket.acquire(1)
+        if estimated_tokens:
+            await self.token_bucket.acquire(estimated_tokens)
+
+    def get_stats(self) -> Dict[str, Any]:
+        return dict(
+            self.stats,
+            circuit_state=self.breaker.state,
+            circuit_opened=self.breaker.opened_count,
+            rate_limit_wait_seconds=round(self.request_bucket.waited_seconds + self.token_bucket.waited_seconds, 3),
+            requests_per_minute=self.request_bucket.rate,
+            tokens_per_minute=self.token_bucket.rate
+        )
+
+_callers: Dict[str, ResilientCaller] = {}
+
+PROVIDER_RATE_LIMITS = {
+    "gemini": ("GEMINI_REQUESTS_PER_MINUTE", "GEMINI_TOKENS_PER_MINUTE"),
+    "openai": ("OPENAI_REQUESTS_PER_MINUTE", "OPENAI_TOKENS_PER_MINUTE"),
+}
+
+def get_llm_caller(provider: str) -> ResilientCaller:
+    """Return the shared call layer of an LLM provider, creating it on first use."""
+    if provider not in _callers:
+        requests_setting, tokens_setting = PROVIDER_RATE_LIMITS.get(provider, (None, None))
+        _callers[provider] = ResilientCaller(
+            provider,
+            getattr(config, requests_setting, 0) if requests_setting else 0,
+            getattr(config, tokens_setting, 0) if tokens_setting else 0,
+            config.LLM_MAX_RETRIES,
+            config.LLM_BACKOFF_BASE_SECONDS,
+            config.LLM_BACKOFF_MAX_SECONDS,
+            config.LLM_CIRCUIT_FAILURE_THRESHOLD,
+            config.LLM_CIRCUIT_RESET_SECONDS,
+            config.LLM_HEDGE_DELAY_SECONDS
+        )
+    return _callers[provider]
+
+def reset_llm_callers() -> None:
+    """Drop the shared call layers so they are rebuilt from config."""
+    _callers.clear()
+
+def get_llm_stats() -> Dict[str, Dict[str, Any]]:
+    """Return retry, hedging, circuit breaker and rate limit statistics per provider."""
+    return {name: caller.get_stats() for name, caller in _callers.items()}
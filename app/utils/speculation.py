@@ -0,0 +1,39 @@
+from typing import Any, Dict
+
+class SpeculationStats:
+    """Counters showing whether extractions started on the local classifier's guess paid off."""
+
+    def __init__(self):
+        self.started = 0
+        self.committed = 0
+        self.mispredicted = 0
+        # Mispredictions cancelled before their extraction finished
+        self.cancelled_in_flight = 0
+        # Tokens reported by the LLM calls of discarded extractions, plus the
+        # estimated prompt tokens of their calls cancelled in flight
+        self.wasted_tokens = 0
+
+    def record_started(self) -> None:
+        self.started += 1
+
+    def record_committed(self) -> None:
+        self.committed += 1
+
+    def record_mispredicted(self, wasted_tokens: int, in_flight: bool) -> None:
+        self.mispredicted += 1
+        self.wasted_tokens += wasted_tokens
+        if in_flight:
+            self.cancelled_in_flight += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        resolved = self.committed + self.mispredicted
+        return {
+            "started": self.started,
+            "committed": self.committed,
+            "mispredicted": self.mispredicted,
+            "cancelled_in_flight": self.cancelled_in_flight,
+            "misprediction_rate": self.mispredicted / resolved if resolved else 0.0,
+            "wasted_tokens": self.wasted_tokens,
+        }
+
+speculation_stats = SpeculationStats()
@@ -0,0 +1,30 @@
+import asyncio
+import sqlite3
+from typing import Any, Callable, TypeVar
+from .. import config
+
+T = TypeVar("T")
+
+def connect_sqlite(path: str) -> sqlite3.Connection:
+    """
+    Open a SQLite database shared by the worker processes of a host.
+
+    The connection is in autocommit mode with WAL journaling. Writers wait at
+    most SQLITE_BUSY_TIMEOUT_SECONDS for another process's lock before failing
+    with "database is locked".
+    """
+    conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None, timeout=config.SQLITE_BUSY_TIMEOUT_SECONDS)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+async def call_store(store: Any, func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    Call `func`, a blocking operation on `store`, from the event loop.
+
+    Stores with `blocking = True` (the SQLite ones) are called in a worker
+    thread so waiting for a database lock never stalls the event loop;
+    in-memory stores are called directly.
+    """
+    if getattr(store, "blocking", False):
+        return await asyncio.to_thread(func, *args, **kwargs)
+    return func(*args, **kwargs)
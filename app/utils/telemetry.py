@@ -0,0 +1,396 @@
+import functools
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+from .. import config
+
+try:
+    from opentelemetry import trace as otel_trace
+except ImportError:
+    otel_trace = None
+
+# Seconds; covers a fast local step up to a slow LLM call
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+BYTES_BUCKETS = (10_000, 100_000, 500_000, 1_000_000, 5_000_000, 10_000_000, 50_000_000)
+PAGES_BUCKETS = (1, 2, 5, 10, 20, 50, 100)
+CHARS_BUCKETS = (1_000, 5_000, 10_000, 32_000, 100_000, 500_000)
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+def _label_key(labels: Dict[str, Any]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+def _format_labels(labels: LabelKey) -> str:
+    if not labels:
+        return ""
+    escaped = (
+        key + '="' + value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") + '"'
+        for key, value in labels
+    )
+    return "{" + ",".join(escaped) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+class Counter:
+    """Monotonic counter with optional labels."""
+
+    kind = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[LabelKey, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels: Any) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels: Any) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            values = list(self._values.items())
+        for labels, value in values:
+            yield self.name, labels, value
+
+class Histogram:
+    """Histogram with fixed cumulative buckets and optional labels."""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(buckets)
+        # Per label set: bucket counts (the last one is +Inf), sum and count
+        self._values: Dict[LabelKey, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: Any) -> None:
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            values = self._values.get(key)
+            if values is None:
+                values = self._values[key] = [0.0] * (len(self.buckets) + 3)
+            values[index] += 1
+            values[-2] += value
+            values[-1] += 1
+
+    def count(self, **labels: Any) -> int:
+        values = self._values.get(_label_key(labels))
+        return int(values[-1]) if values else 0
+
+    def samples(self) -> Iterator[Tuple[str, LabelKey, float]]:
+        with self._lock:
+            values = [(labels, list(counts)) for labels, counts in self._values.items()]
+        for labels, counts in values:
+            cumulative = 0.0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                yield f"{self.name}_bucket", labels + (("le", _format_value(bound)),), cumulative
+            yield f"{self.name}_sum", labels, counts[-2]
+            yield f"{self.name}_count", labels, counts[-1]
+
+# A collector returns (name, kind, help, [(labels, value)]) for metrics read at scrape time
+Collector = Callable[[], List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]]
+
+class MetricsRegistry:
+    """In-process metrics registry rendered in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, Any] = {}
+        self._collectors: List[Collector] = []
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        if name not in self._metrics:
+            self._metrics[name] = Counter(name, help_text)
+        return self._metrics[name]
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DURATION_BUCKETS) -> Histogram:
+        if name not in self._metrics:
+            self._metrics[name] = Histogram(name, help_text, buckets)
+        return self._metrics[name]
+
+    def register_collector(self, collector: Collector) -> None:
+        """Register a function reporting metrics computed from existing statistics at scrape time."""
+        self._collectors.append(collector)
+
+    def render(self) -> str:
+        lines = []
+        for metric in self._metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            for name, labels, value in metric.samples():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+        for collector in self._collectors:
+            try:
+                collected = collector()
+            except Exception as e:
+                print(f"Error collecting metrics: {str(e)}")
+                continue
+            for name, kind, help_text, samples in collected:
+                lines.append(f"# HELP {name} {help_text}")
+                lines.append(f"# TYPE {name} {kind}")
+                for labels, value in samples:
+                    lines.append(f"{name}{_format_labels(_label_key(labels))} {_format_value(value)}")
+        return "\n".join(lines) + "\n"
+
+metrics = MetricsRegistry()
+
+SPAN_DURATION = metrics.histogram(
+    "healthpay_span_duration_seconds", "Duration of traced operations: workflow nodes, claims and LLM calls"
+)
+LLM_TOKENS = metrics.counter("healthpay_llm_tokens_total", "Tokens reported by the LLM providers")
+DOCUMENT_BYTES = metrics.histogram("healthpay_document_bytes", "Size of uploaded PDF documents", BYTES_BUCKETS)
+DOCUMENT_PAGES = metrics.histogram("healthpay_document_pages", "Pages read from each PDF document", PAGES_BUCKETS)
+DOCUMENT_CHARS = metrics.histogram("healthpay_document_chars", "Characters of text sent on for extraction", CHARS_BUCKETS)
+CLAIMS = metrics.counter("healthpay_claims_total", "Processed claims by decision")
+REJECTED_REQUESTS = metrics.counter(
+    "healthpay_rejected_requests_total", "Requests refused before processing, by reason (overloaded or too_large)"
+)
+EXTRACTION_CHUNKS = metrics.counter(
+    "healthpay_extraction_chunks_total", "Chunks of long documents, by whether they were sent to extraction"
+)
+
+class Span:
+    """A traced operation; forwards attributes and events to an OpenTelemetry span if there is one."""
+
+    __slots__ = ("name", "attributes", "events", "_otel_span")
+
+    def __init__(self, name: str, attributes: Optional[Dict[str, Any]] = None, otel_span: Any = None):
+        self.name = name
+        self.attributes = dict(attributes or {})
+        self.events: List[str] = []
+        self._otel_span = otel_span
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+        if self._otel_span is not None:
+            self._otel_span.set_attribute(key, value)
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        self.events.append(name)
+        if self._otel_span is not None:
+            self._otel_span.add_event(name, attributes or {})
+
+class _NoopSpan(Span):
+    """Span handed out while telemetry is disabled; records nothing."""
+
+    __slots__ = ()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        pass
+
+    def add_event(self, name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+        pass
+
+_NOOP_SPAN = _NoopSpan("noop")
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+@contextmanager
+def trace_span(name: str, attributes: Optional[Dict[str, Any]] = None) -> Iterator[Span]:
+    """
+    Trace an operation: time it into healthpay_span_duration_seconds and, when
+    the OpenTelemetry API is installed, emit it as an OpenTelemetry span.
+
+    Without a configured OpenTelemetry SDK the spans are no-ops, so tracing can
+    stay on; TELEMETRY_ENABLED=false turns all of it off.
+    """
+    if not config.TELEMETRY_ENABLED:
+        yield _NOOP_SPAN
+        return
+
+    with ExitStack() as stack:
+        otel_span = None
+        if otel_trace is not None:
+            otel_span = stack.enter_context(
+                otel_trace.get_tracer("healthpay").start_as_current_span(name, attributes=attributes)
+            )
+        span = Span(name, attributes, otel_span)
+        token = _current_span.set(span)
+        started = time.perf_counter()
+        status = "ok"
+        try:
+            yield span
+        except BaseException:
+            status = "error"
+            raise
+        finally:
+            SPAN_DURATION.observe(time.perf_counter() - started, span=name, status=status)
+            _current_span.reset(token)
+
+def traced(name: str) -> Callable:
+    """Decorator tracing every call of an async function as a span."""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with trace_span(name):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+def current_span() -> Span:
+    """Return the innermost active span, or a no-op span outside of one."""
+    return _current_span.get() or _NOOP_SPAN
+
+def add_span_event(name: str, attributes: Optional[Dict[str, Any]] = None) -> None:
+    """Record an event, such as a retry, on the innermost active span."""
+    span = _current_span.get()
+    if span is not None:
+        span.add_event(name, attributes)
+
+# Tally of the tokens used by LLM calls in the current context, set by track_llm_tokens
+_token_tally: ContextVar[Optional[Dict[str, int]]] = ContextVar("token_tally", default=None)
+
+@contextmanager
+def track_llm_tokens(tally: Dict[str, int]) -> Iterator[Dict[str, int]]:
+    """Add the input and output tokens of the LLM calls made inside the block, and in tasks it starts, to `tally`."""
+    token = _token_tally.set(tally)
+    try:
+        yield tally
+    finally:
+        _token_tally.reset(token)
+
+@contextmanager
+def track_llm_call(prompt_tokens: int) -> Iterator[None]:
+    """Count the estimated prompt tokens of an LLM call under `pending` in the current tally while it runs."""
+    tally = _token_tally.get()
+    if tally is None:
+        yield
+        return
+    tally["pending"] = tally.get("pending", 0) + prompt_tokens
+    try:
+        yield
+    finally:
+        tally["pending"] -= prompt_tokens
+
+def record_llm_usage(span: Span, provider: str, input_tokens: int, output_tokens: int) -> None:
+    """Record the token usage of an LLM call on its span and in the token counters."""
+    span.set_attribute("llm.input_tokens", input_tokens)
+    span.set_attribute("llm.output_tokens", output_tokens)
+    tally = _token_tally.get()
+    if tally is not None:
+        tally["input"] = tally.get("input", 0) + input_tokens
+        tally["output"] = tally.get("output", 0) + output_tokens
+    if config.TELEMETRY_ENABLED:
+        LLM_TOKENS.inc(input_tokens, provider=provider, direction="input")
+        LLM_TOKENS.inc(output_tokens, provider=provider, direction="output")
+
+def record_claim(status: str) -> None:
+    """Count a processed claim by its decision."""
+    if config.TELEMETRY_ENABLED:
+        CLAIMS.inc(status=status)
+
+def record_rejected_request(reason: str) -> None:
+    """Count a request refused by load shedding or the body size limit."""
+    if config.TELEMETRY_ENABLED:
+        REJECTED_REQUESTS.inc(reason=reason)
+
+def record_extraction_chunks(total: int, selected: int) -> None:
+    """Count the chunks of a long document sent to extraction and the ones skipped."""
+    if config.TELEMETRY_ENABLED:
+        EXTRACTION_CHUNKS.inc(selected, selection="sent")
+        EXTRACTION_CHUNKS.inc(total - selected, selection="skipped")
+
+def record_document(size_bytes: int, pages: int, chars: int) -> None:
+    """Record the size of an extracted document."""
+    if config.TELEMETRY_ENABLED:
+        DOCUMENT_BYTES.observe(size_bytes)
+        DOCUMENT_PAGES.observe(pages)
+        DOCUMENT_CHARS.observe(chars)
+
+def collect_runtime_stats() -> List[Tuple[str, str, str, List[Tuple[Dict[str, Any], float]]]]:
+    """Expose the cache, classification, speculation, near-duplicate, LLM call and connection pool statistics as metrics."""
+    from .cache import get_cache
+    from .heuristic_classifier import classification_stats
+    from .http_pool import get_pool_stats
+    from .near_duplicates import get_near_duplicate_index
+    from .speculation import speculation_stats
+    from .resilience import get_llm_stats
+
+    cache_stats = get_cache().get_stats()
+    llm_stats = get_llm_stats()
+    classification = classification_stats.get_stats()
+
+    result = [
+        ("healthpay_cache_hits_total", "counter", "LLM result cache hits",
+         [({"namespace": namespace}, stats["hits"]) for namespace, stats in cache_stats.items()]),
+        ("healthpay_cache_misses_total", "counter", "LLM result cache misses",
+         [({"namespace": namespace}, stats["misses"]) for namespace, stats in cache_stats.items()]),
+        ("healthpay_classification_total", "counter", "Documents classified, by where they were resolved",
+         [({"resolver": "local"}, classification["resolved_locally"]),
+          ({"resolver": "llm"}, classification["sent_to_llm"])]),
+    ]
+    for stat, help_text in (
+        ("calls", "LLM calls through the shared call layer"),
+        ("retries", "Retried LLM requests"),
+        ("failures", "LLM calls that failed after retries"),
+        ("hedges", "Hedged LLM requests sent"),
+        ("circuit_rejections", "LLM calls refused by an open circuit breaker"),
+    ):
+        result.append((
+            f"healthpay_llm_{stat}_total", "counter", help_text,
+            [({"provider": provider}, stats[stat]) for provider, stats in llm_stats.items()]
+        ))
+    result.append((
+        "healthpay_llm_circuit_open", "gauge", "Whether a provider's circuit breaker is open",
+        [({"provider": provider}, 1 if stats["circuit_state"] == "open" else 0) for provider, stats in llm_stats.items()]
+    ))
+
+    speculation = speculation_stats.get_stats()
+    result.append((
+        "healthpay_speculative_extractions_total", "counter",
+        "Extractions started on the local classifier's guess, by whether the LLM classification agreed",
+        [({"outcome": "committed"}, speculation["committed"]), ({"outcome": "mispredicted"}, speculation["mispredicted"])]
+    ))
+    result.append((
+        "healthpay_speculative_wasted_tokens_total", "counter",
+        "Tokens spent on speculative extractions that were discarded", [({}, speculation["wasted_tokens"])]
+    ))
+
+    near_duplicates = get_near_duplicate_index().get_stats()
+    result.append((
+        "healthpay_near_duplicate_lookups_total", "counter", "Documents looked up in the near-duplicate index",
+        [({}, near_duplicates["lookups"])]
+    ))
+    result.append((
+        "healthpay_near_duplicate_reuse_total", "counter",
+        "Results of near-duplicate documents reused, by what they replaced or guided",
+        [({"use": "classification"}, near_duplicates["classifications_reused"]),
+         ({"use": "extraction_example"}, near_duplicates["extractions_hinted"]),
+         ({"use": "template"}, near_duplicates["extractions_from_template"])]
+    ))
+    result.append((
+        "healthpay_near_duplicate_entries", "gauge", "Documents held in the near-duplicate index",
+        [({}, near_duplicates["entries"])]
+    ))
+
+    pool_stats = get_pool_stats()
+    for stat, kind, help_text in (
+        ("requests", "counter", "HTTP requests sent through the provider's connection pool"),
+        ("in_flight", "gauge", "HTTP requests holding or waiting for a pooled connection"),
+        ("utilization", "gauge", "Requests in flight as a fraction of the pool's maximum connections"),
+        ("open_connections", "gauge", "Open connections in the provider's pool"),
+        ("idle_connections", "gauge", "Idle keep-alive connections in the provider's pool"),
+        ("connections_opened", "counter", "TCP connections opened by the provider's pool"),
+        ("tls_handshakes", "counter", "TLS handshakes made by the provider's pool"),
+    ):
+        name = f"healthpay_llm_http_{stat}" + ("_total" if kind == "counter" else "")
+        result.append((name, kind, help_text, [({"provider": provider}, stats[stat]) for provider, stats in pool_stats.items()]))
+    return result
+
+metrics.register_collector(collect_runtime_stats)
+
+def render_metrics() -> str:
+    """Return all metrics in the Prometheus text exposition format."""
+    return metrics.render()
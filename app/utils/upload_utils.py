@@ -0,0 +1,61 @@
+import os
+import tempfile
+from typing import BinaryIO, List, Optional
+from fastapi import UploadFile
+from fastapi.concurrency import run_in_threadpool
+from .. import config
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limits."""
+    pass
+
+async def spool_upload(upload: UploadFile, max_bytes: Optional[int] = None) -> BinaryIO:
+    """
+    Copy an upload to a temporary file on disk in fixed-size chunks.
+
+    The returned file carries the original `filename` attribute. Raises
+    UploadTooLargeError as soon as more than `max_bytes` have been read.
+    Disk writes run in the thread pool so they do not block the event loop.
+    """
+    max_bytes = config.MAX_UPLOAD_BYTES if max_bytes is None else max_bytes
+    spooled = await run_in_threadpool(tempfile.NamedTemporaryFile, prefix="healthpay-", suffix=".pdf", delete=False)
+    spooled.filename = upload.filename
+    size = 0
+    try:
+        while True:
+            chunk = await upload.read(config.UPLOAD_CHUNK_BYTES)
+            if not chunk:
+                break
+            size += len(chunk)
+            if size > max_bytes:
+                raise UploadTooLargeError(f"File {upload.filename} exceeds the {max_bytes} byte upload limit")
+            await run_in_threadpool(spooled.write, chunk)
+        await run_in_threadpool(spooled.flush)
+        spooled.seek(0)
+        return spooled
+    except BaseException:
+        close_spooled_files([spooled])
+        raise
+
+async def spool_uploads(uploads: List[UploadFile]) -> List[BinaryIO]:
+    """Spool all uploads of a claim, enforcing the per-file and per-claim size limits."""
+    spooled_files = []
+    remaining = config.MAX_CLAIM_UPLOAD_BYTES
+    try:
+        for upload in uploads:
+            spooled = await spool_upload(upload, min(config.MAX_UPLOAD_BYTES, remaining))
+            spooled_files.append(spooled)
+            remaining -= os.fstat(spooled.fileno()).st_size
+    except BaseException:
+        close_spooled_files(spooled_files)
+        raise
+    return spooled_files
+
+def close_spooled_files(files: List[BinaryIO]) -> None:
+    """Close and delete spooled temporary files."""
+    for file in files:
+        try:
+            file.close()
+            os.unlink(file.name)
+        except OSError:
+            pass
@@ -0,0 +1,337 @@
+"""
+End-to-end benchmark of the claim pipeline against the mock LLM provider.
+
+Generates synthetic bill, discharge summary and ID card PDFs and runs them
+through `process_claim` directly and through `POST /process-claim`, reporting
+p50/p95/p99 latency, throughput, peak RSS and the time spent in each stage.
+Results are written as JSON so runs of different commits can be compared.
+
+Run with: python -m benchmarks.bench_claim_pipeline --claims 50 --pages 1,10 --output results.json
+Compare:  python -m benchmarks.bench_claim_pipeline --compare before.json after.json
+"""
+import argparse
+import asyncio
+import functools
+import io
+import json
+import math
+import subprocess
+import sys
+import time
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app import config
+from app.services import ai_service, orchestrator_service
+from app.utils import admission, cache, near_duplicates
+from benchmarks.synthetic_docs import make_claim
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+# Stage name and the module attribute measured for it
+STAGES: List[Tuple[str, Any, str]] = [
+    ("pdf_extraction", orchestrator_service, "process_pdf_files"),
+    ("classification", ai_service, "classify_document"),
+    ("extraction", ai_service, "extract_document"),
+    ("extraction", ai_service, "extract_claim_batch_with_gpt"),
+    ("validation", orchestrator_service, "validate_claim_documents"),
+]
+
+class StageTimer:
+    """Accumulates the time spent in each pipeline stage, summed over all calls."""
+
+    def __init__(self):
+        self.seconds: Dict[str, float] = {}
+        self.calls: Dict[str, int] = {}
+
+    def record(self, stage: str, elapsed: float) -> None:
+        self.seconds[stage] = self.seconds.get(stage, 0.0) + elapsed
+        self.calls[stage] = self.calls.get(stage, 0) + 1
+
+    def wrap(self, stage: str, func: Callable) -> Callable:
+        if asyncio.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def timed_async(*args, **kwargs):
+                started = time.perf_counter()
+                try:
+                    return await func(*args, **kwargs)
+                finally:
+                    self.record(stage, time.perf_counter() - started)
+            return timed_async
+
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.record(stage, time.perf_counter() - started)
+        return timed
+
+    def summary(self, claims: int) -> Dict[str, Dict[str, float]]:
+        return {
+            stage: {
+                "total_ms": round(seconds * 1000, 3),
+                "mean_per_claim_ms": round(seconds * 1000 / max(claims, 1), 3),
+                "calls": self.calls[stage]
+            }
+            for stage, seconds in self.seconds.items()
+        }
+
+@contextmanager
+def instrument_stages(timer: StageTimer):
+    """Temporarily wrap the pipeline stages with timers."""
+    originals = [(module, name, getattr(module, name)) for _, module, name in STAGES]
+    for stage, module, name in STAGES:
+        setattr(module, name, timer.wrap(stage, getattr(module, name)))
+    try:
+        yield timer
+    finally:
+        for module, name, original in originals:
+            setattr(module, name, original)
+
+def percentile(values: List[float], percent: float) -> float:
+    """Nearest-rank percentile of a list of values."""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[max(0, math.ceil(percent / 100 * len(ordered)) - 1)]
+
+def latency_summary(latencies: List[float]) -> Dict[str, float]:
+    milliseconds = [latency * 1000 for latency in latencies]
+    return {
+        "p50": round(percentile(milliseconds, 50), 3),
+        "p95": round(percentile(milliseconds, 95), 3),
+        "p99": round(percentile(milliseconds, 99), 3),
+        "mean": round(sum(milliseconds) / len(milliseconds), 3) if milliseconds else 0.0,
+        "max": round(max(milliseconds), 3) if milliseconds else 0.0
+    }
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """
+    Peak resident set size of this process and of its largest exited child.
+
+    Children only count once they have exited, so PDF workers are included
+    after the executor has been shut down.
+    """
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale, 1),
+        "children": round(resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale, 1)
+    }
+
+def named_file(filename: str, data: bytes) -> io.BytesIO:
+    file_obj = io.BytesIO(data)
+    file_obj.filename = filename
+    return file_obj
+
+async def run_direct(claims: List[List[Tuple[str, bytes]]], concurrency: int) -> Tuple[List[float], List[str]]:
+    """Run claims through process_claim; return latencies and claim decisions."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run_one(documents):
+        async with semaphore:
+            files = [named_file(filename, data) for filename, data in documents]
+            started = time.perf_counter()
+            try:
+                result = await orchestrator_service.process_claim(files)
+                status = result.claim_decision.status
+            except Exception as e:
+                print(f"Claim failed: {str(e)}")
+                status = "error"
+            return time.perf_counter() - started, status
+
+    outcomes = await asyncio.gather(*(run_one(documents) for documents in claims))
+    return [latency for latency, _ in outcomes], [status for _, status in outcomes]
+
+async def run_api(claims: List[List[Tuple[str, bytes]]], concurrency: int) -> Tuple[List[float], List[str]]:
+    """Run claims through POST /process-claim in-process; return latencies and claim decisions."""
+    import httpx
+    from app.main import app
+
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://benchmark", timeout=None) as client:
+        async def run_one(documents):
+            async with semaphore:
+                files = [("files", (filename, data, "application/pdf")) for filename, data in documents]
+                started = time.perf_counter()
+                response = await client.post("/process-claim", files=files)
+                elapsed = time.perf_counter() - started
+                if response.status_code == 503:
+                    # Refused by load shedding at the in-flight claim limit
+                    return elapsed, "shed"
+                if response.status_code != 200:
+                    print(f"Claim failed with HTTP {response.status_code}")
+                    return elapsed, "error"
+                return elapsed, response.json()["claim_decision"]["status"]
+
+        outcomes = await asyncio.gather(*(run_one(documents) for documents in claims))
+    return [latency for latency, _ in outcomes], [status for _, status in outcomes]
+
+RUNNERS = {"direct": run_direct, "api": run_api}
+
+async def run_benchmark(mode: str, pages: int, claim_count: int, concurrency: int, warmup: int, seed: int) -> Dict[str, Any]:
+    """Benchmark one mode and page count and return its JSON-ready results."""
+    runner = RUNNERS[mode]
+    claims = [make_claim(pages, claim_number, seed) for claim_number in range(claim_count)]
+    document_bytes = sum(len(data) for documents in claims for _, data in documents)
+    if warmup:
+        await runner([make_claim(pages, -1 - number, seed) for number in range(warmup)], concurrency)
+
+    timer = StageTimer()
+    with instrument_stages(timer):
+        started = time.perf_counter()
+        latencies, statuses = await runner(claims, concurrency)
+        elapsed = time.perf_counter() - started
+
+    return {
+        "mode": mode,
+        "pages": pages,
+        "claims": claim_count,
+        "concurrency": concurrency,
+        "document_mb": round(document_bytes / (1024 * 1024), 3),
+        "approved": statuses.count("approved"),
+        "errors": statuses.count("error"),
+        "shed": statuses.count("shed"),
+        "wall_seconds": round(elapsed, 3),
+        "throughput_claims_per_second": round(claim_count / elapsed, 3) if elapsed else 0.0,
+        # Latency of the claims that were processed; shed claims are refused at once
+        "latency_ms": latency_summary([latency for latency, status in zip(latencies, statuses) if status != "shed"]),
+        "stages": timer.summary(claim_count),
+        "peak_rss_mb": peak_rss_mb()["self"]
+    }
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def configure(args: argparse.Namespace) -> None:
+    """Point the pipeline at the mock LLM provider."""
+    config.LLM_PROVIDER = "mock"
+    config.MOCK_LLM_LATENCY_MS = args.mock_latency_ms
+    config.MOCK_LLM_LATENCY_DISTRIBUTION = args.mock_distribution
+    config.MOCK_LLM_ERROR_RATE = args.mock_error_rate
+    config.MOCK_LLM_SEED = args.seed
+    config.CACHE_BACKEND = args.cache
+    config.CLAIM_INDEX = args.claim_index
+    config.NEAR_DUPLICATE_INDEX = args.near_duplicates
+    config.MAX_INFLIGHT_CLAIMS = args.max_inflight
+    admission.reset_inflight_limiter()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+async def run_all(args: argparse.Namespace) -> Dict[str, Any]:
+    from app.providers.registry import close_providers
+    from app.utils.pdf_utils import get_pdf_executor, shutdown_pdf_executor
+
+    runs = []
+    try:
+        for mode in args.modes.split(","):
+            for pages in [int(value) for value in args.pages.split(",")]:
+                result = await run_benchmark(mode, pages, args.claims, args.concurrency, args.warmup, args.seed)
+                latency = result["latency_ms"]
+                print(
+                    f"{mode:>6} pages={pages:<3} p50={latency['p50']:8.1f}ms p95={latency['p95']:8.1f}ms "
+                    f"p99={latency['p99']:8.1f}ms {result['throughput_claims_per_second']:7.2f} claims/s "
+                    f"approved={result['approved']}/{result['claims']} shed={result['shed']}",
+                    file=sys.stderr
+                )
+                runs.append(result)
+    finally:
+        await close_providers()
+        # Wait for the PDF workers to exit so their peak memory is reported
+        get_pdf_executor().shutdown(wait=True)
+        shutdown_pdf_executor()
+
+    return {
+        "benchmark": "claim_pipeline",
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+        "settings": {
+            "claims": args.claims,
+            "concurrency": args.concurrency,
+            "mock_latency_ms": args.mock_latency_ms,
+            "mock_distribution": args.mock_distribution,
+            "mock_error_rate": args.mock_error_rate,
+            "cache": args.cache,
+            "pdf_executor": config.PDF_EXECUTOR,
+            "batch_extraction": config.BATCH_EXTRACTION,
+            "near_duplicates": args.near_duplicates,
+            "seed": args.seed
+        },
+        "peak_rss_mb": peak_rss_mb(),
+        "near_duplicates": near_duplicates.get_near_duplicate_index().get_stats(),
+        "runs": runs
+    }
+
+def compare(before_path: str, after_path: str) -> None:
+    """Print the relative change of latency and throughput between two result files."""
+    with open(before_path, "r", encoding="utf-8") as before_file, open(after_path, "r", encoding="utf-8") as after_file:
+        before, after = json.load(before_file), json.load(after_file)
+    before_runs = {(run["mode"], run["pages"]): run for run in before["runs"]}
+
+    print(f"{before.get('commit')} -> {after.get('commit')}")
+    for run in after["runs"]:
+        baseline = before_runs.get((run["mode"], run["pages"]))
+        if baseline is None:
+            continue
+        changes = []
+        for key in ("p50", "p95", "p99"):
+            old, new = baseline["latency_ms"][key], run["latency_ms"][key]
+            changes.append(f"{key} {(new - old) / old * 100 if old else 0:+6.1f}%")
+        old, new = baseline["throughput_claims_per_second"], run["throughput_claims_per_second"]
+        changes.append(f"throughput {(new - old) / old * 100 if old else 0:+6.1f}%")
+        print(f"{run['mode']:>6} pages={run['pages']:<3} " + "  ".join(changes))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=20, help="Claims per mode and page count")
+    parser.add_argument("--concurrency", type=int, default=4, help="Claims processed at the same time")
+    parser.add_argument("--pages", default="1,10", help="Comma-separated page counts of bills and discharge summaries")
+    parser.add_argument("--modes", default="direct,api", help="Comma-separated modes: direct, api")
+    parser.add_argument("--warmup", type=int, default=2, help="Unmeasured claims run first, e.g. to start PDF workers")
+    parser.add_argument("--mock-latency-ms", type=float, default=200.0)
+    parser.add_argument("--mock-distribution", default="lognormal")
+    parser.add_argument("--mock-error-rate", type=float, default=0.0)
+    parser.add_argument("--cache", default="none", help="LLM result cache backend during the run")
+    parser.add_argument(
+        "--claim-index", default="none",
+        help="Claim index backend during the run; the synthetic claims repeat one bill, so any index flags them"
+    )
+    parser.add_argument(
+        "--max-inflight", type=int, default=config.MAX_INFLIGHT_CLAIMS,
+        help="In-flight claim limit of the API; run with a higher --concurrency to measure load shedding"
+    )
+    parser.add_argument(
+        "--near-duplicates", action="store_true",
+        help="Reuse classifications and extractions of near-duplicate documents; the synthetic documents share templates"
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--output", help="Write the JSON results to this file instead of stdout")
+    parser.add_argument("--compare", nargs=2, metavar=("BEFORE", "AFTER"), help="Compare two result files and exit")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare)
+        return
+
+    configure(args)
+    results = asyncio.run(run_all(args))
+    output = json.dumps(results, indent=2)
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as output_file:
+            output_file.write(output + "\n")
+    else:
+        print(output)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,117 @@
+"""
+Cold start benchmark: import time of the application and time to the first served claim.
+
+Import time is measured in fresh interpreters, for `app.main` alone and with the
+LLM SDKs, langgraph and pypdf imported as well, which is what importing the
+application used to load. Time to first request starts a uvicorn server against
+the mock LLM provider, with and without startup warm-up, and measures the time
+until `GET /ready` succeeds and until the first `POST /process-claim` returns.
+
+Run with: python -m benchmarks.bench_cold_start --runs 5
+"""
+import argparse
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+
+from benchmarks.synthetic_docs import make_claim
+
+# What importing app.main loaded before the SDKs, langgraph and pypdf were imported lazily; missing ones are skipped
+EAGER_IMPORTS = ("langgraph.graph", "openai", "google.generativeai", "pypdf")
+
+def measure_import(extra_imports: Tuple[str, ...], runs: int) -> float:
+    """Return the median time in seconds to import app.main (plus `extra_imports`) in a fresh interpreter."""
+    code = (
+        "import importlib, time\n"
+        "started = time.perf_counter()\n"
+        "import app.main\n"
+        f"for module in {extra_imports!r}:\n"
+        "    try:\n"
+        "        importlib.import_module(module)\n"
+        "    except ImportError:\n"
+        "        pass\n"
+        "print(time.perf_counter() - started)\n"
+    )
+    timings = []
+    for _ in range(runs):
+        output = subprocess.run([sys.executable, "-W", "ignore", "-c", code], capture_output=True, text=True, check=True)
+        timings.append(float(output.stdout.strip().splitlines()[-1]))
+    return statistics.median(timings)
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def measure_first_request(warm_up: bool, timeout: float = 60.0) -> Dict[str, float]:
+    """Start a server and return the seconds until it is ready and until its first claim is answered."""
+    port = free_port()
+    env = dict(
+        os.environ,
+        LLM_PROVIDER="mock",
+        MOCK_LLM_LATENCY_DISTRIBUTION="fixed",
+        MOCK_LLM_LATENCY_MS="50",
+        CACHE_BACKEND="none",
+        CLAIM_INDEX="none",
+        WARM_UP_ON_STARTUP="true" if warm_up else "false",
+    )
+    files = [("files", (filename, data, "application/pdf")) for filename, data in make_claim(pages=1)]
+    started = time.perf_counter()
+    server = subprocess.Popen(
+        [sys.executable, "-W", "ignore", "-m", "uvicorn", "app.main:app", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        with httpx.Client(base_url=f"http://127.0.0.1:{port}", timeout=timeout) as client:
+            while True:
+                if time.perf_counter() - started > timeout:
+                    raise TimeoutError("Server did not become ready")
+                try:
+                    if client.get("/ready").status_code == 200:
+                        break
+                except httpx.TransportError:
+                    pass
+                time.sleep(0.01)
+            ready = time.perf_counter() - started
+
+            request_started = time.perf_counter()
+            response = client.post("/process-claim", files=files)
+            response.raise_for_status()
+            finished = time.perf_counter()
+    finally:
+        server.terminate()
+        server.wait()
+    return {
+        "time_to_ready": ready,
+        "first_request": finished - request_started,
+        "time_to_first_response": finished - started,
+    }
+
+def median_of(results: List[Dict[str, float]]) -> Dict[str, float]:
+    return {key: round(statistics.median(result[key] for result in results), 4) for key in results[0]}
+
+def run(runs: int) -> Dict[str, Dict[str, float]]:
+    return {
+        "import": {
+            "app_main": round(measure_import((), runs), 4),
+            "app_main_with_eager_sdks": round(measure_import(EAGER_IMPORTS, runs), 4),
+        },
+        "warm_up": median_of([measure_first_request(True) for _ in range(runs)]),
+        "no_warm_up": median_of([measure_first_request(False) for _ in range(runs)]),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--runs", type=int, default=5, help="Fresh processes per measurement; medians are reported")
+    args = parser.parse_args()
+    print(json.dumps(run(args.runs), indent=2))
+
+if __name__ == "__main__":
+    main()
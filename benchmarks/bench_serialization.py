@@ -0,0 +1,92 @@
+"""
+Microbenchmark of serializing claim results.
+
+Compares the previous path, where results were passed around as dicts and
+validated against ClaimProcessingResult before being dumped (what FastAPI's
+response_model did), with dumping results that were already built as models,
+one at a time with `model_dump_json` and as one batch through a TypeAdapter.
+
+Run with: python -m benchmarks.bench_serialization --claims 1000 --documents 3
+"""
+import argparse
+import json
+import time
+from typing import Any, Callable, Dict, List
+
+from pydantic import TypeAdapter
+
+from app.models.normalization import build_documents
+from app.models.schemas import ClaimDecision, ClaimProcessingResult, ValidationResult
+
+CLAIM_RESULTS = TypeAdapter(List[ClaimProcessingResult])
+
+def make_structured_documents(documents: int, seed: int) -> List[Dict[str, Any]]:
+    """Return `documents` structured documents, cycling through the built-in types."""
+    templates = [
+        {"type": "bill", "hospital_name": f"Hospital {seed}", "total_amount": 1250.0 + seed,
+         "date_of_service": "2024-03-10"},
+        {"type": "discharge_summary", "patient_name": "Jane Doe", "diagnosis": "Community-acquired pneumonia",
+         "admission_date": "2024-03-05", "discharge_date": "2024-03-10"},
+        {"type": "id_card", "patient_name": "Jane Doe", "insurance_id": f"MOCK-{seed:06d}", "plan_name": "Gold PPO",
+         "expiration_date": "2099-12-31"},
+    ]
+    return [dict(templates[index % len(templates)]) for index in range(documents)]
+
+def make_results(claims: int, documents: int) -> List[ClaimProcessingResult]:
+    """Build claim results as models, the way the workflow graph does."""
+    return [
+        ClaimProcessingResult.model_construct(
+            documents=build_documents(make_structured_documents(documents, seed)),
+            validation=ValidationResult(),
+            claim_decision=ClaimDecision(status="approved", reason="All required documents present and data is consistent")
+        )
+        for seed in range(claims)
+    ]
+
+def serialize_revalidated(results: List[Dict[str, Any]]) -> List[str]:
+    """Previous path: validate each dict result against the response model, dump it, then encode it."""
+    return [
+        json.dumps(ClaimProcessingResult.model_validate(result).model_dump(mode="json"))
+        for result in results
+    ]
+
+def serialize_models(results: List[ClaimProcessingResult]) -> List[bytes]:
+    """Current path: dump each prebuilt model straight to JSON."""
+    return [result.model_dump_json() for result in results]
+
+def serialize_batch(results: List[ClaimProcessingResult]) -> bytes:
+    """Dump a whole batch of prebuilt models as one JSON array."""
+    return CLAIM_RESULTS.dump_json(results)
+
+def measure(func: Callable[[], Any], iterations: int) -> float:
+    """Return the mean time per call in milliseconds."""
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e3
+
+def run(claims: int, documents: int, iterations: int) -> Dict[str, float]:
+    """Return the mean time in milliseconds of each serialization path for one batch of results."""
+    results = make_results(claims, documents)
+    dict_results = [result.model_dump(mode="json") for result in results]
+    return {
+        "revalidated": measure(lambda: serialize_revalidated(dict_results), iterations),
+        "model_dump_json": measure(lambda: serialize_models(results), iterations),
+        "type_adapter_batch": measure(lambda: serialize_batch(results), iterations),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=1000, help="Claim results in the batch")
+    parser.add_argument("--documents", type=int, default=3, help="Documents per claim")
+    parser.add_argument("--iterations", type=int, default=20)
+    args = parser.parse_args()
+
+    timings = run(args.claims, args.documents, args.iterations)
+    for name, elapsed in timings.items():
+        print(f"{name:<20} {elapsed:10.2f} ms/batch {elapsed / args.claims * 1e3:8.1f} us/claim")
+    print(f"speedup of model_dump_json: {timings['revalidated'] / timings['model_dump_json']:.1f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Microbenchmark of the per-claim setup overhead of the workflow.
+
+Compares rebuilding the LangGraph workflow and all agents for every claim
+(the previous behaviour) with reusing the compiled graph and the agent registry.
+
+Run with: python -m benchmarks.bench_setup_overhead
+"""
+import argparse
+import time
+
+from app.agents.bill_agent import BillAgent
+from app.agents.discharge_agent import DischargeAgent
+from app.agents.id_card_agent import IdCardAgent
+from app.agents.registry import get_agent
+from app.services.orchestrator_service import create_workflow_graph, get_workflow_graph
+
+DOCUMENT_TYPES = ["bill", "discharge_summary", "id_card"]
+
+def setup_per_request():
+    """Previous behaviour: compile the graph and build every agent for each document."""
+    graph = create_workflow_graph()
+    for doc_type in DOCUMENT_TYPES:
+        agents = {
+            "bill": BillAgent(),
+            "discharge_summary": DischargeAgent(),
+            "id_card": IdCardAgent()
+        }
+        agents.get(doc_type)
+    return graph
+
+def setup_shared():
+    """Current behaviour: reuse the compiled graph and the registered agents."""
+    graph = get_workflow_graph()
+    for doc_type in DOCUMENT_TYPES:
+        get_agent(doc_type)
+    return graph
+
+def measure(func, iterations: int) -> float:
+    """Return the mean time per call in microseconds."""
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--iterations", type=int, default=200)
+    args = parser.parse_args()
+
+    before = measure(setup_per_request, args.iterations)
+    after = measure(setup_shared, args.iterations)
+
+    print(f"per-request setup (rebuild graph and agents): {before:10.1f} us/claim")
+    print(f"per-request setup (shared graph and agents):  {after:10.1f} us/claim")
+    print(f"speedup: {before / after:.0f}x")
+
+if __name__ == "__main__":
+    main()
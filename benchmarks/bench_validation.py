@@ -0,0 +1,64 @@
+"""
+Microbenchmark of claim validation with the compiled rules engine.
+
+Compares validating claims one at a time, the way each claim is validated when
+it finishes processing, with validating the whole batch in one pass of the
+rules. Documents carry no recorded `validation_issues`, so both paths apply
+the document rules as well as the cross-document rules.
+
+Run with: python -m benchmarks.bench_validation --claims 10000
+"""
+import argparse
+import time
+from typing import Any, Callable, Dict, List
+
+from benchmarks.bench_serialization import make_structured_documents
+from app.services.rules_engine import get_rules_engine
+
+def make_claims(claims: int) -> List[List[Dict[str, Any]]]:
+    """Return `claims` claims of a bill, a discharge summary and an ID card; every tenth has an expired ID card."""
+    batch = []
+    for seed in range(claims):
+        documents = make_structured_documents(3, seed)
+        if seed % 10 == 0:
+            documents[2]["expiration_date"] = "2020-01-01"
+        batch.append(documents)
+    return batch
+
+def validate_per_claim(claims: List[List[Dict[str, Any]]]) -> list:
+    engine = get_rules_engine()
+    return [engine.validate_claims([documents])[0] for documents in claims]
+
+def validate_batch(claims: List[List[Dict[str, Any]]]) -> list:
+    return get_rules_engine().validate_claims(claims)
+
+def measure(func: Callable[[], Any], iterations: int) -> float:
+    """Return the mean time per call in milliseconds."""
+    func()
+    started = time.perf_counter()
+    for _ in range(iterations):
+        func()
+    return (time.perf_counter() - started) / iterations * 1e3
+
+def run(claims: int, iterations: int) -> Dict[str, float]:
+    """Return the mean time in milliseconds of each validation path for one batch of claims."""
+    batch = make_claims(claims)
+    assert validate_per_claim(batch) == validate_batch(batch)
+    return {
+        "per_claim": measure(lambda: validate_per_claim(batch), iterations),
+        "batch": measure(lambda: validate_batch(batch), iterations),
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--claims", type=int, default=10000, help="Claims in the batch")
+    parser.add_argument("--iterations", type=int, default=10)
+    args = parser.parse_args()
+
+    timings = run(args.claims, args.iterations)
+    for name, elapsed in timings.items():
+        print(f"{name:<12} {elapsed:10.2f} ms/batch {elapsed / args.claims * 1e3:8.1f} us/claim")
+    print(f"speedup of batch: {timings['per_claim'] / timings['batch']:.2f}x")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,126 @@
+"""
+Synthetic claim documents for benchmarks and tests.
+
+Builds small but real text PDFs (one Helvetica text stream per page) for
+bills, discharge summaries and insurance ID cards, with any number of pages.
+The documents of one claim are consistent, so a correct pipeline approves it.
+"""
+import random
+from typing import List, Tuple
+
+LINES_PER_PAGE = 45
+
+PROCEDURES = [
+    "Room and board, semi-private", "Complete blood count", "Chest X-ray, two views",
+    "IV antibiotic administration", "Respiratory therapy session", "Pharmacy, inpatient",
+    "Pulse oximetry monitoring", "Physician consultation", "Sputum culture", "Nebulizer treatment",
+]
+
+NOTES = [
+    "Patient remained afebrile overnight and tolerated oral intake.",
+    "Oxygen saturation stable on room air, lungs with improving crackles.",
+    "Continued IV ceftriaxone and azithromycin as per protocol.",
+    "Ambulating independently, pain well controlled with acetaminophen.",
+    "Repeat chest imaging shows partial resolution of the right lower lobe infiltrate.",
+    "Discussed warning signs and medication schedule with the patient.",
+]
+
+def _escape(text: str) -> str:
+    return text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+
+def make_pdf(pages: List[List[str]]) -> bytes:
+    """Return a PDF with one page per list of text lines."""
+    page_count = len(pages)
+    # Objects: 1 catalog, 2 page tree, 3 font, then a page and its content stream per page
+    page_ids = [4 + 2 * index for index in range(page_count)]
+    objects = [
+        b"<< /Type /Catalog /Pages 2 0 R >>",
+        f"<< /Type /Pages /Kids [{' '.join(f'{page_id} 0 R' for page_id in page_ids)}] /Count {page_count} >>".encode(),
+        b"<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>",
+    ]
+    for page_id, lines in zip(page_ids, pages):
+        stream = "BT /F1 10 Tf 14 TL 50 760 Td " + " ".join(f"({_escape(line)}) Tj T*" for line in lines) + " ET"
+        stream_bytes = stream.encode("latin-1")
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] "
+            f"/Resources << /Font << /F1 3 0 R >> >> /Contents {page_id + 1} 0 R >>".encode()
+        )
+        objects.append(b"<< /Length " + str(len(stream_bytes)).encode() + b" >>\nstream\n" + stream_bytes + b"\nendstream")
+
+    output = bytearray(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(len(output))
+        output += f"{number} 0 obj\n".encode() + body + b"\nendobj\n"
+    xref_offset = len(output)
+    output += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode()
+    for offset in offsets:
+        output += f"{offset:010d} 00000 n \n".encode()
+    output += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref_offset}\n%%EOF\n".encode()
+    return bytes(output)
+
+def _paginate(header: List[str], body: List[str], pages: int) -> List[List[str]]:
+    """Put the header on the first page and spread filler lines over `pages` pages."""
+    result = [list(header)]
+    for line in body:
+        if len(result[-1]) >= LINES_PER_PAGE:
+            if len(result) == pages:
+                break
+            result.append([])
+        result[-1].append(line)
+    while len(result) < pages:
+        result.append(["(continued)"])
+    return result
+
+def make_bill_pdf(pages: int = 1, claim_number: int = 0, seed: int = 0) -> bytes:
+    rng = random.Random(seed * 7919 + claim_number)
+    header = [
+        "MOCK GENERAL HOSPITAL",
+        "INVOICE",
+        f"Invoice number: INV-{claim_number:06d}",
+        "Patient: Jane Doe",
+        "Date of service: 2024-03-10",
+        "Total charges: $1,250.00",
+        "Amount due: $1,250.00",
+        "",
+    ]
+    body = [
+        f"{rng.choice(PROCEDURES)} .......... ${rng.randint(20, 400)}.00"
+        for _ in range(pages * LINES_PER_PAGE)
+    ]
+    return make_pdf(_paginate(header, body, pages))
+
+def make_discharge_pdf(pages: int = 1, claim_number: int = 0, seed: int = 0) -> bytes:
+    rng = random.Random(seed * 7919 + claim_number + 1)
+    header = [
+        "MOCK GENERAL HOSPITAL - DISCHARGE SUMMARY",
+        "Patient name: Jane Doe",
+        f"Medical record number: MRN-{claim_number:06d}",
+        "Date of admission: 2024-03-05",
+        "Date of discharge: 2024-03-10",
+        "Final diagnosis: Community-acquired pneumonia",
+        "Attending physician: Dr. A. Smith",
+        "Hospital course:",
+    ]
+    body = [rng.choice(NOTES) for _ in range(pages * LINES_PER_PAGE)]
+    return make_pdf(_paginate(header, body, pages))
+
+def make_id_card_pdf(pages: int = 1, claim_number: int = 0, seed: int = 0) -> bytes:
+    header = [
+        "ACME HEALTH INSURANCE - MEMBER ID CARD",
+        "Member name: Jane Doe",
+        f"Member ID: MOCK-{claim_number:06d}",
+        "Group number: 7788",
+        "Plan: Gold PPO",
+        "Copay: $20",
+        "Valid through: 2099-12-31",
+    ]
+    return make_pdf(_paginate(header, [], pages))
+
+def make_claim(pages: int = 1, claim_number: int = 0, seed: int = 0) -> List[Tuple[str, bytes]]:
+    """Return the (filename, PDF bytes) documents of one claim; ID cards always have one page."""
+    return [
+        (f"bill_{claim_number}.pdf", make_bill_pdf(pages, claim_number, seed)),
+        (f"discharge_summary_{claim_number}.pdf", make_discharge_pdf(pages, claim_number, seed)),
+        (f"id_card_{claim_number}.pdf", make_id_card_pdf(1, claim_number, seed)),
+    ]
@@ -0,0 +1,125 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from fastapi import FastAPI, File, UploadFile
+from fastapi.testclient import TestClient
+
+from app import config
+from app.main import app
+from app.utils import admission
+from app.utils.admission import BodySizeLimitMiddleware, MemoryInFlightLimiter, SQLiteInFlightLimiter
+from app.utils.resilience import SQLiteTokenBucket
+
+def test_memory_limiter_counts_slots():
+    limiter = MemoryInFlightLimiter(1)
+    token = limiter.try_acquire()
+    assert token is not None
+    assert limiter.try_acquire() is None
+    limiter.release(token)
+    assert limiter.in_flight() == 0
+
+def test_sqlite_limiter_is_shared_and_reclaims_dead_workers(tmp_path):
+    path = str(tmp_path / "inflight.sqlite3")
+    first, second = SQLiteInFlightLimiter(2, path), SQLiteInFlightLimiter(2, path)
+    assert first.try_acquire() is not None
+    assert second.try_acquire() is not None
+    assert first.try_acquire() is None
+
+    # A slot left behind by a worker process that has exited
+    dead = subprocess.Popen([sys.executable, "-c", "pass"])
+    dead.wait()
+    first._conn.execute("DELETE FROM inflight_claims")
+    first._conn.execute(
+        "INSERT INTO inflight_claims VALUES ('stale', ?, 0), ('mine', ?, 0)", (dead.pid, os.getpid())
+    )
+    assert second.try_acquire() is not None
+    assert second.in_flight() == 2
+
+def test_waiting_requests_poll_one_at_a_time():
+    limiter = MemoryInFlightLimiter(1)
+    token = limiter.try_acquire()
+    attempts = []
+    try_acquire = limiter.try_acquire
+
+    def counting_try_acquire():
+        attempts.append(time.monotonic())
+        return try_acquire()
+
+    limiter.try_acquire = counting_try_acquire
+
+    async def run():
+        waiters = [asyncio.ensure_future(admission.acquire_slot(limiter, 0.3)) for _ in range(5)]
+        await asyncio.sleep(0.2)
+        limiter.release(token)
+        return await asyncio.gather(*waiters, return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert sum(isinstance(result, str) for result in results) == 1
+    assert sum(isinstance(result, admission.ServerBusyError) for result in results) == 4
+    # One immediate attempt per request, then a single poller instead of five
+    assert len(attempts) < 5 + 2 * 0.3 / admission.ADMISSION_POLL_SECONDS
+
+@pytest.fixture
+def single_slot(monkeypatch):
+    monkeypatch.setattr(config, "MAX_INFLIGHT_CLAIMS", 1)
+    monkeypatch.setattr(config, "ADMISSION_WAIT_SECONDS", 0)
+    monkeypatch.setattr(config, "INFLIGHT_STORE", "memory")
+    admission.reset_inflight_limiter()
+    yield admission.get_inflight_limiter()
+    admission.reset_inflight_limiter()
+
+def test_saturated_server_sheds_claims_with_retry_after(single_slot):
+    client = TestClient(app)
+    token = single_slot.try_acquire()
+    files = [("files", ("bill.pdf", b"%PDF-", "application/pdf"))]
+
+    response = client.post("/process-claim", files=files)
+    assert response.status_code == 503
+    assert response.headers["retry-after"] == "5"
+    # Other endpoints are not limited
+    assert client.get("/health").status_code == 200
+
+    single_slot.release(token)
+    assert client.post("/process-claim", files=[("files", ("notes.txt", b"x", "text/plain"))]).status_code == 400
+    assert single_slot.in_flight() == 0
+
+def make_upload_app():
+    upload_app = FastAPI()
+    upload_app.add_middleware(BodySizeLimitMiddleware, max_bytes=300)
+
+    @upload_app.post("/upload")
+    async def upload(files: UploadFile = File(...)):
+        return {"size": len(await files.read())}
+
+    return upload_app
+
+def test_body_size_limit_applies_before_and_while_reading():
+    client = TestClient(make_upload_app())
+    assert client.post("/upload", files={"files": ("a.pdf", b"x" * 10)}).status_code == 200
+    assert client.post("/upload", files={"files": ("a.pdf", b"x" * 500)}).status_code == 413
+
+    def chunked_body():
+        yield b"x" * 200
+        yield b"x" * 200
+
+    response = client.post("/upload", content=chunked_body(), headers={"content-type": "multipart/form-data; boundary=b"})
+    assert response.status_code == 413
+
+def test_sqlite_token_bucket_is_shared(tmp_path):
+    path = str(tmp_path / "rate_limits.sqlite3")
+    first = SQLiteTokenBucket("openai.requests", 6000, path)
+    second = SQLiteTokenBucket("openai.requests", 6000, path)
+
+    async def drain():
+        await first.acquire(6000)
+        started = time.monotonic()
+        await second.acquire(10)
+        return time.monotonic() - started
+
+    assert asyncio.run(drain()) >= 0.08
+    assert second.waited_seconds > 0
+    assert first.waited_seconds == 0
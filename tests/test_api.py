@@ -2,6 +2,7 @@ import pytest
 from fastapi.testclient import TestClient
 import os
 import io
+from app import config
 from app.main import app
 
 client = TestClient(app)
@@ -38,4 +39,12 @@ def test_health_check():
 #     result = response.json()
 #     assert "documents" in result
 #     assert "validation" in result
-#     assert "claim_decision" in result
\ No newline at end of file
+#     assert "claim_decision" in result
+
+def test_process_claim_rejects_oversized_upload(monkeypatch):
+    """Uploads above the size limit are rejected while spooling."""
+    monkeypatch.setattr(config, "MAX_UPLOAD_BYTES", 10)
+    monkeypatch.setattr(config, "UPLOAD_CHUNK_BYTES", 4)
+    files = [("files", ("bill.pdf", b"%PDF-" + b"x" * 100, "application/pdf"))]
+    response = client.post("/process-claim", files=files)
+    assert response.status_code == 413
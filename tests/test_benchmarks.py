@@ -0,0 +1,71 @@
+import asyncio
+import json
+import io
+import pytest
+from pypdf import PdfReader
+
+from app import config
+from app.providers import registry
+from app.utils import cache, near_duplicates, pdf_utils, resilience
+from benchmarks import bench_claim_pipeline
+from benchmarks.synthetic_docs import make_claim
+
+@pytest.fixture
+def mock_pipeline(monkeypatch):
+    """Run the whole pipeline against a fast mock LLM and threaded PDF extraction."""
+    monkeypatch.setattr(config, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(config, "CLAIM_INDEX", "none")
+    monkeypatch.setattr(config, "MOCK_LLM_LATENCY_MS", 1)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "thread")
+    registry.set_provider("classification", None)
+    registry.set_provider("extraction", None)
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    pdf_utils.shutdown_pdf_executor()
+    yield
+    asyncio.run(registry.close_providers())
+    pdf_utils.shutdown_pdf_executor()
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def test_synthetic_documents_have_requested_pages():
+    bill, discharge, id_card = make_claim(pages=3)
+    assert len(PdfReader(io.BytesIO(bill[1])).pages) == 3
+    assert len(PdfReader(io.BytesIO(id_card[1])).pages) == 1
+    assert "DISCHARGE SUMMARY" in PdfReader(io.BytesIO(discharge[1])).pages[0].extract_text()
+
+def test_benchmark_reports_latency_and_stages(mock_pipeline):
+    result = asyncio.run(bench_claim_pipeline.run_benchmark("direct", 2, 3, 2, 0, 0))
+
+    assert result["approved"] == 3
+    assert result["errors"] == 0
+    assert set(result["latency_ms"]) == {"p50", "p95", "p99", "mean", "max"}
+    assert set(result["stages"]) == {"pdf_extraction", "classification", "extraction", "validation"}
+    assert result["stages"]["extraction"]["calls"] == 9
+
+def test_percentile_uses_nearest_rank():
+    values = list(range(1, 101))
+    assert bench_claim_pipeline.percentile(values, 50) == 50
+    assert bench_claim_pipeline.percentile(values, 99) == 99
+    assert bench_claim_pipeline.percentile([5.0], 95) == 5.0
+
+def test_serialization_benchmark_paths_produce_the_same_json():
+    from benchmarks import bench_serialization
+
+    results = bench_serialization.make_results(claims=3, documents=4)
+    dict_results = [result.model_dump(mode="json") for result in results]
+    revalidated = [json.loads(text) for text in bench_serialization.serialize_revalidated(dict_results)]
+
+    assert revalidated == [json.loads(text) for text in bench_serialization.serialize_models(results)]
+    assert revalidated == json.loads(bench_serialization.serialize_batch(results))
+
+def test_validation_benchmark_paths_agree():
+    from benchmarks import bench_validation
+
+    claims = bench_validation.make_claims(20)
+    results = bench_validation.validate_batch(claims)
+    assert results == bench_validation.validate_per_claim(claims)
+    assert results[0][1] == ["id_card: Insurance ID card is expired"]
+    assert results[1] == ([], [])
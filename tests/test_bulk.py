@@ -0,0 +1,127 @@
+import asyncio
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.main import app
+from app.services import bulk_service
+
+CLAIM_RESULT = {
+    "documents": [],
+    "validation": {"missing_documents": ["bill", "discharge_summary", "id_card"], "discrepancies": []},
+    "claim_decision": {"status": "rejected", "reason": "Missing required documents: bill, discharge_summary, id_card"},
+}
+
+@pytest.fixture
+def claim_tree(tmp_path):
+    """A directory manifest with three claim folders."""
+    root = tmp_path / "claims"
+    for claim_id in ("claim-1", "claim-2", "claim-3"):
+        folder = root / claim_id
+        folder.mkdir(parents=True)
+        (folder / "bill.pdf").write_bytes(b"%PDF")
+        (folder / "notes.txt").write_text("ignored")
+    return root
+
+@pytest.fixture
+def fake_process_claim(monkeypatch):
+    state = {"calls": [], "fail": set()}
+
+    async def fake(files, claim_id=None):
+        assert claim_id == files[0].name.split("/")[-2]
+        state["calls"].append(claim_id)
+        if claim_id in state["fail"]:
+            raise RuntimeError("extraction failed")
+        return CLAIM_RESULT
+
+    monkeypatch.setattr(bulk_service, "process_claim", fake)
+    return state
+
+def read_rows(path):
+    with open(path) as output:
+        return [json.loads(line) for line in output]
+
+def test_directory_manifest(claim_tree):
+    claims = list(bulk_service.load_manifest(str(claim_tree)))
+    assert [claim["claim_id"] for claim in claims] == ["claim-1", "claim-2", "claim-3"]
+    assert all(claim["files"][0].endswith("bill.pdf") and len(claim["files"]) == 1 for claim in claims)
+
+def test_jsonl_manifest_paths_are_relative(tmp_path):
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(json.dumps({"claim_id": 7, "files": ["a/bill.pdf"]}) + "\n\n")
+    assert list(bulk_service.load_manifest(str(manifest))) == [
+        {"claim_id": "7", "files": [str(tmp_path / "a" / "bill.pdf")]}
+    ]
+
+def test_bulk_run_streams_results_and_resumes(claim_tree, tmp_path, fake_process_claim):
+    output = str(tmp_path / "results.jsonl")
+    fake_process_claim["fail"] = {"claim-2"}
+    reports = []
+
+    summary = asyncio.run(bulk_service.run_bulk_ingestion(
+        str(claim_tree), output, concurrency=2, report=reports.append
+    ))
+    assert summary["processed"] == 2
+    assert summary["failed"] == 1
+    assert reports and "claims/min" in reports[-1]
+    assert {row["claim_id"]: row["status"] for row in read_rows(output)} == {
+        "claim-1": "completed", "claim-2": "failed", "claim-3": "completed"
+    }
+
+    # Resuming only retries the claim that failed
+    fake_process_claim["fail"] = set()
+    fake_process_claim["calls"] = []
+    summary = asyncio.run(bulk_service.run_bulk_ingestion(str(claim_tree), output, report=reports.append))
+    assert fake_process_claim["calls"] == ["claim-2"]
+    assert summary["skipped"] == 2
+    assert read_rows(output)[-1] == {"claim_id": "claim-2", "status": "completed", "result": CLAIM_RESULT}
+
+def test_paths_outside_the_bulk_directory_are_rejected(tmp_path):
+    base = tmp_path / "bulk"
+    base.mkdir()
+    (tmp_path / "secret").mkdir()
+    (base / "escape").symlink_to(tmp_path / "secret")
+    assert bulk_service.resolve_bulk_path("claims/manifest.jsonl", str(base)) == str(base / "claims" / "manifest.jsonl")
+    for path in ("../secret/results.jsonl", str(tmp_path / "results.jsonl"), "escape/results.jsonl"):
+        with pytest.raises(ValueError):
+            bulk_service.resolve_bulk_path(path, str(base))
+
+    # Claim files named by a manifest inside the directory are checked too
+    (base / "manifest.jsonl").write_text(json.dumps({"claim_id": 1, "files": ["../secret/bill.pdf"]}) + "\n")
+    with pytest.raises(ValueError):
+        list(bulk_service.load_manifest(str(base / "manifest.jsonl"), str(base)))
+
+def test_bulk_endpoint_confines_paths(tmp_path, monkeypatch):
+    client = TestClient(app)
+    body = {"manifest": "claims", "output": "../results.jsonl"}
+    monkeypatch.setattr(config, "BULK_INGESTION_DIR", "")
+    assert client.post("/claims/bulk", json=body).status_code == 403
+    monkeypatch.setattr(config, "BULK_INGESTION_DIR", str(tmp_path))
+    response = client.post("/claims/bulk", json=body)
+    assert response.status_code == 400
+    assert "outside the bulk ingestion directory" in response.json()["detail"]
+
+def test_failed_worker_stops_the_others_before_closing(tmp_path, monkeypatch):
+    state = {"cancelled": 0}
+
+    async def slow(files, claim_id=None):
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] += 1
+            raise
+
+    monkeypatch.setattr(bulk_service, "process_claim", slow)
+    manifest = tmp_path / "manifest.jsonl"
+    manifest.write_text(json.dumps({"claim_id": 1, "files": ["bill.pdf"]}) + "\n" + json.dumps({"files": []}) + "\n")
+    (tmp_path / "bill.pdf").write_bytes(b"%PDF")
+
+    async def run():
+        with pytest.raises(ValueError):
+            await bulk_service.run_bulk_ingestion(str(manifest), str(tmp_path / "results.jsonl"), concurrency=2)
+        # The worker still processing claim 1 was stopped before the run returned
+        return state["cancelled"]
+
+    assert asyncio.run(run()) == 1
+    assert read_rows(tmp_path / "results.jsonl") == []
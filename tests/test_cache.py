@@ -0,0 +1,118 @@
+import asyncio
+import json
+import threading
+import time
+from types import SimpleNamespace
+import pytest
+
+from app import config
+from app.providers import registry as provider_registry
+from app.providers.openai_provider import OpenAIProvider
+from app.utils import cache as cache_module
+from app.utils import llm_utils
+from app.utils.cache import MemoryCache, ResultCache, SQLiteCache
+
+def test_memory_cache_evicts_least_recently_used():
+    backend = MemoryCache(ttl_seconds=60, max_entries=2, max_bytes=1024)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    backend.get("a")
+    backend.set("c", "3")
+    assert backend.get("a") == "1"
+    assert backend.get("b") is None
+    assert backend.get("c") == "3"
+
+def test_memory_cache_evicts_by_size_and_ttl():
+    backend = MemoryCache(ttl_seconds=60, max_entries=10, max_bytes=10)
+    backend.set("a", "x" * 6)
+    backend.set("b", "y" * 6)
+    assert backend.get("a") is None
+    assert backend.get("b") == "y" * 6
+
+    expiring = MemoryCache(ttl_seconds=0.01, max_entries=10, max_bytes=1024)
+    expiring.set("a", "1")
+    time.sleep(0.02)
+    assert expiring.get("a") is None
+
+def test_sqlite_cache_survives_restart(tmp_path):
+    path = str(tmp_path / "cache.sqlite3")
+    SQLiteCache(path, ttl_seconds=60, max_entries=10, max_bytes=1024).set("key", "value")
+    assert SQLiteCache(path, ttl_seconds=60, max_entries=10, max_bytes=1024).get("key") == "value"
+
+def test_sqlite_cache_evicts_oldest(tmp_path):
+    backend = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_entries=2, max_bytes=1024)
+    backend.set("a", "1")
+    backend.set("b", "2")
+    backend.set("c", "3")
+    assert backend.get("a") is None
+    assert backend.get("c") == "3"
+
+def test_sqlite_cache_evicts_only_near_its_limits(tmp_path):
+    backend = SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_entries=50, max_bytes=1024 * 1024)
+    evictions = []
+    evict = backend._evict
+    backend._evict = lambda now: evictions.append(now) or evict(now)
+
+    for i in range(50):
+        backend.set(f"key-{i}", "x")
+    assert evictions == []
+    for i in range(50, 120):
+        backend.set(f"key-{i}", "x")
+    # Each eviction frees a tenth of the cache, so 70 writes past the limit need a handful
+    assert 1 <= len(evictions) <= 15
+    assert backend._conn.execute("SELECT COUNT(*) FROM llm_cache").fetchone()[0] <= 50
+    assert backend.get("key-119") == "x"
+
+def test_sqlite_cache_is_used_off_the_event_loop(tmp_path):
+    cache = ResultCache(SQLiteCache(str(tmp_path / "cache.sqlite3"), ttl_seconds=60, max_entries=10, max_bytes=1024))
+    threads = []
+    get = cache.backend.get
+    cache.backend.get = lambda key: threads.append(threading.get_ident()) or get(key)
+
+    async def run():
+        await cache.aset("extraction", "key", {"a": 1})
+        return await cache.aget("extraction", "key")
+
+    assert asyncio.run(run()) == {"a": 1}
+    assert threads and threading.get_ident() not in threads
+
+def test_result_cache_counts_hits_and_misses():
+    cache = ResultCache(MemoryCache(ttl_seconds=60, max_entries=10, max_bytes=1024))
+    key = cache.make_key("v1", "model", "text")
+    assert cache.get("extraction", key) is None
+    cache.set("extraction", key, {"a": 1}, cost_seconds=2.0)
+    assert cache.get("extraction", key) == {"a": 1}
+
+    stats = cache.get_stats()["extraction"]
+    assert stats["hits"] == 1
+    assert stats["misses"] == 1
+    assert stats["estimated_seconds_saved"] == 2.0
+
+@pytest.fixture
+def fresh_cache(monkeypatch):
+    monkeypatch.setattr(config, "CACHE_BACKEND", "memory")
+    cache_module.reset_cache()
+    yield cache_module.get_cache()
+    cache_module.reset_cache()
+
+def test_extraction_is_served_from_cache(fresh_cache, monkeypatch):
+    """Identical documents are only sent to the LLM once."""
+    calls = []
+
+    async def fake_create(**kwargs):
+        calls.append(kwargs)
+        content = json.dumps({"hospital_name": "City Hospital"})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    provider_registry.set_provider("extraction", OpenAIProvider("fake", client=client))
+    try:
+        first = asyncio.run(llm_utils.extract_structured_data_with_gpt("bill", "same text"))
+        first["validation_issues"] = []
+        second = asyncio.run(llm_utils.extract_structured_data_with_gpt("bill", "same text"))
+    finally:
+        provider_registry.set_provider("extraction", None)
+
+    assert len(calls) == 1
+    assert second == {"hospital_name": "City Hospital", "type": "bill"}
+    assert fresh_cache.get_stats()["extraction"]["hits"] == 1
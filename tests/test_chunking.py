@@ -0,0 +1,75 @@
+import asyncio
+import pytest
+
+from app import config
+from app.providers import registry
+from app.providers.mock_provider import MockProvider
+from app.utils import cache, near_duplicates, resilience
+from app.utils.chunking import count_tokens, merge_partial_results, select_chunks, split_into_chunks
+from app.utils.llm_utils import extract_structured_data_with_gpt
+
+FILLER = "The patient rested comfortably and vital signs were stable overnight. " * 40
+
+def test_split_into_overlapping_chunks():
+    text = " ".join(f"w{index}" for index in range(25))
+    chunks = split_into_chunks(text, chunk_tokens=10, overlap_tokens=2)
+
+    assert chunks[0] == " ".join(f"w{index}" for index in range(10))
+    assert chunks[1].startswith("w8 w9 ")
+    assert chunks[-1].endswith("w24")
+    assert all(count_tokens(chunk) <= 10 for chunk in chunks)
+    assert split_into_chunks("short text", 10, 2) == ["short text"]
+
+def test_select_chunks_stops_once_fields_are_covered():
+    chunks = [
+        "Patient name: Jane Doe. Admitted on 2024-03-05.",
+        FILLER,
+        "Diagnosis: pneumonia. Discharge date: 2024-03-10.",
+        FILLER,
+    ]
+    assert select_chunks(chunks, "discharge_summary", max_chunks=3) == [0, 2]
+    assert select_chunks([FILLER, FILLER], "discharge_summary", max_chunks=3) == [0]
+    assert select_chunks(["a", "b", "c"], "lab_report", max_chunks=2) == [0, 1]
+
+def test_merge_resolves_conflicts():
+    merged = merge_partial_results([
+        {"patient_name": "Jane Doe", "admission_date": "2024-03-06", "discharge_date": None, "diagnosis": "Flu"},
+        {"patient_name": "J. Doe", "admission_date": "2024-03-05", "discharge_date": "2024-03-09"},
+        {"patient_name": "Jane Doe", "discharge_date": "2024-03-10", "diagnosis": "Pneumonia"},
+    ])
+    assert merged == {
+        "patient_name": "Jane Doe",
+        "admission_date": "2024-03-05",
+        "discharge_date": "2024-03-10",
+        "diagnosis": "Flu",
+    }
+    assert merge_partial_results([{"total_amount": None}]) == {"total_amount": None}
+
+@pytest.fixture
+def mock_extraction(monkeypatch):
+    provider = MockProvider(latency_ms=0, distribution="fixed")
+    registry.set_provider("extraction", provider)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(config, "EXTRACTION_CHUNK_TOKENS", 200)
+    monkeypatch.setattr(config, "EXTRACTION_CHUNK_OVERLAP_TOKENS", 20)
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    yield provider
+    registry.set_provider("extraction", None)
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def test_long_document_only_sends_relevant_chunks(mock_extraction):
+    text = "Patient: Jane Doe. Admitted 2024-03-05.\n" + FILLER * 3 + "Diagnosis: pneumonia. Discharged 2024-03-10."
+    result = asyncio.run(extract_structured_data_with_gpt("discharge_summary", text))
+
+    assert len(split_into_chunks(text, 200, 20)) > 4
+    assert mock_extraction.calls == 2
+    assert result["patient_name"] == "Jane Doe"
+    assert result["discharge_date"] == "2024-03-10"
+
+def test_chunking_can_be_disabled(mock_extraction, monkeypatch):
+    monkeypatch.setattr(config, "EXTRACTION_CHUNKING", False)
+    asyncio.run(extract_structured_data_with_gpt("discharge_summary", FILLER * 5))
+    assert mock_extraction.calls == 1
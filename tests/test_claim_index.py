@@ -0,0 +1,139 @@
+import asyncio
+import threading
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.main import app
+from app.providers import registry
+from app.services import claim_index_service
+from app.services.claim_index_service import MemoryClaimIndex, SQLiteClaimIndex, bill_key, check_claim_history
+from app.services.validation_service import validate_claim_documents
+from app.utils import pdf_utils, resilience
+from benchmarks.synthetic_docs import make_claim
+
+DAY = 24 * 3600
+
+BILL = {"type": "bill", "hospital_name": "General Hospital", "total_amount": 1250, "date_of_service": "2024-03-10"}
+DISCHARGE = {
+    "type": "discharge_summary", "patient_name": "Jane Doe", "diagnosis": "Pneumonia",
+    "admission_date": "2024-03-05", "discharge_date": "2024-03-10"
+}
+ID_CARD = {"type": "id_card", "patient_name": "Jane Doe", "insurance_id": "ABC-123"}
+
+@pytest.fixture(params=["memory", "sqlite"])
+def index(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteClaimIndex(str(tmp_path / "claims.sqlite3"))
+    return MemoryClaimIndex()
+
+def test_bill_key_normalizes_hospital_and_amount():
+    assert bill_key(BILL) == bill_key(dict(BILL, hospital_name="  general   HOSPITAL", total_amount="1250.00"))
+    assert bill_key(BILL) != bill_key(dict(BILL, total_amount=1250.5))
+    assert bill_key(dict(BILL, date_of_service=None)) is None
+
+def test_duplicate_bill_is_flagged_but_not_against_its_own_claim(index):
+    index.record("claim-1", [BILL, ID_CARD])
+    assert check_claim_history(index, [BILL], "claim-1") == []
+
+    discrepancies = check_claim_history(index, [dict(BILL, hospital_name="GENERAL HOSPITAL")], "claim-2")
+    assert discrepancies == [
+        "Duplicate bill: GENERAL HOSPITAL bill of 1250 on 2024-03-10 was already submitted in 1 other claim(s)"
+    ]
+
+def test_recording_a_claim_again_replaces_its_entries(index):
+    index.record("claim-1", [BILL])
+    index.record("claim-1", [dict(BILL, total_amount=99)])
+    assert index.count_bill_claims(bill_key(BILL)) == 0
+    assert index.count_bill_claims(bill_key(dict(BILL, total_amount=99))) == 1
+
+def test_removed_claims_leave_no_empty_keys():
+    index = MemoryClaimIndex()
+    index.record("claim-1", [BILL, ID_CARD])
+    index.record("claim-1", [])
+    assert index._bills == {}
+    assert index._members == {}
+
+def test_concurrent_claims_with_the_same_bill_are_flagged(index):
+    barrier = threading.Barrier(8)
+    results = []
+
+    def submit(claim_id):
+        barrier.wait()
+        results.append(index.check_and_record(claim_id, [BILL]))
+
+    threads = [threading.Thread(target=submit, args=(f"claim-{i}",)) for i in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    # Only the first claim recorded passes; every later one sees the bills before it
+    assert sorted(len(discrepancies) for discrepancies in results) == [0] + [1] * 7
+
+def test_insurance_id_velocity_within_window(index, monkeypatch):
+    monkeypatch.setattr(config, "CLAIM_VELOCITY_WINDOW_DAYS", 30)
+    monkeypatch.setattr(config, "CLAIM_VELOCITY_MAX_CLAIMS", 3)
+    now = 100 * DAY
+    index.record("old", [ID_CARD], recorded_at=now - 40 * DAY)
+    index.record("claim-1", [ID_CARD], recorded_at=now - 10 * DAY)
+    index.record("claim-2", [dict(ID_CARD, insurance_id=" abc-123 ")], recorded_at=now - 5 * DAY)
+    assert check_claim_history(index, [ID_CARD], "claim-3", now=now) == []
+    # Re-checking a recorded claim does not count it twice
+    assert check_claim_history(index, [ID_CARD], "claim-2", now=now) == []
+
+    index.record("claim-3", [ID_CARD], recorded_at=now - DAY)
+    assert check_claim_history(index, [ID_CARD], "claim-4", now=now) == [
+        "Insurance ID ABC-123 was used in 4 claims in the last 30 days"
+    ]
+
+def test_validation_rejects_claim_with_duplicate_bill(monkeypatch):
+    monkeypatch.setattr(config, "CLAIM_INDEX", "memory")
+    claim_index_service.reset_claim_index()
+    try:
+        documents = [BILL, DISCHARGE, ID_CARD]
+        validation, decision = validate_claim_documents(documents, "claim-1")
+        assert decision.status == "approved"
+        claim_index_service.index_claim("claim-1", documents)
+
+        validation, decision = validate_claim_documents(documents, "claim-1")
+        assert decision.status == "approved"
+        validation, decision = validate_claim_documents(documents, "claim-2")
+        assert decision.status == "rejected"
+        assert any(item.startswith("Duplicate bill") for item in validation.discrepancies)
+    finally:
+        claim_index_service.reset_claim_index()
+
+@pytest.fixture
+def mock_claims(monkeypatch):
+    """Claims processed end to end against the mock LLM with a fresh in-memory claim index."""
+    monkeypatch.setattr(config, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(config, "CLAIM_INDEX", "memory")
+    monkeypatch.setattr(config, "MOCK_LLM_LATENCY_MS", 1)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "thread")
+    registry.set_provider("classification", None)
+    registry.set_provider("extraction", None)
+    claim_index_service.reset_claim_index()
+    pdf_utils.shutdown_pdf_executor()
+    yield
+    asyncio.run(registry.close_providers())
+    pdf_utils.shutdown_pdf_executor()
+    resilience.reset_llm_callers()
+    claim_index_service.reset_claim_index()
+
+def test_resubmitted_bill_is_a_duplicate_unless_the_claim_id_matches(mock_claims):
+    files = [("files", (filename, data, "application/pdf")) for filename, data in make_claim()]
+    with TestClient(app) as client:
+        first, resubmitted = [client.post("/process-claim", files=files).json() for _ in range(2)]
+        retried = [
+            client.post("/process-claim", files=files, data={"claim_id": "claim-1"}).json()["claim_decision"]
+            for _ in range(2)
+        ]
+
+    assert first["claim_decision"]["status"] == "approved"
+    # The same documents submitted again as a new claim are a duplicate bill
+    assert resubmitted["claim_decision"]["status"] == "rejected"
+    assert any(item.startswith("Duplicate bill") for item in resubmitted["validation"]["discrepancies"])
+    # Retrying an explicit claim ID only excludes that claim's own entry
+    assert retried[0] == retried[1]
+    assert "2 other claim(s)" in retried[1]["reason"]
@@ -0,0 +1,47 @@
+import asyncio
+
+from app.services import document_service
+from app.utils.heuristic_classifier import ClassificationStats, KeywordClassifier
+
+BILL_TEXT = "CITY HOSPITAL\nINVOICE\nTotal charges: $1,200.00\nAmount due: $1,200.00"
+DISCHARGE_TEXT = "DISCHARGE SUMMARY\nDate of admission: 2024-01-01\nDate of discharge: 2024-01-05\nDiagnosis: Pneumonia"
+ID_CARD_TEXT = "ACME HEALTH\nMember ID: XJ12345\nGroup No: 7788\nPlan: Gold PPO\nCopay: $20"
+
+def test_keyword_classifier_is_confident_on_clear_documents():
+    classifier = KeywordClassifier()
+    assert classifier.classify(BILL_TEXT, "scan1.pdf") == ("bill", 1.0)
+    assert classifier.classify(DISCHARGE_TEXT, "scan2.pdf") == ("discharge_summary", 1.0)
+    doc_type, confidence = classifier.classify(ID_CARD_TEXT, "scan3.pdf")
+    assert doc_type == "id_card"
+    assert confidence >= 0.8
+
+def test_keyword_classifier_is_unsure_on_ambiguous_documents():
+    classifier = KeywordClassifier()
+    assert classifier.classify("Lorem ipsum", "document.pdf") == ("unknown", 0.0)
+
+    _, confidence = classifier.classify(BILL_TEXT + "\n" + DISCHARGE_TEXT, "claim.pdf")
+    assert confidence < 0.5
+
+def test_classification_skips_llm_when_confident(monkeypatch):
+    calls = []
+
+    async def fake_classify(text, filename, document_types=None):
+        calls.append(filename)
+        return "id_card"
+
+    stats = ClassificationStats()
+    monkeypatch.setattr(document_service, "classify_document_with_gemini", fake_classify)
+    monkeypatch.setattr(document_service, "classification_stats", stats)
+
+    documents = [
+        {"filename": "scan1.pdf", "content": BILL_TEXT},
+        {"filename": "scan2.pdf", "content": "Lorem ipsum"},
+    ]
+    for doc in documents:
+        asyncio.run(document_service.classify_document(doc))
+
+    assert [doc["type"] for doc in documents] == ["bill", "id_card"]
+    assert calls == ["scan2.pdf"]
+    assert stats.get_stats()["resolved_locally"] == 1
+    assert stats.get_stats()["sent_to_llm"] == 1
+    assert stats.get_stats()["llm_agreement_by_confidence"] == {"0.0-0.1": {"agree": 0, "disagree": 1}}
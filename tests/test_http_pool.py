@@ -0,0 +1,91 @@
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app import config
+from app.providers.gemini_provider import GeminiAPIError, GeminiProvider
+from app.utils import http_pool, resilience
+from app.utils.telemetry import render_metrics
+
+async def serve_keep_alive(reader: asyncio.StreamReader, writer: asyncio.StreamWriter) -> None:
+    """Minimal HTTP/1.1 server answering every request on a connection with `ok`."""
+    try:
+        while True:
+            headers = await reader.readuntil(b"\r\n\r\n")
+            length = next(
+                (int(line.split(b":")[1]) for line in headers.split(b"\r\n") if line.lower().startswith(b"content-length")), 0
+            )
+            await reader.readexactly(length)
+            writer.write(b"HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok")
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        writer.close()
+
+def test_pool_reuses_connections_and_reports_stats(monkeypatch):
+    monkeypatch.setattr(config, "LLM_HTTP2", False)
+
+    async def run():
+        server = await asyncio.start_server(serve_keep_alive, "127.0.0.1", 0)
+        port = server.sockets[0].getsockname()[1]
+        try:
+            client = http_pool.get_http_client("test")
+            assert http_pool.get_http_client("test") is client
+            for _ in range(5):
+                response = await client.post(f"http://127.0.0.1:{port}/", json={"prompt": "hi"})
+                assert response.text == "ok"
+            return http_pool.get_pool_stats()["test"]
+        finally:
+            await http_pool.close_http_clients()
+            server.close()
+            await server.wait_closed()
+
+    stats = asyncio.run(run())
+    assert stats["requests"] == 5
+    assert stats["in_flight"] == 0
+    assert stats["connections_opened"] == 1
+    assert stats["idle_connections"] == 1
+    assert http_pool.get_pool_stats() == {}
+
+def test_pool_metrics_are_exported(monkeypatch):
+    monkeypatch.setattr(config, "LLM_HTTP2", False)
+    http_pool.get_http_client("test")
+    try:
+        assert 'healthpay_llm_http_connections_opened_total{provider="test"} 0' in render_metrics()
+    finally:
+        asyncio.run(http_pool.close_http_clients())
+
+def test_gemini_provider_calls_the_rest_api():
+    requests = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        requests.append(request)
+        if request.url.path.endswith("overloaded:generateContent"):
+            return httpx.Response(503, headers={"Retry-After": "2"}, text="busy")
+        return httpx.Response(200, json={
+            "candidates": [{"content": {"parts": [{"text": '{"type": '}, {"text": '"bill"}'}]}}],
+            "usageMetadata": {"promptTokenCount": 12, "candidatesTokenCount": 4},
+        })
+
+    async def run():
+        async with httpx.AsyncClient(transport=httpx.MockTransport(handler)) as client:
+            provider = GeminiProvider("models/gemini-test", "https://gemini.test/v1beta/", api_key="key", http_client=client)
+            response = await provider.generate_json("Extract", "A bill")
+            with pytest.raises(GeminiAPIError) as error:
+                await GeminiProvider("overloaded", "https://gemini.test/v1beta", api_key="key", http_client=client).generate_text("hi")
+            return response, error.value
+
+    response, error = asyncio.run(run())
+    assert json.loads(response.text) == {"type": "bill"}
+    assert (response.input_tokens, response.output_tokens) == (12, 4)
+
+    request = requests[0]
+    assert str(request.url) == "https://gemini.test/v1beta/models/gemini-test:generateContent"
+    assert request.headers["x-goog-api-key"] == "key"
+    body = json.loads(request.content)
+    assert body["contents"][0]["parts"][0]["text"] == "Extract\n\nA bill"
+    assert body["generationConfig"] == {"responseMimeType": "application/json"}
+
+    assert resilience.is_retryable(error)
+    assert resilience.get_retry_after(error) == 2.0
@@ -0,0 +1,163 @@
+import asyncio
+import os
+import time
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config, main
+from app.services import job_service
+from app.services.job_service import JobManager, MemoryJobStore, SQLiteJobStore
+
+CLAIM_RESULT = {
+    "documents": [
+        {"type": "bill", "hospital_name": "City Hospital", "total_amount": 100.0, "date_of_service": "2024-01-05"}
+    ],
+    "validation": {"missing_documents": ["discharge_summary", "id_card"], "discrepancies": []},
+    "claim_decision": {"status": "rejected", "reason": "Missing required documents: discharge_summary, id_card"},
+}
+
+PDF_FILES = [("files", ("bill.pdf", b"%PDF-1.4 fake", "application/pdf"))]
+
+@pytest.fixture
+def job_manager(monkeypatch):
+    monkeypatch.setattr(config, "WARM_UP_ON_STARTUP", False)
+    manager = JobManager(MemoryJobStore())
+    monkeypatch.setattr(job_service, "_job_manager", manager)
+    return manager
+
+def wait_for_job(client, job_id, timeout=5.0):
+    deadline = time.time() + timeout
+    while time.time() < deadline:
+        job = client.get(f"/claims/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.02)
+    raise AssertionError(f"Job {job_id} did not finish")
+
+def test_submit_claim_returns_job_and_result(job_manager, monkeypatch):
+    async def fake_process_claim(files, claim_id=None):
+        assert [file.filename for file in files] == ["bill.pdf"]
+        return CLAIM_RESULT
+
+    monkeypatch.setattr(main, "process_claim", fake_process_claim)
+
+    with TestClient(main.app) as client:
+        response = client.post("/claims", files=PDF_FILES)
+        assert response.status_code == 202
+        job_id = response.json()["job_id"]
+
+        job = wait_for_job(client, job_id)
+        assert job["status"] == "completed"
+        assert job["result"]["claim_decision"]["status"] == "rejected"
+
+        events = client.get(f"/claims/{job_id}/events").text
+        assert "event: completed" in events
+
+def test_failed_claim_reports_error(job_manager, monkeypatch):
+    async def failing_process_claim(files, claim_id=None):
+        raise RuntimeError("LLM unavailable")
+
+    monkeypatch.setattr(main, "process_claim", failing_process_claim)
+
+    with TestClient(main.app) as client:
+        job_id = client.post("/claims", files=PDF_FILES).json()["job_id"]
+        job = wait_for_job(client, job_id)
+        assert job["status"] == "failed"
+        assert job["error"] == "LLM unavailable"
+
+@pytest.fixture
+def spooled_paths(monkeypatch):
+    """Paths of the temporary files uploads are spooled to."""
+    paths = []
+    receive = main.receive_claim_files
+
+    async def recording_receive(files):
+        file_objects = await receive(files)
+        paths.extend(file.name for file in file_objects)
+        return file_objects
+
+    monkeypatch.setattr(main, "receive_claim_files", recording_receive)
+    return paths
+
+def test_full_queue_is_refused(job_manager, spooled_paths, monkeypatch):
+    monkeypatch.setattr(config, "JOB_WORKERS", 0)
+    monkeypatch.setattr(config, "JOB_QUEUE_SIZE", 1)
+
+    with TestClient(main.app) as client:
+        job_id = client.post("/claims", files=PDF_FILES).json()["job_id"]
+        response = client.post("/claims", files=PDF_FILES)
+        assert response.status_code == 503
+        assert response.headers["Retry-After"]
+
+    # Shutting down fails the job left in the queue and deletes its spooled upload
+    assert job_manager.store.get(job_id)["status"] == "failed"
+    assert len(spooled_paths) == 2
+    assert not any(os.path.exists(path) for path in spooled_paths)
+
+def test_cancelled_job_is_marked_failed(job_manager):
+    async def run():
+        started = asyncio.Event()
+
+        async def hang():
+            started.set()
+            await asyncio.sleep(10)
+
+        job_id = await job_manager.submit(hang)
+        await started.wait()
+        await job_manager.shutdown()
+        return await job_manager.get(job_id)
+
+    job = asyncio.run(run())
+    assert (job["status"], job["error"]) == ("failed", "Job was cancelled")
+
+def test_webhook_urls_are_checked(job_manager, monkeypatch):
+    monkeypatch.setattr(config, "JOB_WEBHOOK_ALLOWED_HOSTS", "hooks.example.com")
+    job_service.validate_webhook_url("https://hooks.example.com/claims")
+    for url in ("http://bad host:x/", "ftp://hooks.example.com/", "http://169.254.169.254/latest", "http://hooks.example.com:x/"):
+        with pytest.raises(job_service.InvalidWebhookError):
+            job_service.validate_webhook_url(url)
+
+    with TestClient(main.app) as client:
+        response = client.post("/claims", files=PDF_FILES, data={"webhook_url": "http://169.254.169.254/"})
+        assert response.status_code == 400
+
+def test_failing_webhook_does_not_stop_the_workers(job_manager, monkeypatch):
+    monkeypatch.setattr(config, "JOB_WORKERS", 1)
+
+    async def notify(webhook_url, job):
+        raise ValueError("bad webhook")
+
+    async def ok():
+        return {"ok": True}
+
+    monkeypatch.setattr(job_manager, "_notify", notify)
+
+    async def run():
+        # Webhooks are checked at submit time; bypass that to reach the worker
+        monkeypatch.setattr(job_service, "validate_webhook_url", lambda url: None)
+        first = await job_manager.submit(ok, webhook_url="http://hooks.example.com/")
+        second = await job_manager.submit(ok)
+        await asyncio.wait_for(job_manager._queue.join(), 5)
+        await job_manager.shutdown()
+        return await job_manager.get(first), await job_manager.get(second)
+
+    first, second = asyncio.run(run())
+    assert first["status"] == "completed"
+    assert second["status"] == "completed"
+
+def test_unknown_job_is_not_found(job_manager):
+    with TestClient(main.app) as client:
+        assert client.get("/claims/missing").status_code == 404
+
+def test_sqlite_job_store_is_shared(tmp_path):
+    path = str(tmp_path / "jobs.sqlite3")
+    writer = SQLiteJobStore(path)
+    writer.create({"job_id": "a", "kind": "claim", "status": "queued", "created_at": 1.0, "updated_at": 1.0})
+    writer.update("a", status="completed", result={"ok": True}, updated_at=2.0)
+
+    job = SQLiteJobStore(path).get("a")
+    assert job["status"] == "completed"
+    assert job["result"] == {"ok": True}
+
+    writer.purge(older_than=3.0)
+    assert writer.get("a") is None
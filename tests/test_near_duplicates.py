@@ -0,0 +1,187 @@
+import asyncio
+import pytest
+
+from app import config
+from app.agents import bill_agent, id_card_agent
+from app.services import ai_service, document_service
+from app.utils import near_duplicates
+from app.utils.near_duplicates import NearDuplicateIndex, learn_template, parse_with_template, similarity, value_shapes
+from app.utils.telemetry import render_metrics
+
+def id_card(member_id: str, name: str = "Jane Doe") -> str:
+    return "\n".join([
+        "ACME HEALTH INSURANCE - MEMBER ID CARD",
+        f"Member name: {name}",
+        f"Member ID: {member_id}",
+        "Group number: 7788",
+        "Plan: Gold PPO",
+        "Copay: $20",
+        "Valid through: 12/31/2099",
+        "Present this card at every visit. Call the number on the back for prior authorization.",
+        "Emergency care is covered worldwide. Notify the plan within two business days of an admission.",
+        "This card does not guarantee coverage. Benefits are subject to the terms of the member's plan.",
+    ])
+
+def bill(amount: str) -> str:
+    return "\n".join([
+        "MOCK GENERAL HOSPITAL",
+        "INVOICE",
+        "Date of service: 2024-03-10",
+        f"Amount due: {amount}",
+        "Room and board, semi-private room .......... $900.00",
+        "Laboratory services and blood panel .......... $350.00",
+        "Payment is due within thirty days of the statement date.",
+    ])
+
+def test_signatures_estimate_similarity():
+    index = NearDuplicateIndex(10, 0.7)
+    first = index.fingerprint(id_card("XJ-1001"))
+    assert similarity(first, index.fingerprint(id_card("XJ-2002"))) == 1.0
+    assert similarity(first, index.fingerprint(bill("$1,250.00"))) < 0.2
+    assert index.fingerprint("too short") is None
+
+def test_index_finds_the_nearest_document_of_a_type():
+    index = NearDuplicateIndex(10, 0.7)
+    index.add(index.fingerprint(id_card("XJ-1001")), "id_card", {"insurance_id": "XJ-1001"}, {})
+    index.add(index.fingerprint(bill("$10.00")), "bill", {"total_amount": 10.0}, {})
+
+    match, score = index.find(index.fingerprint(id_card("ZZ-9999", name="John Roe")))
+    assert (match.document_type, match.result) == ("id_card", {"insurance_id": "XJ-1001"})
+    assert score >= 0.8
+    assert index.find(index.fingerprint(id_card("ZZ-9999")), "bill") is None
+
+def test_value_shapes_hold_no_values():
+    assert value_shapes({
+        "patient_name": "Jane Doe", "total_amount": 1250.0, "admission_date": "2024-03-05",
+        "insurance_id": None, "type": "bill", "validation_issues": ["x"],
+    }) == {"patient_name": "<text>", "total_amount": "<number>", "admission_date": "<YYYY-MM-DD>", "insurance_id": None}
+
+def test_index_evicts_least_recently_matched_entries():
+    index = NearDuplicateIndex(2, 0.7)
+    texts = [id_card("XJ-1001"), bill("$10.00"), "Discharge summary of a patient admitted for observation overnight and sent home the next morning"]
+    for text in texts[:2]:
+        index.add(index.fingerprint(text), "doc", {}, {})
+    index.find(index.fingerprint(texts[0]))
+    index.add(index.fingerprint(texts[2]), "doc", {}, {})
+
+    assert index.get_stats()["entries"] == 2
+    assert index.get_stats()["evictions"] == 1
+    assert index.find(index.fingerprint(texts[0])) is not None
+    assert index.find(index.fingerprint(texts[1])) is None
+    # Evicted entries leave no LSH buckets behind
+    assert all(entry_id in index._entries for bucket in index._buckets.values() for entry_id in bucket)
+
+def test_template_reads_fields_at_learned_labels():
+    extracted = {
+        "patient_name": "Jane Doe", "insurance_id": "XJ-1001", "plan_name": "Gold PPO",
+        "expiration_date": "2099-12-31", "type": "id_card", "validation_issues": [],
+    }
+    labels = learn_template(id_card("XJ-1001"), extracted)
+    assert labels == {
+        "patient_name": "member name", "insurance_id": "member id",
+        "plan_name": "plan", "expiration_date": "valid through",
+    }
+    parsed = parse_with_template("id_card", id_card("ZZ-9999", name="John Roe"), labels, list(extracted))
+    assert parsed == {
+        "patient_name": "John Roe", "insurance_id": "ZZ-9999", "plan_name": "Gold PPO",
+        "expiration_date": "2099-12-31", "type": "id_card",
+    }
+    # A field that is not on a labelled line makes the layout unusable as a template
+    assert learn_template(bill("$1,250.00"), {"hospital_name": "Mock General Hospital", "type": "bill"}) == {}
+
+def discharge(admitted: str, discharged: str) -> str:
+    return "\n".join([
+        "MOCK GENERAL HOSPITAL - DISCHARGE SUMMARY",
+        "Patient name: Jane Doe",
+        f"Date of admission: {admitted}",
+        f"Date of discharge: {discharged}",
+        "Final diagnosis: Community-acquired pneumonia",
+    ])
+
+def test_template_is_not_learned_from_ambiguous_values():
+    extracted = {
+        "patient_name": "Jane Doe", "diagnosis": "Community-acquired pneumonia",
+        "admission_date": "2024-03-05", "discharge_date": "2024-03-05", "type": "discharge_summary",
+    }
+    # Both dates match both date lines, so neither label can be trusted
+    assert learn_template(discharge("2024-03-05", "2024-03-05"), extracted) == {}
+
+    labels = learn_template(discharge("2024-03-05", "2024-03-10"), dict(extracted, discharge_date="2024-03-10"))
+    parsed = parse_with_template("discharge_summary", discharge("2024-03-05", "2024-03-19"), labels, list(extracted))
+    assert (parsed["admission_date"], parsed["discharge_date"]) == ("2024-03-05", "2024-03-19")
+    # A value that does not read as its field's type sends the document to the LLM
+    assert parse_with_template("discharge_summary", discharge("2024-03-05", "pending"), labels, list(extracted)) is None
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Fake LLM calls recording the classifications and the examples passed to extraction."""
+    state = {"classified": 0, "examples": []}
+
+    async def fake_classify(text, filename, document_types=None):
+        state["classified"] += 1
+        return "id_card" if "ID CARD" in text else "bill"
+
+    async def fake_extract(document_type, text, example=None):
+        state["examples"].append(example)
+        if document_type == "bill":
+            return {"hospital_name": "Mock General Hospital", "total_amount": 1250.0, "date_of_service": "2024-03-10", "type": "bill"}
+        return {
+            "patient_name": "Jane Doe", "insurance_id": text.split("Member ID: ")[1].split("\n")[0],
+            "plan_name": "Gold PPO", "expiration_date": "2099-12-31", "type": "id_card",
+        }
+
+    monkeypatch.setattr(config, "NEAR_DUPLICATE_INDEX", True)
+    monkeypatch.setattr(config, "NEAR_DUPLICATE_TEMPLATE_PARSING", True)
+    # Send every classification to the LLM unless a near-duplicate answers it
+    monkeypatch.setattr(config, "LOCAL_CLASSIFIER_THRESHOLD", 1.1)
+    monkeypatch.setattr(config, "SPECULATIVE_EXTRACTION", False)
+    monkeypatch.setattr(document_service, "classify_document_with_gemini", fake_classify)
+    for module in (bill_agent, id_card_agent):
+        monkeypatch.setattr(module, "extract_structured_data_with_gpt", fake_extract)
+    near_duplicates.reset_near_duplicate_index()
+    yield state
+    near_duplicates.reset_near_duplicate_index()
+
+def process(filename, text):
+    return asyncio.run(ai_service.classify_and_extract({"filename": filename, "content": text, "preview": text}))
+
+def test_near_duplicates_reuse_classification_and_template(fake_llm):
+    process("card.pdf", id_card("XJ-1001"))
+    result = process("card.pdf", id_card("XJ-2002"))
+    assert fake_llm["classified"] == 1
+    assert result["insurance_id"] == "XJ-2002"
+
+    # Another patient's card is similar enough for the template but not to skip classification
+    result = process("card.pdf", id_card("ZZ-9999", name="John Roe"))
+    assert fake_llm["classified"] == 2
+    assert fake_llm["examples"] == [None]
+    assert result["patient_name"] == "John Roe"
+    assert result["insurance_id"] == "ZZ-9999"
+    assert result["validation_issues"] == []
+
+    stats = near_duplicates.get_near_duplicate_index().get_stats()
+    assert stats["entries"] == 1
+    assert stats["classifications_reused"] == 1
+    assert stats["extractions_from_template"] == 2
+    assert stats["classification_reuse_rate"] == 1 / 3
+    assert 'healthpay_near_duplicate_reuse_total{use="template"} 2' in render_metrics()
+
+def test_near_duplicates_pass_the_prior_result_as_an_example(fake_llm):
+    process("bill.pdf", bill("$1,250.00"))
+    process("bill.pdf", bill("$1,250.00") + "\nLate fee waived for this statement.")
+
+    assert fake_llm["examples"][0] is None
+    # Only field names and the kinds of their values are shown, never the values themselves
+    assert fake_llm["examples"][1] == {
+        "hospital_name": "<text>", "total_amount": "<number>", "date_of_service": "<YYYY-MM-DD>"
+    }
+    assert near_duplicates.get_near_duplicate_index().get_stats()["extractions_hinted"] == 1
+
+def test_template_parsing_is_opt_in(fake_llm, monkeypatch):
+    monkeypatch.setattr(config, "NEAR_DUPLICATE_TEMPLATE_PARSING", False)
+    process("card.pdf", id_card("XJ-1001"))
+    result = process("card.pdf", id_card("ZZ-9999", name="John Roe"))
+
+    assert fake_llm["examples"][1]["insurance_id"] == "<text>"
+    assert result["insurance_id"] == "ZZ-9999"
+    assert near_duplicates.get_near_duplicate_index().get_stats()["extractions_from_template"] == 0
@@ -0,0 +1,56 @@
+import asyncio
+import json
+
+from app.models.normalization import build_documents, canonical_key, normalize_document
+from app.models.schemas import BillDocument, ClaimDecision, ClaimProcessingResult, ValidationResult
+from app.services import orchestrator_service
+
+def test_canonical_key_strips_format_hints():
+    assert canonical_key("Date of Service (YYYY-MM-DD)") == "date_of_service"
+    assert canonical_key("Insurance-ID") == "insurance_id"
+
+def test_normalize_document_maps_aliases_and_values():
+    raw = {"bill": {"Hospital": "City Hospital", "Total Amount Due": "$1,250.50", "Service Date": "03/10/2024"}}
+    assert normalize_document("bill", raw) == {
+        "hospital_name": "City Hospital", "total_amount": 1250.5, "date_of_service": "2024-03-10", "type": "bill"
+    }
+
+    raw = {"Member Name": "Jane Doe", "Member ID": "ABC123", "Plan": "Gold", "Expires": "Dec 31, 2099", "group": "7"}
+    assert normalize_document("id_card", raw) == {
+        "patient_name": "Jane Doe", "insurance_id": "ABC123", "plan_name": "Gold",
+        "expiration_date": "2099-12-31", "group": "7", "type": "id_card"
+    }
+
+def test_schema_field_names_win_over_aliases():
+    raw = {"total": 10, "total_amount": 12, "hospital_name": "A", "date_of_service": "2024-01-01"}
+    assert normalize_document("bill", raw)["total_amount"] == 12
+
+def test_unparseable_values_are_left_for_agent_validation():
+    doc = normalize_document("bill", {"hospital_name": "A", "total_amount": "n/a", "date_of_service": "soon"})
+    assert doc["total_amount"] == "n/a"
+    assert doc["date_of_service"] == "soon"
+    assert build_documents([doc]) == []
+
+def test_build_documents_skips_types_without_schema():
+    documents = build_documents([
+        {"type": "bill", "hospital_name": "A", "total_amount": 5, "date_of_service": "2024-01-01",
+         "validation_issues": []},
+        {"type": "lab_report", "test_name": "CBC"},
+    ])
+    assert documents == [BillDocument(hospital_name="A", total_amount=5, date_of_service="2024-01-01")]
+
+def test_result_formatter_builds_result_without_revalidation():
+    documents = build_documents([{"type": "bill", "hospital_name": "A", "total_amount": 5, "date_of_service": "2024-01-01"}])
+    state = {
+        "documents": documents,
+        "validation_result": ValidationResult(missing_documents=["id_card"]),
+        "claim_decision": ClaimDecision(status="rejected", reason="Missing required documents: id_card"),
+    }
+    result = asyncio.run(orchestrator_service.result_formatter(state))["final_result"]
+
+    assert isinstance(result, ClaimProcessingResult)
+    assert result.documents[0] is documents[0]
+    assert json.loads(result.model_dump_json()) == ClaimProcessingResult.model_validate(
+        json.loads(result.model_dump_json())
+    ).model_dump(mode="json")
+    assert orchestrator_service.claim_result_to_dict(result)["documents"][0]["date_of_service"] == "2024-01-01"
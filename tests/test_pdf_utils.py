@@ -0,0 +1,152 @@
+import asyncio
+import io
+import time
+import pytest
+from pypdf import PdfWriter
+
+from app import config
+from app.utils import pdf_utils
+
+@pytest.fixture
+def thread_executor(monkeypatch):
+    """Run PDF extraction in a small thread pool for the duration of a test."""
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "thread")
+    monkeypatch.setattr(config, "PDF_WORKERS", 2)
+    pdf_utils.shutdown_pdf_executor()
+    yield
+    pdf_utils.shutdown_pdf_executor()
+
+def named_file(data: bytes, filename: str) -> io.BytesIO:
+    file_obj = io.BytesIO(data)
+    file_obj.filename = filename
+    return file_obj
+
+def blank_pdf() -> bytes:
+    writer = PdfWriter()
+    writer.add_blank_page(width=200, height=200)
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+def test_extraction_does_not_block_event_loop(thread_executor, monkeypatch):
+    """Slow PDF parsing runs off the event loop so other work keeps flowing."""
+    def slow_extract(source, max_pages, preview_pages, max_chars, ocr_min_chars=0, ocr_max_pages=0):
+        time.sleep(0.3)
+        text = source.decode()
+        return {"preview": text, "content": text, "pages_read": 1, "truncated": False}
+
+    monkeypatch.setattr(pdf_utils, "_extract_text_sync", slow_extract)
+
+    async def run():
+        ticks = 0
+
+        async def ticker():
+            nonlocal ticks
+            while True:
+                await asyncio.sleep(0.01)
+                ticks += 1
+
+        ticker_task = asyncio.create_task(ticker())
+        files = [named_file(b"first", "a.pdf"), named_file(b"second", "b.pdf")]
+        start = time.perf_counter()
+        results = await pdf_utils.process_pdf_files(files)
+        elapsed = time.perf_counter() - start
+        ticker_task.cancel()
+        return results, ticks, elapsed
+
+    results, ticks, elapsed = asyncio.run(run())
+
+    assert [(doc["filename"], doc["content"]) for doc in results] == [("a.pdf", "first"), ("b.pdf", "second")]
+    assert ticks > 10
+    # Both files were extracted in parallel
+    assert elapsed < 0.55
+
+def test_extraction_timeout(thread_executor, monkeypatch):
+    """A file exceeding the per-file timeout reports an extraction error."""
+    monkeypatch.setattr(config, "PDF_TIMEOUT_SECONDS", 0.05)
+    monkeypatch.setattr(pdf_utils, "_extract_text_sync", lambda *args: time.sleep(0.3) or {})
+
+    text = asyncio.run(pdf_utils.extract_text_from_pdf(named_file(b"slow", "slow.pdf")))
+    assert text == "Error extracting text"
+
+def test_process_pool_extraction(monkeypatch):
+    """The default process pool extracts real PDFs."""
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "process")
+    monkeypatch.setattr(config, "PDF_WORKERS", 1)
+    pdf_utils.shutdown_pdf_executor()
+    try:
+        results = asyncio.run(pdf_utils.process_pdf_files([named_file(blank_pdf(), "blank.pdf")]))
+    finally:
+        pdf_utils.shutdown_pdf_executor()
+    assert results == [{"filename": "blank.pdf", "content": "", "preview": "", "truncated": False}]
+
+def test_extraction_stops_at_text_budget(monkeypatch):
+    """Pages are read lazily and reading stops once the budget is used up."""
+    pages_read = []
+
+    def fake_pages(source, max_pages=None):
+        for index in range(1000):
+            pages_read.append(index)
+            yield f"page {index} " + "x" * 90
+
+    monkeypatch.setattr(pdf_utils, "iter_page_texts", fake_pages)
+    result = pdf_utils._extract_text_sync(b"", max_pages=1000, preview_pages=2, max_chars=250)
+
+    assert len(pages_read) == 3
+    assert result["preview"].startswith("page 0")
+    assert "page 1" in result["preview"] and "page 2" not in result["preview"]
+    assert len(result["content"]) <= 250
+    assert result["truncated"]
+
+def test_spooled_files_are_read_from_disk(tmp_path):
+    """Files spooled to disk are handed to the executor by path, not by content."""
+    path = tmp_path / "claim.pdf"
+    path.write_bytes(blank_pdf())
+    with open(path, "rb") as file_obj:
+        assert pdf_utils._read_source(file_obj) == str(path)
+    assert pdf_utils._read_source(named_file(b"data", "a.pdf")) == b"data"
+
+@pytest.fixture
+def fake_ocr(thread_executor, monkeypatch):
+    """Pretend Tesseract is installed and every page image reads as an ID card."""
+    from app.utils import cache
+
+    calls = []
+
+    def fake_images(source, page_indexes):
+        return {index: [f"image {index}".encode()] for index in page_indexes}
+
+    def fake_ocr_image(image, language):
+        calls.append(image)
+        return "Member ID: XJ12345"
+
+    monkeypatch.setattr(config, "OCR_ENABLED", True)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "memory")
+    monkeypatch.setattr(pdf_utils, "ocr_available", lambda: True)
+    monkeypatch.setattr(pdf_utils, "_extract_page_images", fake_images)
+    monkeypatch.setattr(pdf_utils, "_ocr_image_sync", fake_ocr_image)
+    cache.reset_cache()
+    yield calls
+    cache.reset_cache()
+
+def test_scanned_pages_are_ocred_and_cached(fake_ocr):
+    """Pages without text go through OCR once; the same page image is served from the cache."""
+    first = asyncio.run(pdf_utils.extract_pdf(named_file(blank_pdf(), "scan.pdf")))
+    second = asyncio.run(pdf_utils.extract_pdf(named_file(blank_pdf(), "scan.pdf")))
+
+    assert first["content"] == "Member ID: XJ12345"
+    assert first["preview"] == "Member ID: XJ12345"
+    assert second["content"] == first["content"]
+    assert fake_ocr == [b"image 0"]
+
+def test_text_pages_skip_ocr(fake_ocr, monkeypatch):
+    """Text-native pages keep the fast path and never look for images."""
+    from benchmarks.synthetic_docs import make_id_card_pdf
+
+    def no_images(source, page_indexes):
+        raise AssertionError("text pages must not be sent to OCR")
+
+    monkeypatch.setattr(pdf_utils, "_extract_page_images", no_images)
+    result = asyncio.run(pdf_utils.extract_pdf(named_file(make_id_card_pdf(), "card.pdf")))
+    assert "Member ID" in result["content"]
+    assert fake_ocr == []
@@ -0,0 +1,245 @@
+import asyncio
+import json
+import pytest
+
+from app import config
+from app.agents import bill_agent, discharge_agent, id_card_agent
+from app.services import ai_service, document_service
+from app.utils.speculation import SpeculationStats
+from app.utils.telemetry import track_llm_call
+
+DOCUMENTS = [
+    {"filename": "hospital_bill.pdf", "content": "bill"},
+    {"filename": "discharge_summary.pdf", "content": "discharge_summary"},
+    {"filename": "id_card.pdf", "content": "id_card"},
+]
+
+EXTRACTED = {
+    "bill": {"hospital_name": "City Hospital", "total_amount": 100.0, "date_of_service": "2024-01-05"},
+    "discharge_summary": {
+        "patient_name": "Jane Doe",
+        "diagnosis": "Flu",
+        "admission_date": "2024-01-01",
+        "discharge_date": "2024-01-05",
+    },
+    "id_card": {"patient_name": "Jane Doe", "insurance_id": "ABC123", "plan_name": "Gold"},
+}
+
+EXTRACTION_PROMPT_TOKENS = 120
+
+@pytest.fixture
+def fake_llm(monkeypatch):
+    """Replace the LLM calls with slow fakes that record concurrency."""
+    state = {"in_flight": 0, "max_in_flight": 0, "calls": 0, "delays": {}}
+
+    async def track(delay):
+        state["calls"] += 1
+        state["in_flight"] += 1
+        state["max_in_flight"] = max(state["max_in_flight"], state["in_flight"])
+        try:
+            await asyncio.sleep(delay)
+        finally:
+            state["in_flight"] -= 1
+
+    async def fake_classify(text, filename, document_types=None):
+        await track(state["delays"].get(text, 0.05))
+        return text
+
+    async def fake_extract(document_type, text):
+        # Counted as pending the way the provider call layer does
+        with track_llm_call(EXTRACTION_PROMPT_TOKENS):
+            await track(0.05)
+        if document_type == "id_card" and state.get("fail_id_card"):
+            raise RuntimeError("id card extraction failed")
+        return dict(EXTRACTED[document_type], type=document_type)
+
+    monkeypatch.setattr(document_service, "classify_document_with_gemini", fake_classify)
+    for module in (bill_agent, discharge_agent, id_card_agent):
+        monkeypatch.setattr(module, "extract_structured_data_with_gpt", fake_extract)
+    return state
+
+def fresh_documents():
+    return [dict(doc) for doc in DOCUMENTS]
+
+def test_pipeline_runs_documents_concurrently(fake_llm):
+    """A three-document claim should cost about one classify plus one extract: all documents are in flight at once."""
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary", "id_card"]
+    assert all(doc["validation_issues"] == [] for doc in results)
+    assert fake_llm["max_in_flight"] == 3
+
+def test_pipeline_keeps_input_order(fake_llm):
+    """Results follow the upload order even when earlier documents finish last."""
+    fake_llm["delays"] = {"bill": 0.15, "discharge_summary": 0.1, "id_card": 0.0}
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary", "id_card"]
+
+def test_pipeline_respects_concurrency_limit(fake_llm, monkeypatch):
+    """No more than MAX_CONCURRENT_DOCUMENTS documents are in flight."""
+    monkeypatch.setattr(config, "MAX_CONCURRENT_DOCUMENTS", 1)
+    # Speculative extraction overlaps two LLM calls of the same document
+    monkeypatch.setattr(config, "SPECULATIVE_EXTRACTION", False)
+    asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+    assert fake_llm["max_in_flight"] == 1
+
+@pytest.fixture
+def speculation(monkeypatch):
+    """Send every document to the LLM classifier and speculate on any local guess."""
+    monkeypatch.setattr(config, "LOCAL_CLASSIFIER_THRESHOLD", 1.1)
+    monkeypatch.setattr(config, "SPECULATIVE_EXTRACTION", True)
+    monkeypatch.setattr(config, "SPECULATIVE_EXTRACTION_MIN_CONFIDENCE", 0.1)
+    stats = SpeculationStats()
+    monkeypatch.setattr(ai_service, "speculation_stats", stats)
+    return stats
+
+def test_speculative_extraction_overlaps_classification(fake_llm, speculation):
+    documents = [{"filename": "hospital_bill.pdf", "content": "bill"}]
+    results = asyncio.run(ai_service.classify_and_extract_documents(documents))
+
+    assert results == [dict(EXTRACTED["bill"], type="bill", validation_issues=[])]
+    # Classification and extraction ran side by side, and the extraction was not redone
+    assert fake_llm["max_in_flight"] == 2
+    assert fake_llm["calls"] == 2
+    assert speculation.get_stats()["committed"] == 1
+
+def test_mispredicted_extraction_is_cancelled_and_redone(fake_llm, speculation):
+    fake_llm["delays"] = {"id_card": 0.01}
+    documents = [{"filename": "hospital_bill.pdf", "content": "id_card"}]
+    results = asyncio.run(ai_service.classify_and_extract_documents(documents))
+
+    assert [doc["type"] for doc in results] == ["id_card"]
+    stats = speculation.get_stats()
+    assert (stats["started"], stats["committed"], stats["mispredicted"]) == (1, 0, 1)
+    assert stats["cancelled_in_flight"] == 1
+    assert stats["misprediction_rate"] == 1.0
+    # The cancelled extraction reported no usage and counts with its estimated prompt tokens
+    assert stats["wasted_tokens"] == EXTRACTION_PROMPT_TOKENS
+
+def test_pipeline_reports_errors(fake_llm):
+    """A failing document surfaces its error once all documents have finished."""
+    fake_llm["fail_id_card"] = True
+    with pytest.raises(RuntimeError, match="id card extraction failed"):
+        asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+def test_registered_agent_handles_new_document_type(fake_llm, monkeypatch):
+    """Agents registered at startup are picked up without editing the factory."""
+    from app.agents import registry
+    from app.agents.base_agent import BaseAgent
+
+    class LabReportAgent(BaseAgent):
+        async def process(self, document_text):
+            return {"type": "lab_report", "test_name": "CBC"}
+
+        def validate(self, extracted_data):
+            return []
+
+    monkeypatch.setattr(registry, "_agents", dict(registry._agents))
+    registry.register_agent("lab_report", LabReportAgent())
+
+    documents = [{"filename": "lab_report.pdf", "content": "lab_report"}]
+    results = asyncio.run(ai_service.classify_and_extract_documents(documents))
+    assert results == [{"type": "lab_report", "test_name": "CBC", "validation_issues": []}]
+    assert "lab_report" in registry.get_document_types()
+
+def test_workflow_graph_is_compiled_once():
+    from app.services import orchestrator_service
+
+    assert orchestrator_service.get_workflow_graph() is orchestrator_service.get_workflow_graph()
+
+@pytest.fixture
+def fake_batch_llm(monkeypatch):
+    """Replace the OpenAI client with a fake returning a canned batched response."""
+    from types import SimpleNamespace
+    from app.providers import registry as provider_registry
+    from app.providers.openai_provider import OpenAIProvider
+    from app.utils import cache, near_duplicates
+
+    state = {"calls": 0, "documents": []}
+
+    async def fake_create(**kwargs):
+        state["calls"] += 1
+        if state.get("error"):
+            raise state["error"]
+        content = json.dumps({"documents": state["documents"]})
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    client = SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=fake_create)))
+    provider_registry.set_provider("extraction", OpenAIProvider("fake", client=client))
+    monkeypatch.setattr(config, "BATCH_EXTRACTION", True)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    yield state
+    provider_registry.set_provider("extraction", None)
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def batch_entries():
+    return [
+        dict(EXTRACTED[doc["content"]], filename=doc["filename"], type=doc["content"])
+        for doc in DOCUMENTS
+    ]
+
+def test_batched_extraction_uses_one_request(fake_llm, fake_batch_llm):
+    """A valid batched response replaces the per-document calls."""
+    fake_batch_llm["documents"] = batch_entries()
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+    assert fake_batch_llm["calls"] == 1
+    assert fake_llm["max_in_flight"] == 0
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary", "id_card"]
+    assert results[0]["total_amount"] == 100.0
+    assert all(doc["validation_issues"] == [] for doc in results)
+
+def test_batched_extraction_falls_back_on_invalid_schema(fake_llm, fake_batch_llm):
+    """If any document fails schema validation, every document is processed on its own."""
+    entries = batch_entries()
+    del entries[2]["insurance_id"]
+    fake_batch_llm["documents"] = entries
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+    assert fake_batch_llm["calls"] == 1
+    assert fake_llm["max_in_flight"] > 0
+    assert results[2]["insurance_id"] == "ABC123"
+
+def test_batched_extraction_falls_back_when_the_provider_fails(fake_llm, fake_batch_llm):
+    fake_batch_llm["error"] = RuntimeError("request rejected")
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+    assert fake_batch_llm["calls"] == 1
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary", "id_card"]
+
+def test_claims_over_the_token_budget_are_not_batched(fake_llm, fake_batch_llm, monkeypatch):
+    monkeypatch.setattr(config, "BATCH_EXTRACTION_MAX_TOKENS", 50)
+    fake_batch_llm["documents"] = batch_entries()
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+    assert fake_batch_llm["calls"] == 0
+    assert len(results) == 3
+
+def test_batched_documents_without_an_agent_are_left_out(fake_llm, fake_batch_llm, monkeypatch):
+    get_agent = ai_service.get_agent_for_document_type
+    monkeypatch.setattr(
+        ai_service, "get_agent_for_document_type",
+        lambda doc_type: None if doc_type == "id_card" else get_agent(doc_type)
+    )
+    fake_batch_llm["documents"] = batch_entries()
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents()))
+
+    assert fake_batch_llm["calls"] == 1
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary"]
+
+def test_pipeline_reports_documents_as_they_finish(fake_llm, monkeypatch):
+    """The per-document callback fires in completion order while results keep the input order."""
+    # Speculative extraction would let a slow classification finish early
+    monkeypatch.setattr(config, "SPECULATIVE_EXTRACTION", False)
+    fake_llm["delays"] = {"bill": 0.15, "discharge_summary": 0.1, "id_card": 0.0}
+    finished = []
+
+    async def on_document(index, doc, structured_data):
+        finished.append((index, structured_data["type"], structured_data["validation_issues"]))
+
+    results = asyncio.run(ai_service.classify_and_extract_documents(fresh_documents(), on_document))
+    assert finished == [(2, "id_card", []), (1, "discharge_summary", []), (0, "bill", [])]
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary", "id_card"]
@@ -0,0 +1,62 @@
+import asyncio
+import json
+import pytest
+
+from app import config
+from app.providers import registry
+from app.providers.mock_provider import MockProvider, MockProviderError
+from app.services import ai_service
+from app.utils import cache, near_duplicates, resilience
+
+BILL_TEXT = "CITY HOSPITAL\nINVOICE\nTotal charges: $1,200.00\nAmount due: $1,200.00"
+DISCHARGE_TEXT = "DISCHARGE SUMMARY\nDate of admission: 2024-01-01\nDate of discharge: 2024-01-05\nDiagnosis: Pneumonia"
+
+@pytest.fixture
+def mock_llm(monkeypatch):
+    """Route classification and extraction to a fast mock provider."""
+    monkeypatch.setattr(config, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(config, "MOCK_LLM_LATENCY_MS", 1)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(config, "LOCAL_CLASSIFIER_THRESHOLD", 1.1)
+    registry.set_provider("classification", None)
+    registry.set_provider("extraction", None)
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    yield
+    asyncio.run(registry.close_providers())
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def test_mock_latency_is_deterministic_per_seed():
+    first, second = MockProvider(seed=7), MockProvider(seed=7)
+    assert [first.sample_latency() for _ in range(3)] == [second.sample_latency() for _ in range(3)]
+    assert MockProvider(distribution="fixed", latency_ms=50).sample_latency() == 0.05
+    assert all(0 <= MockProvider(distribution="uniform").sample_latency() <= 0.4 for _ in range(10))
+
+def test_mock_errors_are_retryable():
+    provider = MockProvider(latency_ms=0, distribution="fixed", error_rate=1.0)
+    with pytest.raises(MockProviderError) as error:
+        asyncio.run(provider.generate_text("Filename: bill.pdf"))
+    assert resilience.is_retryable(error.value)
+
+def test_mock_provider_answers_pipeline(mock_llm):
+    documents = [
+        {"filename": "scan1.pdf", "content": BILL_TEXT},
+        {"filename": "scan2.pdf", "content": DISCHARGE_TEXT},
+    ]
+    results = asyncio.run(ai_service.classify_and_extract_documents(documents))
+
+    assert registry.get_classification_provider() is registry.get_extraction_provider()
+    assert [doc["type"] for doc in results] == ["bill", "discharge_summary"]
+    assert results[0]["hospital_name"] == "Mock General Hospital"
+    assert results[1]["patient_name"] == "Jane Doe"
+
+def test_mock_responses_can_be_overridden(tmp_path):
+    path = tmp_path / "responses.json"
+    path.write_text(json.dumps({"bill": {"hospital_name": "Override Clinic"}}))
+    provider = MockProvider.from_responses_file(str(path), latency_ms=0, distribution="fixed")
+
+    response = asyncio.run(provider.generate_json("", "Extract the following information from this medical bill:"))
+    assert json.loads(response.text) == {"hospital_name": "Override Clinic"}
+    assert provider.responses["id_card"]["insurance_id"] == "MOCK-123456"
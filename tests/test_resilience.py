@@ -0,0 +1,223 @@
+import asyncio
+import json
+import time
+import httpx
+import pytest
+from openai import AsyncOpenAI
+
+from app import config
+from app.providers import registry as provider_registry
+from app.providers.openai_provider import OpenAIProvider
+from app.utils import cache, llm_utils, near_duplicates, resilience
+from app.utils.resilience import CircuitBreaker, CircuitOpenError, ResilientCaller, TokenBucket
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def make_caller(**overrides):
+    settings = dict(
+        requests_per_minute=0,
+        tokens_per_minute=0,
+        max_retries=3,
+        backoff_base=0.001,
+        backoff_max=0.01,
+        failure_threshold=5,
+        reset_seconds=30,
+        hedge_delay=0
+    )
+    settings.update(overrides)
+    return ResilientCaller("test", **settings)
+
+def flaky(failures):
+    """Return a call that fails with the given errors before succeeding."""
+    state = {"calls": 0}
+
+    async def call():
+        state["calls"] += 1
+        if failures:
+            raise failures.pop(0)
+        return "ok"
+
+    return call, state
+
+def test_token_bucket_limits_rate():
+    async def run():
+        bucket = TokenBucket(rate_per_minute=600)
+        bucket._tokens = 0
+        started = time.perf_counter()
+        for _ in range(3):
+            await bucket.acquire()
+        return time.perf_counter() - started
+
+    # 600 per minute is one token every 100 ms
+    assert 0.25 < asyncio.run(run()) < 0.6
+
+def test_retries_rate_limits_and_server_errors():
+    call, state = flaky([StatusError(429), StatusError(503)])
+    caller = make_caller()
+    assert asyncio.run(caller.call(call)) == "ok"
+    assert state["calls"] == 3
+    assert caller.get_stats()["retries"] == 2
+
+def test_client_errors_are_not_retried():
+    call, state = flaky([StatusError(400)])
+    caller = make_caller()
+    with pytest.raises(StatusError):
+        asyncio.run(caller.call(call))
+    assert state["calls"] == 1
+
+def test_circuit_breaker_opens_and_probes():
+    breaker = CircuitBreaker(failure_threshold=2, reset_seconds=0.05)
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+
+    time.sleep(0.06)
+    breaker.before_call()
+    # Only one probe is let through while half open
+    with pytest.raises(CircuitOpenError):
+        breaker.before_call()
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+def test_stale_outcomes_do_not_change_a_half_open_circuit():
+    breaker = CircuitBreaker(failure_threshold=1, reset_seconds=0.01)
+    stale = breaker.before_call()
+    breaker.record_failure(stale)
+    assert breaker.state == "open"
+
+    time.sleep(0.02)
+    probe = breaker.before_call()
+    # Calls started before the circuit opened neither close nor reopen it
+    breaker.record_success(stale)
+    assert breaker.state == "half_open"
+    breaker.record_failure(stale)
+    assert breaker.state == "half_open"
+    breaker.release_probe(stale)
+    assert breaker.state == "half_open"
+
+    breaker.record_success(probe)
+    assert breaker.state == "closed"
+
+def test_open_circuit_fails_fast():
+    call, state = flaky([StatusError(500)] * 10)
+    caller = make_caller(failure_threshold=2, max_retries=5)
+    with pytest.raises(CircuitOpenError):
+        asyncio.run(caller.call(call))
+    assert state["calls"] == 2
+
+def test_cancelled_probe_lets_the_next_call_probe():
+    caller = make_caller(failure_threshold=1, max_retries=0)
+    caller.breaker.reset_seconds = 0.01
+    caller.breaker.record_failure()
+    time.sleep(0.02)
+
+    async def hang():
+        await asyncio.sleep(10)
+
+    async def ok():
+        return "ok"
+
+    async def run():
+        probe = asyncio.create_task(caller.call(hang))
+        await asyncio.sleep(0.01)
+        assert caller.breaker.state == "half_open"
+        probe.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await probe
+        return await caller.call(ok)
+
+    assert asyncio.run(run()) == "ok"
+    assert caller.breaker.state == "closed"
+
+def test_hedged_request_wins_over_slow_request():
+    delays = [0.5, 0.01]
+
+    async def call():
+        await asyncio.sleep(delays.pop(0))
+        return "ok"
+
+    caller = make_caller(hedge_delay=0.05)
+    started = time.perf_counter()
+    assert asyncio.run(caller.call(call)) == "ok"
+    assert time.perf_counter() - started < 0.3
+    assert caller.get_stats()["hedge_wins"] == 1
+
+@pytest.fixture
+def fake_openai_server(monkeypatch):
+    """An OpenAI-compatible fake server answering 429 once, then a JSON completion."""
+    responses = [
+        httpx.Response(429, headers={"retry-after": "0"}, json={"error": {"message": "Rate limit reached"}}),
+    ]
+    requests = []
+
+    def handler(request):
+        requests.append(request)
+        if responses:
+            return responses.pop(0)
+        content = json.dumps({"hospital_name": "City Hospital", "total_amount": 120.5})
+        return httpx.Response(200, json={
+            "id": "chatcmpl-1",
+            "object": "chat.completion",
+            "created": 0,
+            "model": "fake",
+            "choices": [{"index": 0, "finish_reason": "stop", "message": {"role": "assistant", "content": content}}],
+        })
+
+    client = AsyncOpenAI(
+        api_key="test",
+        base_url="http://fake-llm.local/v1",
+        max_retries=0,
+        http_client=httpx.AsyncClient(transport=httpx.MockTransport(handler))
+    )
+    provider_registry.set_provider("extraction", OpenAIProvider("fake", client=client))
+    monkeypatch.setattr(config, "LLM_BACKOFF_BASE_SECONDS", 0.001)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    yield requests
+    provider_registry.set_provider("extraction", None)
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def test_extraction_retries_against_fake_server(fake_openai_server):
+    result = asyncio.run(llm_utils.extract_structured_data_with_gpt("bill", "City Hospital bill"))
+    assert result == {"hospital_name": "City Hospital", "total_amount": 120.5, "type": "bill"}
+    assert len(fake_openai_server) == 2
+    assert resilience.get_llm_stats()["openai"]["retries"] == 1
+
+def test_cancel_while_acquiring_the_hedge_cancels_the_primary():
+    caller = make_caller(hedge_delay=0.01)
+    acquired = []
+    state = {"cancelled": False}
+
+    async def acquire(estimated_tokens):
+        acquired.append(estimated_tokens)
+        if len(acquired) > 1:
+            await asyncio.sleep(10)
+
+    async def slow():
+        try:
+            await asyncio.sleep(10)
+        except asyncio.CancelledError:
+            state["cancelled"] = True
+            raise
+
+    caller._acquire = acquire
+
+    async def run():
+        task = asyncio.create_task(caller.call(slow))
+        await asyncio.sleep(0.05)
+        assert len(acquired) == 2
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        await asyncio.sleep(0)
+
+    asyncio.run(run())
+    assert state["cancelled"]
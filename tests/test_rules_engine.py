@@ -0,0 +1,107 @@
+import json
+from datetime import datetime
+
+import pytest
+
+from app import config
+from app.services import rules_engine
+from app.services.rules_engine import ParsedDocument, RuleConfigError, RulesEngine, get_rules_engine
+from app.services.validation_service import validate_claim_batch, validate_claim_documents
+
+BILL = {"type": "bill", "hospital_name": "General Hospital", "total_amount": 1250, "date_of_service": "2024-03-10"}
+DISCHARGE = {
+    "type": "discharge_summary", "patient_name": "Jane Doe", "diagnosis": "Pneumonia",
+    "admission_date": "2024-03-05", "discharge_date": "2024-03-10"
+}
+ID_CARD = {
+    "type": "id_card", "patient_name": "Jane Doe", "insurance_id": "ABC-123", "plan_name": "Gold PPO",
+    "expiration_date": "2099-12-31"
+}
+
+@pytest.fixture(autouse=True)
+def no_claim_index(monkeypatch):
+    monkeypatch.setattr(config, "CLAIM_INDEX", "none")
+
+@pytest.mark.parametrize("doc_type, data, issues", [
+    ("bill", dict(BILL, total_amount=0, hospital_name=""), [
+        "Missing hospital_name in bill document", "Missing total_amount in bill document",
+        "Bill amount must be greater than zero"
+    ]),
+    ("bill", dict(BILL, total_amount="n/a"), ["Invalid bill amount format"]),
+    ("discharge_summary", dict(DISCHARGE, admission_date="2024-03-12"), ["Admission date cannot be after discharge date"]),
+    ("discharge_summary", dict(DISCHARGE, discharge_date="March 10"), ["Invalid date format in discharge summary"]),
+    ("id_card", dict(ID_CARD, expiration_date="2000-01-01"), ["Insurance ID card is expired"]),
+    ("id_card", dict(ID_CARD, expiration_date="soon", plan_name=None), [
+        "Missing plan_name in ID card", "Invalid expiration date format in ID card"
+    ]),
+    ("id_card", ID_CARD, []),
+    ("other", {"anything": None}, []),
+])
+def test_default_rules_report_the_agent_messages(doc_type, data, issues):
+    assert get_rules_engine().validate_document(doc_type, data) == issues
+
+def test_dates_are_parsed_once_per_document(monkeypatch):
+    calls = []
+    real_fromisoformat = datetime.fromisoformat
+
+    class CountingDatetime(datetime):
+        @classmethod
+        def fromisoformat(cls, value):
+            calls.append(value)
+            return real_fromisoformat(value)
+
+    monkeypatch.setattr(rules_engine, "datetime", CountingDatetime)
+    doc = ParsedDocument(DISCHARGE)
+    for _ in range(3):
+        doc.date("admission_date")
+    assert calls == ["2024-03-05"]
+
+def test_batch_matches_per_claim_validation():
+    claims = [
+        [BILL, DISCHARGE, ID_CARD],
+        [dict(BILL, date_of_service="2024-03-11"), DISCHARGE],
+        [dict(ID_CARD, patient_name="John Roe", validation_issues=["Missing plan_name in ID card"]), DISCHARGE],
+        [],
+    ]
+    batch = validate_claim_batch(claims)
+    assert batch == [validate_claim_documents(documents) for documents in claims]
+
+    assert batch[0][1].status == "approved"
+    assert batch[1][0].missing_documents == ["id_card"]
+    assert batch[1][0].discrepancies == ["Bill service date does not match discharge date"]
+    assert batch[2][0].discrepancies == [
+        "id_card: Missing plan_name in ID card",
+        "Patient name on ID card does not match discharge summary",
+    ]
+
+def test_batch_applies_document_rules_to_unvalidated_documents():
+    engine = get_rules_engine()
+    claims = [
+        [dict(BILL, total_amount=-5), DISCHARGE, ID_CARD],
+        [dict(BILL, total_amount=-5, validation_issues=[]), DISCHARGE, ID_CARD],
+    ]
+    assert engine.validate_claims(claims) == [([], ["bill: Bill amount must be greater than zero"]), ([], [])]
+    assert engine.validate_claims(claims, check_documents=False) == [([], []), ([], [])]
+
+def test_rules_are_loaded_from_the_configured_file(tmp_path, monkeypatch):
+    rules_path = tmp_path / "rules.json"
+    rules_path.write_text(json.dumps({
+        "required_documents": ["bill", "id_card"],
+        "documents": {"bill": [{"check": "required", "fields": ["invoice_number"], "message": "No {field}"}]},
+        "claim": [],
+    }))
+    monkeypatch.setattr(config, "VALIDATION_RULES_PATH", str(rules_path))
+    rules_engine.reset_rules_engine()
+    try:
+        assert get_rules_engine().validate_claims([[BILL]]) == [(["id_card"], ["bill: No invoice_number"])]
+        [(validation, decision)] = validate_claim_batch([[BILL]])
+        assert validation.missing_documents == ["id_card"]
+        assert decision.status == "rejected"
+    finally:
+        rules_engine.reset_rules_engine()
+
+def test_unknown_check_fails_when_compiled():
+    with pytest.raises(RuleConfigError):
+        RulesEngine({"documents": {"bill": [{"check": "luhn", "field": "total_amount"}]}})
+    with pytest.raises(RuleConfigError):
+        RulesEngine({"claim": [{"check": "fields_equal", "left": "bill.date_of_service"}]})
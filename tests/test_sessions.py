@@ -0,0 +1,138 @@
+import asyncio
+import io
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.main import app
+from app.providers import registry
+from app.services import session_service
+from app.services.session_service import ClaimSessionConflictError, MemorySessionStore, SQLiteSessionStore
+from app.utils import cache, near_duplicates, pdf_utils, resilience
+from benchmarks.synthetic_docs import make_bill_pdf, make_claim, make_id_card_pdf, make_pdf
+
+client = TestClient(app)
+
+@pytest.fixture
+def mock_sessions(monkeypatch):
+    """Fresh in-memory sessions over a fast mock LLM; yields the mock provider."""
+    monkeypatch.setattr(config, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(config, "CLAIM_INDEX", "none")
+    monkeypatch.setattr(config, "MOCK_LLM_LATENCY_MS", 1)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "thread")
+    monkeypatch.setattr(session_service, "_session_manager", None)
+    registry.set_provider("classification", None)
+    registry.set_provider("extraction", None)
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    pdf_utils.shutdown_pdf_executor()
+    yield registry.get_extraction_provider()
+    asyncio.run(registry.close_providers())
+    pdf_utils.shutdown_pdf_executor()
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def upload(documents):
+    return [("files", (filename, data, "application/pdf")) for filename, data in documents]
+
+def test_adding_missing_document_only_processes_that_document(mock_sessions):
+    bill, discharge, id_card = make_claim()
+
+    response = client.post("/claim-sessions", files=upload([bill, discharge]))
+    assert response.status_code == 201
+    session = response.json()
+    assert session["validation"]["missing_documents"] == ["id_card"]
+    assert session["claim_decision"]["status"] == "rejected"
+    assert mock_sessions.calls == 2
+
+    response = client.post(f"/claim-sessions/{session['session_id']}/documents", files=upload([id_card]))
+    assert response.status_code == 200
+    session = response.json()
+    assert session["claim_decision"]["status"] == "approved"
+    assert session["filenames"] == ["bill_0.pdf", "discharge_summary_0.pdf", "id_card_0.pdf"]
+    assert mock_sessions.calls == 3
+
+def test_replacing_and_removing_documents(mock_sessions):
+    response = client.post("/claim-sessions", files=upload(make_claim()))
+    session_id = response.json()["session_id"]
+
+    # A new bill replaces the stored one even under another filename
+    response = client.post(f"/claim-sessions/{session_id}/documents", files=upload([("corrected_bill.pdf", make_bill_pdf())]))
+    assert sorted(response.json()["filenames"]) == ["corrected_bill.pdf", "discharge_summary_0.pdf", "id_card_0.pdf"]
+
+    response = client.delete(f"/claim-sessions/{session_id}/documents/corrected_bill.pdf")
+    assert response.json()["validation"]["missing_documents"] == ["bill"]
+    assert client.get(f"/claim-sessions/{session_id}").json()["filenames"] == ["discharge_summary_0.pdf", "id_card_0.pdf"]
+
+def test_unknown_session_is_404(mock_sessions):
+    assert client.get("/claim-sessions/missing").status_code == 404
+    response = client.post("/claim-sessions/missing/documents", files=upload([make_claim()[0]]))
+    assert response.status_code == 404
+
+def test_sqlite_session_store_round_trip(tmp_path):
+    store = SQLiteSessionStore(str(tmp_path / "sessions.sqlite3"))
+    store.save({"session_id": "a", "updated_at": 1.0, "documents": []})
+    store.save({"session_id": "b", "updated_at": 5.0, "documents": []})
+    assert store.get("a") == {"session_id": "a", "updated_at": 1.0, "documents": [], "version": 1}
+
+    store.purge(older_than=2.0)
+    assert store.get("a") is None
+    assert store.get("b") is not None
+
+@pytest.mark.parametrize("shared", [False, True])
+def test_session_saved_since_it_was_read_is_a_conflict(tmp_path, shared):
+    """Two workers updating the same session: the second save must not overwrite the first."""
+    if shared:
+        path = str(tmp_path / "sessions.sqlite3")
+        first, second = SQLiteSessionStore(path), SQLiteSessionStore(path)
+    else:
+        first = second = MemorySessionStore()
+    first.save({"session_id": "a", "updated_at": 1.0, "documents": [], "version": 0})
+
+    one, other = first.get("a"), second.get("a")
+    first.save(dict(one, documents=["bill"]))
+    with pytest.raises(ClaimSessionConflictError):
+        second.save(dict(other, documents=["id_card"]))
+    assert second.get("a")["documents"] == ["bill"]
+
+def test_concurrent_updates_keep_every_document(mock_sessions):
+    bill, discharge, id_card = make_claim()
+    response = client.post("/claim-sessions", files=upload([bill]))
+    session_id = response.json()["session_id"]
+    manager = session_service.get_session_manager()
+
+    def named(filename, data):
+        file_obj = io.BytesIO(data)
+        file_obj.filename = filename
+        return file_obj
+
+    async def run():
+        await asyncio.gather(
+            manager.add_documents(session_id, [named(*discharge)]),
+            manager.add_documents(session_id, [named(*id_card)])
+        )
+        return await manager.get(session_id)
+
+    session = asyncio.run(run())
+    assert sorted(entry["filename"] for entry in session["documents"]) == [
+        "bill_0.pdf", "discharge_summary_0.pdf", "id_card_0.pdf"
+    ]
+    assert session["result"]["claim_decision"]["status"] == "approved"
+
+def test_unrecognised_documents_are_returned_as_rejected(mock_sessions):
+    notes = ("notes.pdf", make_pdf([["Meeting notes", "Nothing to see here"]]))
+    response = client.post("/claim-sessions", files=upload([notes, ("id_card_0.pdf", make_id_card_pdf())]))
+    assert response.status_code == 201
+    assert response.json()["filenames"] == ["id_card_0.pdf"]
+    assert response.json()["rejected_documents"] == ["notes.pdf"]
+
+def test_extraction_failure_is_a_server_error(mock_sessions, monkeypatch):
+    async def fail(*args, **kwargs):
+        raise RuntimeError("extraction failed")
+
+    monkeypatch.setattr(session_service, "run_claim_workflow", fail)
+    response = client.post("/claim-sessions", files=upload(make_claim()))
+    assert response.status_code == 500
+    assert "extraction failed" in response.json()["detail"]
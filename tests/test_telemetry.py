@@ -0,0 +1,125 @@
+import asyncio
+import io
+import json
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.main import app
+from app.providers import registry
+from app.services.orchestrator_service import process_claim
+from app.utils import cache, near_duplicates, pdf_utils, resilience, telemetry
+from app.utils.resilience import ResilientCaller
+from app.utils.telemetry import MetricsRegistry, trace_span
+from benchmarks.synthetic_docs import make_claim
+
+def test_registry_renders_prometheus_text():
+    metrics_registry = MetricsRegistry()
+    metrics_registry.counter("demo_total", "Demo counter").inc(2, kind='say "hi"')
+    histogram = metrics_registry.histogram("demo_seconds", "Demo histogram", buckets=(0.1, 1.0))
+    histogram.observe(0.05)
+    histogram.observe(0.5)
+
+    text = metrics_registry.render()
+    assert '# TYPE demo_total counter' in text
+    assert 'demo_total{kind="say \\"hi\\""} 2' in text
+    assert 'demo_seconds_bucket{le="0.1"} 1' in text
+    assert 'demo_seconds_bucket{le="+Inf"} 2' in text
+    assert 'demo_seconds_count 2' in text
+
+def test_retries_are_recorded_on_the_llm_span():
+    caller = ResilientCaller("test", 0, 0, 2, 0.001, 0.001, 5, 30, 0)
+    attempts = []
+
+    async def flaky():
+        attempts.append(1)
+        if len(attempts) == 1:
+            raise ConnectionError("reset")
+        return "ok"
+
+    async def run():
+        with trace_span("llm.test") as span:
+            await caller.call(flaky)
+        return span
+
+    span = asyncio.run(run())
+    assert span.events == ["llm.retry"]
+    assert telemetry.SPAN_DURATION.count(span="llm.test", status="ok") >= 1
+
+def test_disabled_telemetry_records_nothing(monkeypatch):
+    monkeypatch.setattr(config, "TELEMETRY_ENABLED", False)
+    with trace_span("disabled.span") as span:
+        span.set_attribute("key", "value")
+    assert telemetry.SPAN_DURATION.count(span="disabled.span", status="ok") == 0
+
+@pytest.fixture
+def mock_pipeline(monkeypatch):
+    monkeypatch.setattr(config, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(config, "CLAIM_INDEX", "none")
+    monkeypatch.setattr(config, "MOCK_LLM_LATENCY_MS", 1)
+    monkeypatch.setattr(config, "CACHE_BACKEND", "none")
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "thread")
+    monkeypatch.setattr(config, "LOCAL_CLASSIFIER_THRESHOLD", 1.1)
+    registry.set_provider("classification", None)
+    registry.set_provider("extraction", None)
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+    pdf_utils.shutdown_pdf_executor()
+    yield
+    asyncio.run(registry.close_providers())
+    pdf_utils.shutdown_pdf_executor()
+    resilience.reset_llm_callers()
+    cache.reset_cache()
+    near_duplicates.reset_near_duplicate_index()
+
+def test_metrics_endpoint_reports_stages_and_llm_calls(mock_pipeline):
+    files = []
+    for filename, data in make_claim(pages=2):
+        file_obj = io.BytesIO(data)
+        file_obj.filename = filename
+        files.append(file_obj)
+    asyncio.run(process_claim(files))
+
+    text = TestClient(app).get("/metrics").text
+    for span in ("claim.process", "graph.document_processor", "graph.data_extractor",
+                 "graph.claim_validator", "graph.result_formatter", "llm.classification", "llm.extraction"):
+        assert f'span="{span}"' in text
+    assert 'healthpay_llm_tokens_total{direction="input",provider="mock"}' in text
+    assert "healthpay_document_pages_count" in text
+    assert 'healthpay_llm_retries_total{provider="mock"} 0' in text
+
+def test_llm_tokens_are_tallied_across_tasks():
+    tally = {"input": 0, "output": 0}
+
+    async def call():
+        telemetry.record_llm_usage(telemetry.Span("llm.test"), "test", 10, 3)
+
+    async def run():
+        with telemetry.track_llm_tokens(tally):
+            await asyncio.gather(asyncio.create_task(call()), call())
+        await call()
+
+    asyncio.run(run())
+    assert tally == {"input": 20, "output": 6}
+
+def claim_uploads():
+    return [("files", (filename, data, "application/pdf")) for filename, data in make_claim(pages=1)]
+
+def test_streaming_endpoint_sends_documents_then_the_decision(mock_pipeline):
+    with TestClient(app) as client:
+        response = client.post("/process-claim/stream", files=claim_uploads())
+    assert response.headers["content-type"].startswith("application/x-ndjson")
+    events = [json.loads(line) for line in response.text.splitlines()]
+
+    assert [event["event"] for event in events] == ["document", "document", "document", "claim"]
+    assert sorted(event["index"] for event in events[:3]) == [0, 1, 2]
+    assert all(event["document"] is not None for event in events[:3])
+    assert events[-1]["claim_decision"]["status"] == "approved"
+
+def test_streaming_endpoint_can_send_server_sent_events(mock_pipeline):
+    with TestClient(app) as client:
+        response = client.post("/process-claim/stream?format=sse", files=claim_uploads())
+    assert response.headers["content-type"].startswith("text/event-stream")
+    blocks = [block for block in response.text.split("\n\n") if block]
+    assert [block.splitlines()[0] for block in blocks] == ["event: document"] * 3 + ["event: claim"]
+    assert json.loads(blocks[-1].splitlines()[1][len("data: "):])["event"] == "claim"
@@ -0,0 +1,57 @@
+import subprocess
+import sys
+
+import pytest
+from fastapi.testclient import TestClient
+
+from app import config
+from app.main import app
+from app.providers import registry
+from app.services import warmup_service
+from app.utils import pdf_utils
+
+@pytest.fixture
+def mock_startup(monkeypatch):
+    monkeypatch.setattr(config, "LLM_PROVIDER", "mock")
+    monkeypatch.setattr(config, "PDF_EXECUTOR", "thread")
+    monkeypatch.setattr(config, "WARM_UP_ON_STARTUP", True)
+    registry.set_provider("classification", None)
+    registry.set_provider("extraction", None)
+    pdf_utils.shutdown_pdf_executor()
+    yield
+    pdf_utils.shutdown_pdf_executor()
+
+def test_importing_the_app_does_not_load_heavy_libraries():
+    code = (
+        "import sys, app.main; "
+        "print(','.join(m for m in ('langgraph', 'openai', 'google.generativeai', 'pypdf') if m in sys.modules))"
+    )
+    loaded = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True).stdout.strip()
+    assert loaded == ""
+
+def test_ready_after_warm_up_and_not_ready_when_stopping(mock_startup):
+    with TestClient(app) as client:
+        assert client.get("/health").status_code == 200
+        response = client.get("/ready")
+        assert response.status_code == 200
+        state = response.json()
+        assert state["status"] == "ready"
+        assert set(state["warm_up"]) == {name for name, _, _ in warmup_service.WARM_UP_STEPS}
+        assert all(step["status"] == "ok" for step in state["warm_up"].values())
+    assert not warmup_service.readiness.is_ready()
+
+def test_failed_required_step_leaves_app_not_ready(mock_startup, monkeypatch):
+    def broken():
+        raise RuntimeError("no model")
+
+    monkeypatch.setattr(warmup_service, "WARM_UP_STEPS", [
+        ("optional", broken, False),
+        ("workflow_graph", broken, True),
+    ])
+    with TestClient(app) as client:
+        response = client.get("/ready")
+        assert response.status_code == 503
+        assert response.json()["warm_up"]["optional"]["status"] == "skipped"
+        assert response.json()["warm_up"]["workflow_graph"] == {
+            "status": "failed", "seconds": pytest.approx(0, abs=0.1), "error": "no model"
+        }